@@ -0,0 +1,565 @@
+"""
+Image Search Benchmarks - Offline load tests against fake provider servers
+
+Runs the public search entry points of image_search.py against local aiohttp
+servers that imitate Pexels, Everypixel and DataForSEO with configurable
+latency, error and throttling profiles, so results are reproducible and no
+API quota is spent.
+
+Usage:
+    python benchmark_image_search.py
+    python benchmark_image_search.py --profiles fast,throttled --concurrency 1,8,32
+    python benchmark_image_search.py --save-baseline bench.json
+    python benchmark_image_search.py --baseline bench.json --tolerance 0.25
+    python benchmark_image_search.py --import-only
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import statistics
+import subprocess
+import tracemalloc
+import multiprocessing
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Optional, Any, Callable, Iterator, Tuple
+import numpy as np
+from aiohttp import web
+
+import image_search
+
+
+# Fake provider behaviour. latency/jitter are seconds, error_rate and
+# throttle_rate are fractions of requests answered with a 500 or a 429
+# (carrying Retry-After), pexels_results caps the Pexels page so the
+# free-image search has to fall through to DataForSEO.
+PROFILES = {
+    'fast': {'latency': 0.01, 'jitter': 0.005, 'error_rate': 0.0, 'throttle_rate': 0.0, 'retry_after': 0.0, 'pexels_results': 6},
+    'wan': {'latency': 0.08, 'jitter': 0.04, 'error_rate': 0.0, 'throttle_rate': 0.0, 'retry_after': 0.0, 'pexels_results': 6},
+    'flaky': {'latency': 0.03, 'jitter': 0.02, 'error_rate': 0.1, 'throttle_rate': 0.0, 'retry_after': 0.0, 'pexels_results': 6},
+    'throttled': {'latency': 0.03, 'jitter': 0.01, 'error_rate': 0.0, 'throttle_rate': 0.1, 'retry_after': 0.2, 'pexels_results': 6},
+}
+
+DEFAULT_PROFILES = ('fast', 'throttled')
+DEFAULT_CONCURRENCY = (1, 8, 32)
+DEFAULT_REQUESTS = 64
+
+# Cold-import budgets in milliseconds (median over fresh interpreters), by
+# module name and the directory it is imported from
+IMPORT_BUDGETS_MS = {
+    'image_search': (300.0, os.path.dirname(os.path.abspath(__file__))),
+    'image_download': (300.0, os.path.dirname(os.path.abspath(__file__))),
+    'image_generation_openai': (100.0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'generate-image')),
+}
+IMPORT_RUNS = 5
+
+# Dependencies a bare import must leave unloaded
+LAZY_DEPENDENCIES = ('agents', 'openai', 'aiohttp', 'requests', 'numpy', 'PIL')
+
+# Metrics compared against a baseline and whether higher values are better
+REGRESSION_METRICS = {
+    'p50_ms': False,
+    'p95_ms': False,
+    'throughput': True,
+    'kib_per_call': False,
+}
+
+
+# ============================================================================
+# FAKE PROVIDER SERVERS
+# ============================================================================
+
+def _fake_provider_app(profile: Dict[str, Any], seed: int) -> web.Application:
+    """aiohttp application serving the three provider APIs under one host"""
+    rng = random.Random(seed)
+    
+    async def respond(build) -> web.Response:
+        await asyncio.sleep(max(0.0, profile['latency'] + rng.uniform(-profile['jitter'], profile['jitter'])))
+        roll = rng.random()
+        if roll < profile['throttle_rate']:
+            return web.json_response(
+                {'error': 'rate limit exceeded'}, status=429,
+                headers={'Retry-After': str(profile['retry_after'])}
+            )
+        if roll < profile['throttle_rate'] + profile['error_rate']:
+            return web.json_response({'error': 'internal error'}, status=500)
+        return web.json_response(await build())
+    
+    async def pexels(request: web.Request) -> web.Response:
+        async def build():
+            query = request.query.get('query', '')
+            count = min(int(request.query.get('per_page', 15)), profile['pexels_results'])
+            page = int(request.query.get('page', 1))
+            return {'photos': [{
+                'src': {
+                    'original': f'https://images.pexels.com/photos/{page * 1000 + i}/pexels-photo-{i}.jpeg',
+                    'medium': f'https://images.pexels.com/photos/{page * 1000 + i}/pexels-photo-{i}.jpeg?h=350'
+                },
+                'width': 1920 + 640 * (i % 3),
+                'height': 1080 + 360 * (i % 3),
+                'photographer': f'Photographer {i}',
+                'photographer_url': f'https://www.pexels.com/@photographer-{i}',
+                'alt': f'{query} photo {i}'
+            } for i in range(count)]}
+        return await respond(build)
+    
+    async def everypixel(request: web.Request) -> web.Response:
+        async def build():
+            query = request.query.get('q', '')
+            count = int(request.query.get('per_page', 20))
+            offset = (int(request.query.get('page', 1)) - 1) * count
+            return {'data': [{
+                'url': f'https://cdn.everypixel.example/{abs(hash(query)) % 10000}/{i}.jpg',
+                'preview': f'https://cdn.everypixel.example/{abs(hash(query)) % 10000}/{i}_thumb.jpg',
+                'width': 3000,
+                'height': 2000,
+                'title': f'{query} stock {i}',
+                'score': round(1.0 - i / (offset + count + 1), 3)
+            } for i in range(offset, offset + count)]}
+        return await respond(build)
+    
+    async def dataforseo(request: web.Request) -> web.Response:
+        tasks = await request.json()
+        
+        async def build():
+            return {'tasks': [{
+                'status_code': 20000,
+                'data': task,
+                'result': [{'items': [{
+                    'type': 'images_search',
+                    'source_url': f"https://upload.example.org/{task['keyword'].replace(' ', '_')}/{i}.jpg?utm_source=serp",
+                    'encoded_url': f'https://encrypted-tbn0.example.com/images?q=tbn:{i}',
+                    'title': f"{task['keyword']} result {i}",
+                    'alt': task['keyword'],
+                    'subtitle': 'commons.wikimedia.org' if i % 2 else 'shutterstock.com',
+                    'url': f'https://page.example.org/{i}'
+                } for i in range(task.get('depth', 100))]}]
+            } for task in tasks]}
+        return await respond(build)
+    
+    app = web.Application()
+    app.router.add_get('/pexels/search', pexels)
+    app.router.add_get('/everypixel/search', everypixel)
+    app.router.add_post('/dataforseo/serp/google/images/live/advanced', dataforseo)
+    return app
+
+
+def _serve_fake_providers(profile: Dict[str, Any], seed: int, conn) -> None:
+    """Child process entry point: serve the fake providers and report the port"""
+    async def main():
+        runner = web.AppRunner(_fake_provider_app(profile, seed), access_log=None)
+        await runner.setup()
+        site = web.TCPSite(runner, '127.0.0.1', 0)
+        await site.start()
+        conn.send(site._server.sockets[0].getsockname()[1])
+        await asyncio.Event().wait()
+    
+    asyncio.run(main())
+
+
+class FakeProviderServer:
+    """
+    Fake Pexels/Everypixel/DataForSEO host running in a separate process
+    
+    Keeping the server out of the benchmark process means its event loop
+    neither competes with the client for the GIL nor shows up in the
+    client's allocation numbers.
+    
+    Args:
+        profile: Entry of PROFILES (or a dict with the same keys)
+        seed: Seed for latency jitter and error injection
+    """
+    
+    def __init__(self, profile: Dict[str, Any], seed: int = 0):
+        self.profile = profile
+        self.seed = seed
+        self.base_url: Optional[str] = None
+        self._process: Optional[multiprocessing.Process] = None
+    
+    def start(self) -> str:
+        """Start the server and return its base URL"""
+        parent_conn, child_conn = multiprocessing.Pipe()
+        self._process = multiprocessing.Process(
+            target=_serve_fake_providers, args=(self.profile, self.seed, child_conn), daemon=True
+        )
+        self._process.start()
+        if not parent_conn.poll(10):
+            self.stop()
+            raise RuntimeError("fake provider server did not start")
+        self.base_url = f'http://127.0.0.1:{parent_conn.recv()}'
+        return self.base_url
+    
+    def stop(self):
+        """Terminate the server process"""
+        if self._process is not None:
+            self._process.terminate()
+            self._process.join(5)
+            self._process = None
+    
+    def __enter__(self) -> 'FakeProviderServer':
+        self.start()
+        return self
+    
+    def __exit__(self, *exc):
+        self.stop()
+
+
+@contextmanager
+def offline_providers(base_url: str) -> Iterator[None]:
+    """
+    Point image_search at the fake providers with dummy credentials
+    
+    The result cache and image library are replaced by disabled in-memory
+    ones so every call reaches the fake providers, and rate limits
+    are raised far above the real quotas so the numbers measure the client
+    rather than the token buckets; limiters still react to injected 429s.
+    """
+    env = {
+        'PEXELS_API_KEY': 'benchmark',
+        'EVERYPIXEL_API_KEY': 'benchmark',
+        'DATAFORSEO_LOGIN': 'benchmark',
+        'DATAFORSEO_PASSWORD': 'benchmark',
+    }
+    saved_env = {key: os.environ.get(key) for key in env}
+    saved_endpoints = dict(image_search.PROVIDER_ENDPOINTS)
+    
+    os.environ.update(env)
+    image_search.PROVIDER_ENDPOINTS.update({
+        provider: f'{base_url}/{provider}' for provider in ('pexels', 'everypixel', 'dataforseo')
+    })
+    image_search.configure_cache(path=':memory:', bypass=True)
+    image_search.configure_library(path=':memory:', enabled=False)
+    try:
+        yield
+    finally:
+        image_search.PROVIDER_ENDPOINTS.clear()
+        image_search.PROVIDER_ENDPOINTS.update(saved_endpoints)
+        for key, value in saved_env.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+        image_search.get_transport().close()
+
+
+def _reset_provider_state():
+    """Fresh limiters and breakers so one run's throttling doesn't leak into the next"""
+    for provider in ('pexels', 'everypixel', 'dataforseo'):
+        image_search.configure_rate_limit(provider, rate=10000.0, burst=10000, max_concurrency=256)
+        image_search.configure_circuit_breaker(provider)
+
+
+# ============================================================================
+# SCENARIOS
+# ============================================================================
+
+def _run_free_images(query: str) -> int:
+    return len(image_search._search_free_images(query, 10))
+
+
+def _run_all_images(query: str) -> int:
+    return len(image_search.search_all_images(query, bypass_cache=True))
+
+
+async def _run_multiple_sources(query: str) -> int:
+    results = await image_search.search_multiple_sources([query], bypass_cache=True)
+    return len(results[query])
+
+
+SCENARIOS: Dict[str, Callable] = {
+    'search_free_images': _run_free_images,
+    'search_all_images': _run_all_images,
+    'search_multiple_sources': _run_multiple_sources,
+}
+
+
+def _timed_call(fn: Callable[[str], int], query: str) -> Dict[str, Any]:
+    start = time.perf_counter()
+    try:
+        count = fn(query)
+    except Exception:
+        count = 0
+    return {'latency': time.perf_counter() - start, 'results': count}
+
+
+async def _async_timed_call(fn, query: str, semaphore: asyncio.Semaphore) -> Dict[str, Any]:
+    async with semaphore:
+        start = time.perf_counter()
+        try:
+            count = await fn(query)
+        except Exception:
+            count = 0
+        return {'latency': time.perf_counter() - start, 'results': count}
+
+
+def _run_level(fn, queries: List[str], concurrency: int) -> List[Dict[str, Any]]:
+    """Issue every query with at most `concurrency` calls in flight"""
+    if asyncio.iscoroutinefunction(fn):
+        async def main():
+            semaphore = asyncio.Semaphore(concurrency)
+            try:
+                return await asyncio.gather(*[_async_timed_call(fn, query, semaphore) for query in queries])
+            finally:
+                await image_search.get_transport().aclose()
+        return asyncio.run(main())
+    
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        return list(executor.map(lambda query: _timed_call(fn, query), queries))
+
+
+def run_scenario(
+    scenario: str,
+    profile: str,
+    concurrency: int,
+    requests: int = DEFAULT_REQUESTS
+) -> Dict[str, Any]:
+    """
+    Benchmark one scenario at one concurrency level
+    
+    A timed pass measures latency percentiles and throughput; a second,
+    shorter pass under tracemalloc measures client-side allocations, so
+    tracing overhead never skews the latency numbers.
+    
+    Args:
+        scenario: Key of SCENARIOS
+        profile: Name of the fake provider profile (for labelling and unique queries)
+        concurrency: Calls in flight at once
+        requests: Number of calls in the timed pass
+    
+    Returns:
+        Metrics dictionary
+    """
+    fn = SCENARIOS[scenario]
+    prefix = f'benchmark {scenario} {profile} c{concurrency}'
+    
+    # Warm the pooled connections so the first calls don't pay the handshake
+    _reset_provider_state()
+    _run_level(fn, [f'{prefix} warmup {i}' for i in range(min(concurrency, 4))], concurrency)
+    
+    # Unique queries keep single-flight from coalescing the load away
+    _reset_provider_state()
+    start = time.perf_counter()
+    calls = _run_level(fn, [f'{prefix} query {i}' for i in range(requests)], concurrency)
+    elapsed = time.perf_counter() - start
+    
+    latencies = np.array([call['latency'] for call in calls]) * 1000
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    empty = sum(1 for call in calls if not call['results'])
+    
+    # Allocation pass
+    _reset_provider_state()
+    alloc_requests = max(concurrency, 8)
+    tracemalloc.start()
+    try:
+        baseline, _ = tracemalloc.get_traced_memory()
+        _run_level(fn, [f'{prefix} alloc {i}' for i in range(alloc_requests)], concurrency)
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    
+    return {
+        'scenario': scenario,
+        'profile': profile,
+        'concurrency': concurrency,
+        'requests': requests,
+        'p50_ms': round(float(p50), 2),
+        'p95_ms': round(float(p95), 2),
+        'p99_ms': round(float(p99), 2),
+        'throughput': round(requests / elapsed, 2),
+        'empty_rate': round(empty / requests, 3),
+        'mean_results': round(sum(call['results'] for call in calls) / requests, 1),
+        'peak_kib': round((peak - baseline) / 1024, 1),
+        'kib_per_call': round((peak - baseline) / 1024 / alloc_requests, 2),
+        'retained_kib': round((current - baseline) / 1024, 1),
+    }
+
+
+def run_benchmarks(
+    scenarios: List[str],
+    profiles: List[str],
+    concurrency: List[int],
+    requests: int = DEFAULT_REQUESTS,
+    seed: int = 0
+) -> List[Dict[str, Any]]:
+    """Run every scenario/concurrency combination under each profile"""
+    results = []
+    for profile in profiles:
+        with FakeProviderServer(PROFILES[profile], seed) as server, offline_providers(server.base_url):
+            for scenario in scenarios:
+                for level in concurrency:
+                    results.append(run_scenario(scenario, profile, level, requests))
+    return results
+
+
+# ============================================================================
+# IMPORT TIME
+# ============================================================================
+
+_IMPORT_PROBE = """
+import sys, time, json
+sys.path.insert(0, {path!r})
+start = time.perf_counter()
+import {module}
+elapsed = (time.perf_counter() - start) * 1000
+print(json.dumps({{'ms': elapsed, 'eager': [name for name in {lazy!r} if name in sys.modules]}}))
+"""
+
+
+def measure_import(module: str, path: str, runs: int = IMPORT_RUNS) -> Dict[str, Any]:
+    """
+    Time `import module` in fresh interpreters
+    
+    Args:
+        module: Module name
+        path: Directory to import it from
+        runs: Timed imports (one untimed run first warms the bytecode cache)
+    
+    Returns:
+        Median import time and the lazy dependencies the import loaded anyway
+    """
+    code = _IMPORT_PROBE.format(path=path, module=module, lazy=LAZY_DEPENDENCIES)
+    samples = []
+    for _ in range(runs + 1):
+        output = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True).stdout
+        samples.append(json.loads(output.strip().splitlines()[-1]))
+    samples = samples[1:]
+    return {
+        'module': module,
+        'import_ms': round(statistics.median(sample['ms'] for sample in samples), 1),
+        'eager': sorted({name for sample in samples for name in sample['eager']}),
+    }
+
+
+def check_import_budgets(runs: int = IMPORT_RUNS) -> Tuple[List[Dict[str, Any]], List[str]]:
+    """Measure every module in IMPORT_BUDGETS_MS and list budget or laziness violations"""
+    measurements, failures = [], []
+    for module, (budget, path) in IMPORT_BUDGETS_MS.items():
+        measurement = measure_import(module, path, runs)
+        measurement['budget_ms'] = budget
+        measurements.append(measurement)
+        if measurement['import_ms'] > budget:
+            failures.append(f"import {module}: {measurement['import_ms']} ms > budget {budget} ms")
+        if measurement['eager']:
+            failures.append(f"import {module} loaded {', '.join(measurement['eager'])} eagerly")
+    return measurements, failures
+
+
+# ============================================================================
+# REPORTING
+# ============================================================================
+
+def _result_key(result: Dict[str, Any]) -> str:
+    return f"{result['scenario']}/{result['profile']}/c{result['concurrency']}"
+
+
+def compare_to_baseline(
+    results: List[Dict[str, Any]],
+    baseline: List[Dict[str, Any]],
+    tolerance: float = 0.25
+) -> List[str]:
+    """
+    Find metrics that got worse than the baseline by more than `tolerance`
+    
+    Args:
+        results: Output of run_benchmarks
+        baseline: Previously saved output of run_benchmarks
+        tolerance: Allowed relative change, e.g. 0.25 for 25%
+    
+    Returns:
+        Human-readable regression descriptions (empty when none)
+    """
+    previous = {_result_key(result): result for result in baseline}
+    regressions = []
+    for result in results:
+        before = previous.get(_result_key(result))
+        if not before:
+            continue
+        for metric, higher_is_better in REGRESSION_METRICS.items():
+            old, new = before.get(metric), result.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            if (-change if higher_is_better else change) > tolerance:
+                regressions.append(f"{_result_key(result)} {metric}: {old} -> {new} ({change:+.0%})")
+    return regressions
+
+
+def format_table(results: List[Dict[str, Any]]) -> str:
+    """Plain-text report, one row per scenario/profile/concurrency"""
+    columns = [
+        ('scenario', 24), ('profile', 10), ('concurrency', 5), ('p50_ms', 9), ('p95_ms', 9), ('p99_ms', 9),
+        ('throughput', 10), ('empty_rate', 7), ('mean_results', 8), ('kib_per_call', 9), ('retained_kib', 9)
+    ]
+    headers = {'concurrency': 'conc', 'throughput': 'req/s', 'empty_rate': 'empty', 'mean_results': 'results',
+               'kib_per_call': 'KiB/call', 'retained_kib': 'KiB kept'}
+    lines = [' '.join(f"{headers.get(name, name):>{width}}" for name, width in columns)]
+    for result in results:
+        lines.append(' '.join(f"{str(result[name]):>{width}}" for name, width in columns))
+    return '\n'.join(lines)
+
+
+def _parse_list(value: str) -> List[str]:
+    return [item.strip() for item in value.split(',') if item.strip()]
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Offline image_search benchmarks against fake provider servers")
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS), help="Comma-separated scenarios")
+    parser.add_argument('--profiles', default=','.join(DEFAULT_PROFILES), help=f"Comma-separated profiles from {', '.join(PROFILES)}")
+    parser.add_argument('--concurrency', default=','.join(map(str, DEFAULT_CONCURRENCY)), help="Comma-separated concurrency levels")
+    parser.add_argument('--requests', type=int, default=DEFAULT_REQUESTS, help="Calls per scenario and concurrency level")
+    parser.add_argument('--seed', type=int, default=0, help="Seed for latency jitter and error injection")
+    parser.add_argument('--json', action='store_true', help="Print results as JSON instead of a table")
+    parser.add_argument('--save-baseline', metavar='PATH', help="Write results to PATH for later comparison")
+    parser.add_argument('--baseline', metavar='PATH', help="Compare against results saved with --save-baseline")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="Allowed relative regression (default 0.25)")
+    parser.add_argument('--import-only', action='store_true', help="Only check the cold-import budgets")
+    parser.add_argument('--skip-import', action='store_true', help="Skip the cold-import budget check")
+    args = parser.parse_args(argv)
+    
+    failures = []
+    if not args.skip_import:
+        measurements, failures = check_import_budgets()
+        for measurement in measurements:
+            print(f"import {measurement['module']}: {measurement['import_ms']} ms (budget {measurement['budget_ms']} ms)")
+        for failure in failures:
+            print(f"  FAIL {failure}", file=sys.stderr)
+        if args.import_only:
+            return 1 if failures else 0
+        print()
+    
+    scenarios = _parse_list(args.scenarios)
+    profiles = _parse_list(args.profiles)
+    unknown = [name for name in scenarios if name not in SCENARIOS] + [name for name in profiles if name not in PROFILES]
+    if unknown:
+        parser.error(f"unknown scenario or profile: {', '.join(unknown)}")
+    
+    results = run_benchmarks(
+        scenarios, profiles, [int(level) for level in _parse_list(args.concurrency)],
+        requests=args.requests, seed=args.seed
+    )
+    print(json.dumps(results, indent=2) if args.json else format_table(results))
+    
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+    
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare_to_baseline(results, json.load(f), args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) beyond {args.tolerance:.0%}:", file=sys.stderr)
+            for regression in regressions:
+                print(f"  {regression}", file=sys.stderr)
+            return 1
+    
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -17,11 +17,18 @@ import os
 import base64
 import io
 from typing import List, Dict, Optional, Union
-import requests
-from openai import OpenAI
 
-# Initialiser le client OpenAI
-openai_client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
+# Client OpenAI (créé au premier appel : le SDK n'est importé qu'à ce moment-là)
+openai_client = None
+
+
+def get_openai_client():
+    """Client OpenAI partagé, créé au premier appel"""
+    global openai_client
+    if openai_client is None:
+        from openai import OpenAI
+        openai_client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
+    return openai_client
 
 
 def generate_image_gpt(
@@ -64,7 +71,7 @@ def generate_image_gpt(
         if quality == "hd":
             full_prompt += " [High quality, detailed]"
         
-        response = openai_client.responses.create(
+        response = get_openai_client().responses.create(
             model=model,
             input=full_prompt,
             tools=[{"type": "image_generation"}]
@@ -136,7 +143,7 @@ def edit_image_gpt(
         Base image (base64): {base64_image[:100]}...
         """
         
-        response = openai_client.responses.create(
+        response = get_openai_client().responses.create(
             model=model,
             input=edit_instruction,
             tools=[{"type": "image_generation"}]
@@ -206,7 +213,7 @@ def generate_with_context_gpt(
             if context_data:
                 full_prompt += f"\n\nReference style context: {len(context_data)} images provided"
         
-        response = openai_client.responses.create(
+        response = get_openai_client().responses.create(
             model=model,
             input=full_prompt,
             tools=[{"type": "image_generation"}]
@@ -0,0 +1,418 @@
+"""
+Image Downloads - Fetch selected search results to disk
+
+Downloads the full-resolution `url` of chosen image results with bounded
+async concurrency. Bodies are streamed to disk in chunks, interrupted
+transfers resume with Range requests, size limits are enforced before and
+while reading, checksums are verified, and files are stored under their
+content hash so the same image is only kept once.
+
+Usage:
+    results = search_all_images("coffee beans")[:5]
+    downloads = download_images_sync(results, dest_dir="assets/images")
+    # [{'url': ..., 'status': 'downloaded', 'path': 'assets/images/3f2a...e1.jpg', 'sha256': ..., 'bytes': ...}, ...]
+"""
+
+from __future__ import annotations
+
+import os
+import re
+import json
+import time
+import base64
+import asyncio
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Optional, Any, Union, Iterable, Tuple
+
+from image_search import ImageResult, get_transport, get_metrics, trace, _LazyModule
+
+
+# Imported on first use so a bare import stays cheap (checked by the benchmark's import budgets)
+aiohttp = _LazyModule('aiohttp')
+
+
+# Downloads running at once
+DOWNLOAD_CONCURRENCY = int(os.getenv('IMAGE_DOWNLOAD_CONCURRENCY', '6'))
+
+# Largest file accepted, in bytes
+DOWNLOAD_MAX_BYTES = int(os.getenv('IMAGE_DOWNLOAD_MAX_BYTES', str(50 * 1024 * 1024)))
+
+# Bytes read from the network and written to disk at a time
+DOWNLOAD_CHUNK_SIZE = 256 * 1024
+
+# Attempts per file; each retry resumes from the bytes already on disk
+DOWNLOAD_ATTEMPTS = 3
+
+# Directory used when no destination is given
+DEFAULT_DOWNLOAD_DIR = os.getenv('IMAGE_DOWNLOAD_DIR', 'downloads')
+
+# Leading bytes identifying each stored image format, with its file extension
+IMAGE_SIGNATURES = (
+    (b'\xff\xd8\xff', 'jpg'),
+    (b'\x89PNG\r\n\x1a\n', 'png'),
+    (b'GIF87a', 'gif'),
+    (b'GIF89a', 'gif'),
+)
+
+_CONTENT_RANGE_PATTERN = re.compile(r'bytes\s+(\d+)-(\d+)/(\d+|\*)')
+
+# Worker thread for sync callers that already run an event loop
+_download_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='image-download')
+
+
+class DownloadError(Exception):
+    """Raised when a file cannot be downloaded; `retryable` transfers resume on the next attempt"""
+    
+    def __init__(self, message: str, retryable: bool = False):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+def sniff_extension(head: bytes) -> Optional[str]:
+    """File extension of an image from its first bytes, None when it is not a known image format"""
+    for signature, extension in IMAGE_SIGNATURES:
+        if head.startswith(signature):
+            return extension
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'webp'
+    if head[4:12] in (b'ftypavif', b'ftypavis'):
+        return 'avif'
+    return None
+
+
+def _partial_paths(dest_dir: str, url: str) -> Tuple[str, str]:
+    """Partial file and its metadata sidecar for a URL"""
+    name = hashlib.sha1(url.encode('utf-8')).hexdigest()
+    partial_dir = os.path.join(dest_dir, '.partial')
+    return os.path.join(partial_dir, f'{name}.part'), os.path.join(partial_dir, f'{name}.json')
+
+
+def _load_validator(meta_path: str) -> Dict[str, str]:
+    """ETag / Last-Modified saved with a partial file ({} when absent or unreadable)"""
+    try:
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _hash_file(path: str) -> Tuple[Any, int]:
+    """SHA-256 state and size of the bytes already on disk"""
+    digest = hashlib.sha256()
+    size = 0
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(DOWNLOAD_CHUNK_SIZE), b''):
+            digest.update(block)
+            size += len(block)
+    return digest, size
+
+
+def _append(f, chunk: bytes, digests: Tuple[Any, ...]):
+    """Write a chunk and fold it into the running checksums (run off the event loop)"""
+    f.write(chunk)
+    for digest in digests:
+        digest.update(chunk)
+
+
+def _expected_md5(headers) -> Optional[str]:
+    """Base64 MD5 of the whole body advertised by the server (Content-MD5 or GCS x-goog-hash)"""
+    if headers.get('Content-MD5'):
+        return headers['Content-MD5'].strip()
+    for part in headers.get('x-goog-hash', '').split(','):
+        name, _, value = part.strip().partition('=')
+        if name == 'md5' and value:
+            return value
+    return None
+
+
+def _discard(*paths: str):
+    for path in paths:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+async def _transfer(
+    session: aiohttp.ClientSession,
+    url: str,
+    partial_path: str,
+    meta_path: str,
+    max_bytes: int,
+    timeout: float
+) -> Tuple[Any, int, bool]:
+    """
+    One request appending the rest of `url` to its partial file
+    
+    Returns:
+        (SHA-256 state of the whole file, size, whether earlier bytes were reused)
+    """
+    headers = {}
+    offset = os.path.getsize(partial_path) if os.path.exists(partial_path) else 0
+    validator = _load_validator(meta_path) if offset else {}
+    # Without a validator the bytes on disk may belong to another version of the file
+    if offset and (validator.get('etag') or validator.get('last_modified')):
+        headers['Range'] = f'bytes={offset}-'
+        headers['If-Range'] = validator.get('etag') or validator['last_modified']
+    else:
+        offset = 0
+    
+    async with session.get(url, headers=headers, timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+        if response.status == 416 and offset:
+            # The partial file may already hold the whole body
+            match = re.fullmatch(r'bytes\s+\*/(\d+)', response.headers.get('Content-Range', ''))
+            if match and int(match.group(1)) == offset:
+                digest, size = await asyncio.to_thread(_hash_file, partial_path)
+                return digest, size, True
+            _discard(partial_path, meta_path)
+            raise DownloadError(f"range not satisfiable at byte {offset}", retryable=True)
+        if response.status == 429 or response.status >= 500:
+            raise DownloadError(f"HTTP {response.status}", retryable=True)
+        if response.status not in (200, 206):
+            raise DownloadError(f"HTTP {response.status}")
+        
+        total = response.content_length
+        if response.status == 206:
+            match = _CONTENT_RANGE_PATTERN.fullmatch(response.headers.get('Content-Range', ''))
+            if not match or int(match.group(1)) != offset:
+                _discard(partial_path, meta_path)
+                raise DownloadError("unexpected Content-Range, restarting", retryable=True)
+            total = None if match.group(3) == '*' else int(match.group(3))
+        else:
+            # Range ignored or the file changed since the partial download
+            offset = 0
+        if total is not None and total > max_bytes:
+            raise DownloadError(f"file is {total} bytes, over the {max_bytes} byte limit")
+        
+        with open(meta_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'url': url,
+                'etag': response.headers.get('ETag', ''),
+                'last_modified': response.headers.get('Last-Modified', '')
+            }, f)
+        
+        # Re-hashing the bytes on disk and writing chunks would otherwise block
+        # every other download sharing the loop
+        if offset:
+            digest, size = await asyncio.to_thread(_hash_file, partial_path)
+        else:
+            digest, size = hashlib.sha256(), 0
+        md5 = hashlib.md5() if response.status == 200 and _expected_md5(response.headers) else None
+        digests = (digest,) if md5 is None else (digest, md5)
+        
+        with open(partial_path, 'ab' if offset else 'wb') as f:
+            try:
+                async for chunk in response.content.iter_chunked(DOWNLOAD_CHUNK_SIZE):
+                    size += len(chunk)
+                    if size > max_bytes:
+                        raise DownloadError(f"file exceeds the {max_bytes} byte limit")
+                    await asyncio.to_thread(_append, f, chunk, digests)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                raise DownloadError(f"transfer interrupted at byte {size}: {e or type(e).__name__}", retryable=True) from e
+        
+        if total is not None and size != total:
+            raise DownloadError(f"received {size} of {total} bytes", retryable=True)
+        if md5 is not None and base64.b64encode(md5.digest()).decode('ascii') != _expected_md5(response.headers):
+            _discard(partial_path, meta_path)
+            raise DownloadError("MD5 mismatch with the server checksum", retryable=True)
+        return digest, size, offset > 0
+
+
+async def download_image(
+    url: str,
+    dest_dir: str = DEFAULT_DOWNLOAD_DIR,
+    session: Optional[aiohttp.ClientSession] = None,
+    sha256: Optional[str] = None,
+    max_bytes: int = DOWNLOAD_MAX_BYTES,
+    timeout: float = 120,
+    attempts: int = DOWNLOAD_ATTEMPTS
+) -> Dict[str, Any]:
+    """
+    Download one image into `dest_dir`, named after its SHA-256
+    
+    Args:
+        url: Image URL
+        dest_dir: Destination directory (created when missing)
+        session: aiohttp session (defaults to the shared transport's 'download' pool)
+        sha256: Expected hex SHA-256 of the file, verified when given
+        max_bytes: Largest file accepted
+        timeout: Per-attempt timeout in seconds
+        attempts: Attempts, each resuming where the previous one stopped
+    
+    Returns:
+        Dict with 'url', 'status' ('downloaded', 'duplicate' or 'error'),
+        'path', 'sha256', 'bytes', 'resumed' and 'error'
+    """
+    if session is None:
+        # The pooled session is closed with the loop's last scope (e.g. at the end of asyncio.run)
+        async with get_transport().loop_scope():
+            return await download_image(
+                url, dest_dir, get_transport().async_session('download'), sha256, max_bytes, timeout, attempts
+            )
+    partial_path, meta_path = _partial_paths(dest_dir, url)
+    os.makedirs(os.path.dirname(partial_path), exist_ok=True)
+    result = {'url': url, 'status': 'error', 'path': None, 'sha256': None, 'bytes': 0, 'resumed': False, 'error': None}
+    
+    with trace('image_download.file', url=url) as span:
+        for attempt in range(attempts):
+            try:
+                digest, size, resumed = await _transfer(session, url, partial_path, meta_path, max_bytes, timeout)
+                result['resumed'] = result['resumed'] or resumed
+                break
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                result['error'] = str(e) or type(e).__name__
+            except DownloadError as e:
+                result['error'] = str(e)
+                if not e.retryable:
+                    _discard(partial_path, meta_path)
+                    span.set(status='error')
+                    return result
+            if attempt + 1 < attempts:
+                await asyncio.sleep(0.5 * 2 ** attempt)
+        else:
+            span.set(status='error')
+            return result
+        
+        with open(partial_path, 'rb') as f:
+            extension = sniff_extension(f.read(16))
+        checksum = digest.hexdigest()
+        if extension is None or (sha256 and checksum != sha256.lower()):
+            if extension is None:
+                result['error'] = "response is not a supported image format"
+            else:
+                result['error'] = f"SHA-256 mismatch (expected {sha256}, got {checksum})"
+            _discard(partial_path, meta_path)
+            span.set(status='error')
+            return result
+        
+        # Content-addressed names: a second copy of the same bytes is dropped
+        path = os.path.join(dest_dir, f'{checksum}.{extension}')
+        if os.path.exists(path):
+            _discard(partial_path, meta_path)
+            result['status'] = 'duplicate'
+        else:
+            os.replace(partial_path, path)
+            _discard(meta_path)
+            result['status'] = 'downloaded'
+        result.update(path=path, sha256=checksum, bytes=size, error=None)
+        span.set(status=result['status'], bytes=size, resumed=result['resumed'])
+    
+    get_metrics().inc('image_download_bytes_total', size, status=result['status'])
+    return result
+
+
+def _image_url(item: Union[str, Dict[str, Any], ImageResult]) -> str:
+    if isinstance(item, str):
+        return item
+    if isinstance(item, ImageResult):
+        return item.url
+    return item.get('url', '')
+
+
+async def download_images(
+    results: Iterable[Union[str, Dict[str, Any], ImageResult]],
+    dest_dir: str = DEFAULT_DOWNLOAD_DIR,
+    concurrency: int = DOWNLOAD_CONCURRENCY,
+    checksums: Optional[Dict[str, str]] = None,
+    max_bytes: int = DOWNLOAD_MAX_BYTES,
+    timeout: float = 120,
+    session: Optional[aiohttp.ClientSession] = None
+) -> List[Dict[str, Any]]:
+    """
+    Download the full-resolution files of search results concurrently
+    
+    Results repeating the same URL are fetched once. Different URLs are all
+    fetched, even when they only differ by size parameters (canonical_url
+    treats those as one image, but the files differ); files with identical
+    content are then stored once whatever their URL.
+    
+    Args:
+        results: Image results (dicts, ImageResult models or plain URLs)
+        dest_dir: Destination directory
+        concurrency: Downloads running at once
+        checksums: Expected hex SHA-256 per URL
+        max_bytes: Largest file accepted
+        timeout: Per-attempt timeout in seconds
+        session: aiohttp session (defaults to the shared transport's 'download' pool)
+    
+    Returns:
+        One download report per result, in input order (see download_image)
+    """
+    if session is None:
+        # One pooled session for the whole batch, closed with the loop's last scope
+        async with get_transport().loop_scope():
+            return await download_images(
+                results, dest_dir, concurrency, checksums, max_bytes, timeout, get_transport().async_session('download')
+            )
+    urls = [_image_url(item) for item in results]
+    checksums = checksums or {}
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    downloads: Dict[str, asyncio.Task] = {}
+    
+    async def bounded(url: str) -> Dict[str, Any]:
+        async with semaphore:
+            return await download_image(
+                url, dest_dir, session=session, sha256=checksums.get(url), max_bytes=max_bytes, timeout=timeout
+            )
+    
+    for url in urls:
+        if url and url not in downloads:
+            downloads[url] = asyncio.ensure_future(bounded(url))
+    
+    try:
+        await asyncio.gather(*downloads.values())
+    finally:
+        for task in downloads.values():
+            task.cancel()
+    
+    reports = []
+    for url in urls:
+        if not url:
+            reports.append({'url': url, 'status': 'error', 'path': None, 'sha256': None, 'bytes': 0,
+                            'resumed': False, 'error': "result has no URL"})
+            continue
+        reports.append(dict(downloads[url].result()))
+    return reports
+
+
+def download_images_sync(
+    results: Iterable[Union[str, Dict[str, Any], ImageResult]],
+    dest_dir: str = DEFAULT_DOWNLOAD_DIR,
+    concurrency: int = DOWNLOAD_CONCURRENCY,
+    checksums: Optional[Dict[str, str]] = None,
+    max_bytes: int = DOWNLOAD_MAX_BYTES,
+    timeout: float = 120
+) -> List[Dict[str, Any]]:
+    """download_images for sync callers, safe to use while an event loop is running"""
+    results = list(results)
+    
+    async def run():
+        connector = aiohttp.TCPConnector(limit=concurrency)
+        async with aiohttp.ClientSession(connector=connector) as session:
+            return await download_images(results, dest_dir, concurrency, checksums, max_bytes, timeout, session)
+    
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(run())
+    # asyncio.run can't nest inside a running loop, so use a worker thread
+    return _download_executor.submit(asyncio.run, run()).result()
+
+
+def clean_partial_downloads(dest_dir: str = DEFAULT_DOWNLOAD_DIR, max_age_hours: float = 24) -> int:
+    """Delete partial downloads untouched for `max_age_hours`; returns how many files were removed"""
+    partial_dir = os.path.join(dest_dir, '.partial')
+    if not os.path.isdir(partial_dir):
+        return 0
+    cutoff = time.time() - max_age_hours * 3600
+    removed = 0
+    for name in os.listdir(partial_dir):
+        path = os.path.join(partial_dir, name)
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+                removed += 1
+        except OSError:
+            pass
+    return removed
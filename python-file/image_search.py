@@ -2,17 +2,63 @@
 Image Search Tools - Search various image APIs
 """
 
+from __future__ import annotations
+
 import os
+import re
+import io
+import sys
 import json
 import asyncio
 import base64
-from typing import List, Dict, Optional, Any
-import requests
-import aiohttp
+import time
+import hashlib
+import sqlite3
+import threading
+import functools
+import importlib
+from array import array
+from contextlib import contextmanager, asynccontextmanager
+from contextvars import ContextVar, copy_context
+from collections import OrderedDict, Counter, deque
+from urllib.parse import urlsplit, parse_qsl, urlencode
+from email.utils import parsedate_to_datetime
+from concurrent.futures import Future, ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import List, Dict, Optional, Any, Tuple, Union, Iterable, Iterator, AsyncIterator, Callable
 from pydantic import BaseModel
-from agents import function_tool
-from openai import OpenAI
-from tenacity import retry, stop_after_attempt, wait_exponential
+
+
+class _LazyModule:
+    """
+    Stand-in for a heavy dependency, imported on first attribute access
+    
+    Keeps `import image_search` cheap for cold-started workers: numpy,
+    requests and aiohttp are only loaded by the first call that uses them.
+    (Annotations are postponed, so they never trigger the import.)
+    """
+    
+    def __init__(self, name: str):
+        self._name = name
+        self._module = None
+    
+    def __getattr__(self, attr: str):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+
+np = _LazyModule('numpy')
+requests = _LazyModule('requests')
+aiohttp = _LazyModule('aiohttp')
+
+
+def _pil_image():
+    """PIL.Image, or None when Pillow is missing (only perceptual dedup needs it)"""
+    try:
+        from PIL import Image
+    except ImportError:
+        return None
+    return Image
 
 
 class ImageResult(BaseModel):
@@ -37,88 +83,4025 @@ class SearchFilters(BaseModel):
     category: str = "all"    # nature, people, technology, etc.
 
 
-class DataForSEOImageSearch:
-    """DataForSEO Image Search client"""
+class ImageBatch(BaseModel):
+    """Model for a batch of results from one source for one query"""
+    query: str
+    source: str
+    results: List[ImageResult]
+
+
+class ResultBatch:
+    """
+    Compact columnar storage for image search results
+    
+    Each field is one column: lists for per-image strings, interned strings
+    for the few distinct source/license values and typed arrays for
+    width/height/cost/score. ImageResult models are only built when an item
+    is accessed, and dicts only when a caller asks for them.
+    """
+    
+    STR_FIELDS = (
+        'url', 'preview_url', 'title', 'alt', 'photographer',
+        'photographer_url', 'source_website', 'original_url'
+    )
+    INTERNED_FIELDS = ('source', 'license')
+    INT_FIELDS = ('width', 'height')
+    FLOAT_FIELDS = ('cost', 'relevance_score')
+    FIELDS = STR_FIELDS + INTERNED_FIELDS + INT_FIELDS + FLOAT_FIELDS
+    DEFAULTS = {
+        **{name: '' for name in STR_FIELDS},
+        'source': '', 'license': 'unknown',
+        'width': 0, 'height': 0, 'cost': 0.0, 'relevance_score': 0.8
+    }
+    
+    __slots__ = FIELDS
     
     def __init__(self):
-        self.login = os.getenv('DATAFORSEO_LOGIN')
-        self.password = os.getenv('DATAFORSEO_PASSWORD')
-        self.base_url = "https://api.dataforseo.com/v3"
+        for name in self.STR_FIELDS + self.INTERNED_FIELDS:
+            setattr(self, name, [])
+        for name in self.INT_FIELDS:
+            setattr(self, name, array('l'))
+        for name in self.FLOAT_FIELDS:
+            setattr(self, name, array('d'))
+    
+    def append(
+        self,
+        url: str,
+        preview_url: str = '',
+        source: str = '',
+        license: str = 'unknown',
+        cost: float = 0.0,
+        width: int = 0,
+        height: int = 0,
+        title: str = '',
+        relevance_score: float = 0.8,
+        photographer: str = '',
+        source_website: str = '',
+        alt: str = '',
+        original_url: str = '',
+        photographer_url: str = '',
+        **_ignored
+    ):
+        """Add one result (unknown keyword fields are ignored)"""
+        self.url.append(url or '')
+        self.preview_url.append(preview_url or '')
+        self.title.append(title or '')
+        self.alt.append(alt or '')
+        self.photographer.append(photographer or '')
+        self.photographer_url.append(photographer_url or '')
+        self.source_website.append(source_website or '')
+        self.original_url.append(original_url or '')
+        self.source.append(sys.intern(source or ''))
+        self.license.append(sys.intern(license or 'unknown'))
+        self.width.append(int(width or 0))
+        self.height.append(int(height or 0))
+        self.cost.append(float(cost or 0.0))
+        self.relevance_score.append(float(relevance_score if relevance_score is not None else 0.8))
+    
+    def __len__(self) -> int:
+        return len(self.url)
+    
+    def __bool__(self) -> bool:
+        return bool(self.url)
+    
+    def __getitem__(self, index: Union[int, slice]) -> Union['ImageResult', 'ResultBatch']:
+        if isinstance(index, slice):
+            return self.take(range(*index.indices(len(self))))
+        row = self.row(index)
+        row['preview_url'] = row['preview_url'] or row['url']
+        return ImageResult(**row)
+    
+    def __iter__(self) -> Iterator['ImageResult']:
+        for i in range(len(self)):
+            yield self[i]
+    
+    def row(self, index: int) -> Dict[str, Any]:
+        """One result as a plain dict"""
+        return {name: getattr(self, name)[index] for name in self.FIELDS}
+    
+    def set_row(self, index: int, **fields):
+        """Update fields of one result in place"""
+        for name, value in fields.items():
+            column = getattr(self, name)
+            column[index] = sys.intern(value) if name in self.INTERNED_FIELDS else value
+    
+    def to_dicts(self) -> List[Dict[str, Any]]:
+        """All results as plain dicts"""
+        columns = [(name, getattr(self, name)) for name in self.FIELDS]
+        return [{name: column[i] for name, column in columns} for i in range(len(self))]
+    
+    @classmethod
+    def from_dicts(cls, results: Iterable[Dict[str, Any]]) -> 'ResultBatch':
+        """Build a batch from provider-style dicts"""
+        batch = cls()
+        for img in results:
+            batch.append(**img)
+        return batch
+    
+    def take(self, indices: Iterable[int]) -> 'ResultBatch':
+        """New batch holding the given rows, in the given order"""
+        indices = list(indices)
+        batch = ResultBatch()
+        for name in self.FIELDS:
+            column = getattr(self, name)
+            selected = [column[i] for i in indices]
+            if isinstance(column, array):
+                selected = array(column.typecode, selected)
+            setattr(batch, name, selected)
+        return batch
+    
+    def copy(self) -> 'ResultBatch':
+        """Independent copy (columns are copied, strings are shared)"""
+        batch = ResultBatch()
+        for name in self.FIELDS:
+            column = getattr(self, name)
+            setattr(batch, name, array(column.typecode, column) if isinstance(column, array) else list(column))
+        return batch
+    
+    def extend(self, other: 'ResultBatch'):
+        """Append every row of another batch"""
+        for name in self.FIELDS:
+            getattr(self, name).extend(getattr(other, name))
+    
+    @classmethod
+    def concat(cls, batches: Iterable['ResultBatch']) -> 'ResultBatch':
+        """Concatenate batches in order"""
+        merged = cls()
+        for batch in batches:
+            merged.extend(batch)
+        return merged
+    
+    def to_payload(self) -> Dict[str, List[Any]]:
+        """JSON-serializable columnar form"""
+        return {name: list(getattr(self, name)) for name in self.FIELDS}
+    
+    @classmethod
+    def from_payload(cls, payload: Union[Dict[str, List[Any]], List[Dict[str, Any]]]) -> 'ResultBatch':
+        """Rebuild a batch from to_payload() output (or a list of dicts)"""
+        if isinstance(payload, list):
+            return cls.from_dicts(payload)
         
-        if not self.login or not self.password:
-            raise ValueError("DataForSEO credentials not found. Set DATAFORSEO_LOGIN and DATAFORSEO_PASSWORD in .env")
+        batch = cls()
+        size = len(payload.get('url', []))
+        for name in cls.FIELDS:
+            values = payload.get(name) or [cls.DEFAULTS[name]] * size
+            if name in cls.INT_FIELDS:
+                setattr(batch, name, array('l', values))
+            elif name in cls.FLOAT_FIELDS:
+                setattr(batch, name, array('d', values))
+            elif name in cls.INTERNED_FIELDS:
+                setattr(batch, name, [sys.intern(value) for value in values])
+            else:
+                setattr(batch, name, list(values))
+        return batch
+
+
+class ProviderError(Exception):
+    """Raised by provider fetchers when a request fails"""
+    
+    def __init__(self, provider: str, message: str, status: Optional[int] = None, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.provider = provider
+        self.message = message
+        self.status = status
+        self.retry_after = retry_after
+    
+    @property
+    def throttled(self) -> bool:
+        """Whether the provider asked us to slow down (429 or 5xx)"""
+        return self.status is not None and (self.status == 429 or self.status >= 500)
+
+
+class ProviderUnavailable(ProviderError):
+    """Raised without any network call when a provider's circuit breaker is open"""
+    
+    def __str__(self) -> str:
+        if self.status is not None:
+            return f"{self.provider} error: {self.status} - {self.message}"
+        return f"{self.provider} error: {self.message}"
+
+
+class SearchCancelled(ProviderError):
+    """Raised instead of sending a request for a speculative plan step that is no longer needed"""
+
+
+# Provider API roots (overridable for staging or local stand-in servers)
+PROVIDER_ENDPOINTS = {
+    'pexels': os.getenv('PEXELS_API_URL', 'https://api.pexels.com/v1'),
+    'everypixel': os.getenv('EVERYPIXEL_API_URL', 'https://api.everypixel.com/v1'),
+    'dataforseo': os.getenv('DATAFORSEO_API_URL', 'https://api.dataforseo.com/v3'),
+}
+
+
+class ProviderTransport:
+    """
+    Long-lived, pooled HTTP sessions shared by every provider call
+    
+    One requests.Session per provider host for the sync path and one
+    aiohttp.ClientSession per (provider, event loop) for the async path, so
+    TCP+TLS handshakes are paid once instead of on every query.
+    
+    Args:
+        pool_size: Default number of pooled connections per provider host
+        keepalive: Seconds an idle async connection is kept open
+        pool_sizes: Per-provider overrides of pool_size
+    """
+    
+    def __init__(self, pool_size: int = 10, keepalive: float = 30.0, pool_sizes: Optional[Dict[str, int]] = None):
+        self.pool_size = pool_size
+        self.keepalive = keepalive
+        self.pool_sizes = dict(pool_sizes or {})
+        self._sessions: Dict[str, requests.Session] = {}
+        self._async_sessions: Dict[Tuple[str, int], Tuple[asyncio.AbstractEventLoop, aiohttp.ClientSession]] = {}
+        self._scopes: Dict[int, int] = {}
+        self._scoped: Dict[int, set] = {}
+        self._closing: set = set()
+        self._lock = threading.Lock()
+    
+    def pool_size_for(self, provider: str) -> int:
+        """Connection pool size for a provider host"""
+        return self.pool_sizes.get(provider, self.pool_size)
+    
+    def session(self, provider: str) -> requests.Session:
+        """Pooled keep-alive requests session for a provider host"""
+        session = self._sessions.get(provider)
+        if session is not None:
+            return session
         
-        # Create auth header
-        credentials = f"{self.login}:{self.password}"
-        self.auth_header = f"Basic {base64.b64encode(credentials.encode()).decode('utf-8')}"
+        with self._lock:
+            session = self._sessions.get(provider)
+            if session is None:
+                size = self.pool_size_for(provider)
+                adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=size, max_retries=0)
+                session = requests.Session()
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                session.headers['Connection'] = 'keep-alive'
+                self._sessions[provider] = session
+        return session
     
-    def search_images(self, query: str, depth: int = 100) -> List[Dict[str, Any]]:
-        """Search images using DataForSEO Google Images API"""
-        headers = {
-            'Authorization': self.auth_header,
-            'Content-Type': 'application/json'
+    def async_session(self, provider: str) -> aiohttp.ClientSession:
+        """Pooled keep-alive aiohttp session for a provider host, bound to the running loop"""
+        loop = asyncio.get_running_loop()
+        key = (provider, id(loop))
+        
+        with self._lock:
+            entry = self._async_sessions.get(key)
+            if entry is not None and entry[0] is loop and not entry[1].closed:
+                return entry[1]
+            
+            # Replace sessions whose event loop has gone away (e.g. finished asyncio.run
+            # calls). Their connector knows the loop is closed, so closing them here
+            # only releases the session without touching the dead loop
+            stale = [entry[1]] if entry is not None else []
+            for stale_key, (stale_loop, stale_session) in list(self._async_sessions.items()):
+                if stale_loop.is_closed():
+                    del self._async_sessions[stale_key]
+                    stale.append(stale_session)
+            for stale_session in stale:
+                if not stale_session.closed:
+                    closing = loop.create_task(stale_session.close())
+                    self._closing.add(closing)
+                    closing.add_done_callback(self._closing.discard)
+            
+            size = self.pool_size_for(provider)
+            connector = aiohttp.TCPConnector(
+                limit=size,
+                limit_per_host=size,
+                keepalive_timeout=self.keepalive,
+                ttl_dns_cache=300
+            )
+            session = aiohttp.ClientSession(connector=connector)
+            self._async_sessions[key] = (loop, session)
+            if id(loop) in self._scopes:
+                self._scoped.setdefault(id(loop), set()).add(key)
+        return session
+    
+    def close(self):
+        """Close pooled sync sessions"""
+        with self._lock:
+            sessions = list(self._sessions.values())
+            self._sessions.clear()
+        for session in sessions:
+            session.close()
+    
+    async def aclose(self):
+        """Close pooled sessions, including the async ones bound to the running loop"""
+        self.close()
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            owned = [key for key, (session_loop, _) in self._async_sessions.items() if session_loop is loop]
+            sessions = [self._async_sessions.pop(key)[1] for key in owned]
+        for session in sessions:
+            await session.close()
+    
+    @asynccontextmanager
+    async def loop_scope(self):
+        """
+        Scope of an async entry point whose loop may end with it (e.g. asyncio.run)
+        
+        Async sessions opened on the running loop while any scope is open are
+        closed when the loop's last open scope exits, so concurrent calls never
+        lose a session another one is using; sessions the loop had before stay pooled.
+        """
+        loop_id = id(asyncio.get_running_loop())
+        with self._lock:
+            self._scopes[loop_id] = self._scopes.get(loop_id, 0) + 1
+        try:
+            yield
+        finally:
+            sessions = []
+            with self._lock:
+                self._scopes[loop_id] -= 1
+                if not self._scopes[loop_id]:
+                    del self._scopes[loop_id]
+                    keys = self._scoped.pop(loop_id, set())
+                    sessions = [self._async_sessions.pop(key)[1] for key in keys if key in self._async_sessions]
+            for session in sessions:
+                await session.close()
+
+
+_transport = ProviderTransport(
+    pool_size=int(os.getenv('IMAGE_SEARCH_POOL_SIZE', '10')),
+    keepalive=float(os.getenv('IMAGE_SEARCH_KEEPALIVE', '30'))
+)
+
+
+def configure_transport(pool_size: int = 10, keepalive: float = 30.0, pool_sizes: Optional[Dict[str, int]] = None) -> ProviderTransport:
+    """
+    Replace the shared provider transport with new pool settings
+    
+    Args:
+        pool_size: Default number of pooled connections per provider host
+        keepalive: Seconds an idle async connection is kept open
+        pool_sizes: Per-provider overrides, e.g. {'dataforseo': 20}
+        
+    Returns:
+        The new transport
+    """
+    global _transport
+    previous = _transport
+    _transport = ProviderTransport(pool_size=pool_size, keepalive=keepalive, pool_sizes=pool_sizes)
+    previous.close()
+    return _transport
+
+
+def get_transport() -> ProviderTransport:
+    """Shared provider transport used by all search functions"""
+    return _transport
+
+
+# Cache lifetimes (seconds) per provider; SERP results drift faster than stock libraries
+DEFAULT_CACHE_TTLS = {
+    'pexels': 24 * 3600,
+    'everypixel': 24 * 3600,
+    'dataforseo': 6 * 3600,
+}
+
+
+class ResultCache:
+    """
+    Disk-backed TTL/LRU cache of provider search results
+    
+    Entries live in SQLite keyed by provider, normalized query and request
+    parameters, with a small in-memory LRU in front so repeated lookups are
+    served without touching disk. Results are stored as columnar
+    ResultBatch payloads and returned as fresh copies so callers can mutate
+    them freely.
+    
+    Args:
+        path: SQLite file path (':memory:' for a process-local cache)
+        ttls: Per-provider TTLs in seconds overriding DEFAULT_CACHE_TTLS
+        max_entries: Upper bound on stored entries, least recently used evicted first
+        memory_entries: Size of the in-memory front cache
+    """
+    
+    def __init__(
+        self,
+        path: str,
+        ttls: Optional[Dict[str, float]] = None,
+        max_entries: int = 5000,
+        memory_entries: int = 512
+    ):
+        self.path = path
+        self.ttls = {**DEFAULT_CACHE_TTLS, **(ttls or {})}
+        self.max_entries = max_entries
+        self.memory_entries = memory_entries
+        self.bypass = False
+        self.hits: Dict[str, int] = {}
+        self.misses: Dict[str, int] = {}
+        self._memory: 'OrderedDict[str, Tuple[float, ResultBatch]]' = OrderedDict()
+        self._touched: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._db = self._connect(path)
+    
+    @staticmethod
+    def _connect(path: str) -> sqlite3.Connection:
+        """Open the cache database, falling back to memory when the file is unusable"""
+        try:
+            if path != ':memory:':
+                os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+        except (OSError, sqlite3.Error) as e:
+            print(f"Image cache unavailable at {path} ({e}), using memory only")
+            db = sqlite3.connect(':memory:', check_same_thread=False, isolation_level=None)
+        
+        db.execute("PRAGMA synchronous=NORMAL")
+        db.execute("""
+            CREATE TABLE IF NOT EXISTS results (
+                key TEXT PRIMARY KEY,
+                provider TEXT NOT NULL,
+                query TEXT NOT NULL,
+                params TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+        """)
+        db.execute("CREATE INDEX IF NOT EXISTS results_accessed ON results (accessed_at)")
+        return db
+    
+    @staticmethod
+    def normalize_query(query: str) -> str:
+        """Case- and whitespace-insensitive form of a query"""
+        return ' '.join(query.lower().split())
+    
+    @classmethod
+    def make_key(cls, provider: str, query: str, params: Optional[Dict[str, Any]] = None) -> str:
+        """Stable cache key for a provider request"""
+        raw = json.dumps([provider, cls.normalize_query(query), params or {}], sort_keys=True, default=str)
+        return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+    
+    def ttl(self, provider: str) -> float:
+        """TTL in seconds for a provider (one hour when unknown)"""
+        return self.ttls.get(provider, 3600)
+    
+    def get(
+        self,
+        provider: str,
+        query: str,
+        params: Optional[Dict[str, Any]] = None,
+        record: bool = True
+    ) -> Optional[ResultBatch]:
+        """
+        Cached results for a request, or None on miss/expiry/bypass
+        
+        Args:
+            provider: Provider name
+            query: Search query
+            params: Request parameters
+            record: Count the lookup in the hit/miss stats (off when the caller records it itself)
+        """
+        if self.bypass:
+            return None
+        
+        key = self.make_key(provider, query, params)
+        now = time.time()
+        
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and entry[0] > now:
+                self._memory.move_to_end(key)
+                self._touched[key] = now
+                if record:
+                    self._record(provider, True)
+                return entry[1].copy()
+            
+            row = self._db.execute(
+                "SELECT payload, created_at FROM results WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or row[1] + self.ttl(provider) <= now:
+                self._memory.pop(key, None)
+                if record:
+                    self._record(provider, False)
+                return None
+            
+            results = ResultBatch.from_payload(json.loads(row[0]))
+            self._remember(key, row[1] + self.ttl(provider), results)
+            self._touched[key] = now
+            if record:
+                self._record(provider, True)
+            return results.copy()
+    
+    def _record(self, provider: str, hit: bool):
+        """Count a lookup (lock held)"""
+        counters = self.hits if hit else self.misses
+        counters[provider] = counters.get(provider, 0) + 1
+    
+    def record(self, provider: str, hit: bool):
+        """Count a lookup answered outside get(), e.g. by the semantic cache"""
+        with self._lock:
+            self._record(provider, hit)
+    
+    def put(self, provider: str, query: str, params: Optional[Dict[str, Any]], results: ResultBatch):
+        """Store successful provider results"""
+        if self.bypass:
+            return
+        
+        key = self.make_key(provider, query, params)
+        now = time.time()
+        payload = json.dumps(results.to_payload(), default=str)
+        
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO results (key, provider, query, params, payload, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, provider, self.normalize_query(query), json.dumps(params or {}, sort_keys=True, default=str),
+                 payload, now, now)
+            )
+            self._remember(key, now + self.ttl(provider), results.copy())
+            self._evict(now)
+    
+    def _remember(self, key: str, expires_at: float, results: ResultBatch):
+        """Insert into the in-memory LRU front"""
+        self._memory[key] = (expires_at, results)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+    
+    def _evict(self, now: float):
+        """Drop expired entries and trim to max_entries by last access"""
+        if self._touched:
+            self._db.executemany(
+                "UPDATE results SET accessed_at = ? WHERE key = ?",
+                [(accessed_at, key) for key, accessed_at in self._touched.items()]
+            )
+            self._touched.clear()
+        
+        for provider, ttl in self.ttls.items():
+            self._db.execute("DELETE FROM results WHERE provider = ? AND created_at < ?", (provider, now - ttl))
+        
+        (count,) = self._db.execute("SELECT COUNT(*) FROM results").fetchone()
+        overflow = count - self.max_entries
+        if overflow > 0:
+            evicted = [row[0] for row in self._db.execute(
+                "SELECT key FROM results ORDER BY accessed_at ASC LIMIT ?", (overflow,)
+            )]
+            self._db.executemany("DELETE FROM results WHERE key = ?", [(key,) for key in evicted])
+            for key in evicted:
+                self._memory.pop(key, None)
+    
+    def entries(self) -> List[Tuple[str, str, str]]:
+        """(provider, normalized query, params JSON) of every stored entry, least recently used first"""
+        with self._lock:
+            return self._db.execute(
+                "SELECT provider, query, params FROM results ORDER BY accessed_at ASC"
+            ).fetchall()
+    
+    def clear(self):
+        """Remove every cached entry and reset counters"""
+        with self._lock:
+            self._db.execute("DELETE FROM results")
+            self._memory.clear()
+            self._touched.clear()
+            self.hits.clear()
+            self.misses.clear()
+    
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters per provider and current size"""
+        with self._lock:
+            (size,) = self._db.execute("SELECT COUNT(*) FROM results").fetchone()
+        hits = sum(self.hits.values())
+        misses = sum(self.misses.values())
+        return {
+            'hits': dict(self.hits),
+            'misses': dict(self.misses),
+            'hit_rate': hits / (hits + misses) if hits + misses else 0.0,
+            'entries': size,
+            'memory_entries': len(self._memory),
+            'bypass': self.bypass
         }
+
+
+_result_cache: Optional[ResultCache] = None
+_result_cache_lock = threading.Lock()
+
+
+def _default_cache_path() -> str:
+    """Cache file from IMAGE_SEARCH_CACHE_PATH, defaulting to ~/.cache/scribe"""
+    path = os.getenv('IMAGE_SEARCH_CACHE_PATH') or os.path.join('~', '.cache', 'scribe', 'image_search.sqlite3')
+    return os.path.expanduser(path)
+
+
+def get_result_cache() -> ResultCache:
+    """Shared provider result cache (opened on first use)"""
+    global _result_cache
+    if _result_cache is None:
+        with _result_cache_lock:
+            if _result_cache is None:
+                _result_cache = ResultCache(
+                    _default_cache_path(),
+                    max_entries=int(os.getenv('IMAGE_SEARCH_CACHE_MAX_ENTRIES', '5000'))
+                )
+                _result_cache.bypass = os.getenv('IMAGE_SEARCH_CACHE', 'on').lower() in ('off', '0', 'false')
+    return _result_cache
+
+
+def configure_cache(
+    path: Optional[str] = None,
+    ttls: Optional[Dict[str, float]] = None,
+    max_entries: int = 5000,
+    bypass: bool = False
+) -> ResultCache:
+    """
+    Replace the shared result cache
+    
+    Args:
+        path: SQLite file path (defaults to IMAGE_SEARCH_CACHE_PATH or ~/.cache/scribe)
+        ttls: Per-provider TTLs in seconds, e.g. {'dataforseo': 3600}
+        max_entries: Upper bound on stored entries
+        bypass: Disable reads and writes globally
         
-        payload = [{
-            "keyword": query,
-            "location_code": 2840,  # United States
-            "language_code": "en",
-            "device": "desktop",
-            "os": "windows",
-            "depth": depth
-        }]
+    Returns:
+        The new cache
+    """
+    global _result_cache
+    with _result_cache_lock:
+        _result_cache = ResultCache(
+            path or _default_cache_path(),
+            ttls=ttls,
+            max_entries=max_entries
+        )
+        _result_cache.bypass = bypass
+    return _result_cache
+
+
+# Words that never change which images a query should return
+QUERY_STOPWORDS = frozenset((
+    'a an the of in on at to for with and or by from into over under near '
+    'image images photo photos picture pictures stock'
+).split())
+
+# Irregular plurals the suffix rules in _lemmatize would get wrong
+_IRREGULAR_LEMMAS = {
+    'people': 'person', 'men': 'man', 'women': 'woman', 'children': 'child', 'mice': 'mouse',
+    'geese': 'goose', 'feet': 'foot', 'teeth': 'tooth', 'leaves': 'leaf', 'knives': 'knife',
+    'wolves': 'wolf', 'lives': 'life', 'wives': 'wife', 'shelves': 'shelf', 'loaves': 'loaf',
+    'buses': 'bus', 'quizzes': 'quiz', 'movies': 'movie', 'cookies': 'cookie', 'zombies': 'zombie',
+    'brownies': 'brownie', 'selfies': 'selfie', 'smoothies': 'smoothie', 'hoodies': 'hoodie',
+    'calories': 'calorie', 'prairies': 'prairie', 'rookies': 'rookie', 'headaches': 'headache',
+    'avalanches': 'avalanche', 'mustaches': 'mustache', 'moustaches': 'moustache', 'niches': 'niche',
+}
+
+# Words ending in "s" that are not plurals (or whose plural means something else)
+_UNINFLECTED = frozenset((
+    'news series species means lens bias chaos canvas atlas christmas texas kansas arkansas vegas '
+    'paris athens mars physics mathematics politics economics ethics athletics gymnastics aerobics '
+    'clothes pants jeans shorts scissors glasses sunglasses binoculars pajamas diabetes measles '
+    'always perhaps thanks'
+).split())
+
+
+def _lemmatize(token: str) -> str:
+    """Singular form of an English noun, by rule plus exception lists (no dictionary)"""
+    if token in _UNINFLECTED:
+        return token
+    if token in _IRREGULAR_LEMMAS:
+        return _IRREGULAR_LEMMAS[token]
+    if len(token) > 4 and token.endswith('ies'):
+        return token[:-3] + 'y'
+    if len(token) > 4 and token.endswith(('sses', 'xes', 'ches', 'shes', 'zzes')):
+        return token[:-2]
+    if len(token) > 3 and token.endswith('s') and not token.endswith(('ss', 'us', 'is')):
+        return token[:-1]
+    return token
+
+
+def canonicalize_query(query: str) -> str:
+    """
+    Inflection- and stopword-insensitive form of a search query
+    
+    Lowercases, splits on non-alphanumerics (so "close-up" == "close up"),
+    drops stopwords and singularizes the remaining tokens, keeping their
+    order: "photos of coffee beans" == "coffee bean", but "dog chasing cat"
+    stays apart from "cat chasing dog".
+    
+    Args:
+        query: Search query
+        
+    Returns:
+        Space-separated canonical tokens (the normalized query when every token is a stopword)
+    """
+    tokens = [_lemmatize(token) for token in _tokenize(query) if token not in QUERY_STOPWORDS]
+    if not tokens:
+        return ResultCache.normalize_query(query)
+    return ' '.join(tokens)
+
+
+class SemanticQueryCache:
+    """
+    Canonical-form lookup in front of the result cache
+    
+    When a request misses the exact cache, the queries already cached for
+    the same provider and parameters are looked up by canonicalize_query;
+    one with the same canonical form ("coffee beans photos" for "coffee
+    bean") is served instead. This is deliberately an equality lookup, not
+    a similarity threshold: queries one content word apart ("old man/woman
+    reading...") describe different scenes however close their wording.
+    The index is rebuilt from the result cache's stored queries whenever
+    the shared cache is replaced.
+    
+    Args:
+        max_queries: Queries indexed per provider/parameter group, oldest dropped first
+    """
+    
+    def __init__(self, max_queries: int = 5000):
+        self.max_queries = max_queries
+        self.enabled = True
+        self.lookups = 0
+        self.hits = 0
+        self.stale = 0
+        self._groups: Dict[Tuple[str, str], 'OrderedDict[str, str]'] = {}
+        self._source: Optional[ResultCache] = None
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def _group(provider: str, params: Optional[Dict[str, Any]]) -> Tuple[str, str]:
+        return provider, json.dumps(params or {}, sort_keys=True, default=str)
+    
+    def _sync(self, cache: ResultCache):
+        """Rebuild the index from a newly installed result cache (lock held)"""
+        if self._source is cache:
+            return
+        self._source = cache
+        self._groups.clear()
+        for provider, query, params in cache.entries():
+            self._index((provider, params), query)
+    
+    def _index(self, group: Tuple[str, str], query: str):
+        """Map a normalized query's canonical form to it (lock held, latest query wins)"""
+        queries = self._groups.setdefault(group, OrderedDict())
+        canonical = canonicalize_query(query)
+        queries[canonical] = query
+        queries.move_to_end(canonical)
+        while len(queries) > self.max_queries:
+            queries.popitem(last=False)
+    
+    def add(self, cache: ResultCache, provider: str, query: str, params: Optional[Dict[str, Any]] = None):
+        """Index a query whose results were just stored in `cache`"""
+        with self._lock:
+            self._sync(cache)
+            self._index(self._group(provider, params), ResultCache.normalize_query(query))
+    
+    def match(self, cache: ResultCache, provider: str, query: str, params: Optional[Dict[str, Any]] = None) -> Optional[str]:
+        """Indexed query with the same canonical form, or None"""
+        with self._lock:
+            self._sync(cache)
+            queries = self._groups.get(self._group(provider, params))
+            return queries.get(canonicalize_query(query)) if queries else None
+    
+    def get(self, cache: ResultCache, provider: str, query: str, params: Optional[Dict[str, Any]] = None) -> Optional[ResultBatch]:
+        """Cached results of an earlier query with the same canonical form, or None"""
+        if not self.enabled:
+            return None
+        
+        self.lookups += 1
+        match = self.match(cache, provider, query, params)
+        if match is None:
+            return None
+        
+        results = cache.get(provider, match, params, record=False)
+        if results is None:
+            # Expired or evicted since it was indexed
+            self.stale += 1
+            with self._lock:
+                self._groups.get(self._group(provider, params), {}).pop(canonicalize_query(match), None)
+            return None
+        self.hits += 1
+        return results
+    
+    def stats(self) -> Dict[str, Any]:
+        """Lookup/hit counters and index size"""
+        return {
+            'lookups': self.lookups,
+            'hits': self.hits,
+            'stale': self.stale,
+            'hit_rate': self.hits / self.lookups if self.lookups else 0.0,
+            'indexed_queries': sum(len(queries) for queries in self._groups.values()),
+            'enabled': self.enabled
+        }
+
+
+_semantic_cache = SemanticQueryCache()
+_semantic_cache.enabled = os.getenv('IMAGE_SEARCH_SEMANTIC_CACHE', 'on').lower() not in ('off', '0', 'false')
+
+
+def get_semantic_cache() -> SemanticQueryCache:
+    """Shared similarity lookup in front of the result cache"""
+    return _semantic_cache
+
+
+def configure_semantic_cache(max_queries: int = 5000, enabled: bool = True) -> SemanticQueryCache:
+    """
+    Replace the shared semantic query cache
+    
+    Args:
+        max_queries: Queries indexed per provider/parameter group
+        enabled: Turn canonical-form reuse on or off
+        
+    Returns:
+        The new semantic cache
+    """
+    global _semantic_cache
+    _semantic_cache = SemanticQueryCache(max_queries=max_queries)
+    _semantic_cache.enabled = enabled
+    return _semantic_cache
+
+
+def _cache_get(provider: str, query: str, params: Optional[Dict[str, Any]]) -> Optional[ResultBatch]:
+    """Exact cache lookup, falling back to an earlier query with the same canonical form"""
+    cache = get_result_cache()
+    cached = cache.get(provider, query, params, record=False)
+    outcome = 'hit'
+    if cached is None and not cache.bypass:
+        cached = _semantic_cache.get(cache, provider, query, params)
+        outcome = 'semantic_hit'
+    if not cache.bypass:
+        # Counted once per lookup, whichever of the two answered
+        cache.record(provider, hit=cached is not None)
+    _metrics.inc('image_search_cache_lookups_total', provider=provider, result=outcome if cached is not None else 'miss')
+    return cached
+
+
+def _cache_put(provider: str, query: str, params: Optional[Dict[str, Any]], results: ResultBatch):
+    """Store results and make their query findable by similarity"""
+    cache = get_result_cache()
+    cache.put(provider, query, params, results)
+    if not cache.bypass and _semantic_cache.enabled:
+        _semantic_cache.add(cache, provider, query, params)
+
+
+class ImageLibrary:
+    """
+    Persistent full-text index of every image result seen
+    
+    Each image is stored once, keyed by canonical URL, with its metadata,
+    the query that first found it and how often it came back. Title, alt,
+    first query and source site are indexed with SQLite FTS5 (porter
+    stemming), so earlier finds are searchable instantly and without any
+    provider call. Provider results are added as they arrive; compact()
+    ages out stale images and merges the index segments.
+    
+    Args:
+        path: SQLite file path (':memory:' for a process-local library)
+    """
+    
+    # FTS column weights for bm25: title, alt, first query, source site
+    RANK_WEIGHTS = (4.0, 2.0, 1.0, 0.5)
+    
+    def __init__(self, path: str):
+        self.path = path
+        self.enabled = True
+        self._lock = threading.Lock()
+        self._db = self._connect(path)
+    
+    @staticmethod
+    def _connect(path: str) -> sqlite3.Connection:
+        """Open the library database, falling back to memory when the file is unusable"""
+        try:
+            if path != ':memory:':
+                os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+        except (OSError, sqlite3.Error) as e:
+            print(f"Image library unavailable at {path} ({e}), using memory only")
+            db = sqlite3.connect(':memory:', check_same_thread=False, isolation_level=None)
+        
+        db.execute("PRAGMA synchronous=NORMAL")
+        db.execute(f"""
+            CREATE TABLE IF NOT EXISTS images (
+                id INTEGER PRIMARY KEY,
+                key TEXT NOT NULL UNIQUE,
+                {', '.join(f'{name} TEXT NOT NULL' for name in ResultBatch.STR_FIELDS + ResultBatch.INTERNED_FIELDS)},
+                {', '.join(f'{name} INTEGER NOT NULL' for name in ResultBatch.INT_FIELDS)},
+                {', '.join(f'{name} REAL NOT NULL' for name in ResultBatch.FLOAT_FIELDS)},
+                first_query TEXT NOT NULL,
+                first_seen REAL NOT NULL,
+                last_seen REAL NOT NULL,
+                seen_count INTEGER NOT NULL
+            )
+        """)
+        db.execute("CREATE INDEX IF NOT EXISTS images_last_seen ON images (last_seen)")
+        db.execute("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS images_fts USING fts5(
+                title, alt, first_query, source_website,
+                content='images', content_rowid='id', tokenize='porter unicode61'
+            )
+        """)
+        # Keep the external-content index in step with the table; sightings
+        # only touch counters, so they do not rewrite index entries
+        db.execute("""
+            CREATE TRIGGER IF NOT EXISTS images_ai AFTER INSERT ON images BEGIN
+                INSERT INTO images_fts (rowid, title, alt, first_query, source_website)
+                VALUES (new.id, new.title, new.alt, new.first_query, new.source_website);
+            END
+        """)
+        db.execute("""
+            CREATE TRIGGER IF NOT EXISTS images_ad AFTER DELETE ON images BEGIN
+                INSERT INTO images_fts (images_fts, rowid, title, alt, first_query, source_website)
+                VALUES ('delete', old.id, old.title, old.alt, old.first_query, old.source_website);
+            END
+        """)
+        db.execute("""
+            CREATE TRIGGER IF NOT EXISTS images_au AFTER UPDATE ON images
+            WHEN old.title IS NOT new.title OR old.alt IS NOT new.alt BEGIN
+                INSERT INTO images_fts (images_fts, rowid, title, alt, first_query, source_website)
+                VALUES ('delete', old.id, old.title, old.alt, old.first_query, old.source_website);
+                INSERT INTO images_fts (rowid, title, alt, first_query, source_website)
+                VALUES (new.id, new.title, new.alt, new.first_query, new.source_website);
+            END
+        """)
+        return db
+    
+    def add(self, query: str, results: ResultBatch) -> int:
+        """
+        Record a batch of provider results found by `query`
+        
+        New images are inserted and indexed; known ones get their last-seen
+        time and count bumped, and missing title, alt or size filled in.
+        
+        Returns:
+            Number of results recorded
+        """
+        if not self.enabled or not results:
+            return 0
+        
+        now = time.time()
+        columns = ResultBatch.FIELDS
+        rows = [
+            (canonical_url(results.url[i]), *(getattr(results, name)[i] for name in columns), query, now, now)
+            for i in range(len(results)) if results.url[i]
+        ]
+        statement = (
+            f"INSERT INTO images (key, {', '.join(columns)}, first_query, first_seen, last_seen, seen_count) "
+            f"VALUES (?, {', '.join('?' * len(columns))}, ?, ?, ?, 1) "
+            "ON CONFLICT (key) DO UPDATE SET "
+            "last_seen = excluded.last_seen, seen_count = images.seen_count + 1, "
+            "title = CASE WHEN images.title = '' THEN excluded.title ELSE images.title END, "
+            "alt = CASE WHEN images.alt = '' THEN excluded.alt ELSE images.alt END, "
+            "width = MAX(images.width, excluded.width), height = MAX(images.height, excluded.height)"
+        )
+        try:
+            with self._lock:
+                self._db.execute("BEGIN")
+                try:
+                    self._db.executemany(statement, rows)
+                    self._db.execute("COMMIT")
+                except sqlite3.Error:
+                    self._db.execute("ROLLBACK")
+                    raise
+        except sqlite3.Error as e:
+            print(f"Image library update failed: {e}")
+            return 0
+        return len(rows)
+    
+    @staticmethod
+    def match_expression(query: str) -> Optional[str]:
+        """FTS5 query requiring every meaningful term of `query` (None when there is none)"""
+        tokens = _tokenize(query)
+        terms = [token for token in tokens if token not in QUERY_STOPWORDS] or tokens
+        if not terms:
+            return None
+        return ' '.join(f'"{term}"' for term in dict.fromkeys(terms))
+    
+    def search(
+        self,
+        query: str,
+        count: int = 20,
+        accept: Optional[Callable[[ResultBatch, int], bool]] = None
+    ) -> ResultBatch:
+        """
+        Best local matches for a query, most relevant first
+        
+        Args:
+            query: Search query (every term must match, stemmed)
+            count: Maximum number of results
+            accept: Optional (batch, index) predicate results must satisfy
+        """
+        expression = self.match_expression(query)
+        if not self.enabled or expression is None or count <= 0:
+            return ResultBatch()
+        
+        # Over-fetch so the predicate still leaves `count` candidates
+        limit = count if accept is None else max(count * 4, 50)
+        columns = ', '.join(f'images.{name}' for name in ResultBatch.FIELDS)
+        try:
+            with self._lock:
+                rows = self._db.execute(
+                    f"SELECT {columns} FROM images_fts JOIN images ON images.id = images_fts.rowid "
+                    f"WHERE images_fts MATCH ? ORDER BY bm25(images_fts, {', '.join(map(str, self.RANK_WEIGHTS))}) "
+                    "LIMIT ?",
+                    (expression, limit)
+                ).fetchall()
+        except sqlite3.Error as e:
+            print(f"Image library search failed: {e}")
+            return ResultBatch()
+        
+        batch = ResultBatch.from_dicts(dict(zip(ResultBatch.FIELDS, row)) for row in rows)
+        if accept is not None:
+            batch = batch.take([i for i in range(len(batch)) if accept(batch, i)][:count])
+        return batch
+    
+    def compact(self, max_age_days: Optional[float] = None, max_images: Optional[int] = None) -> Dict[str, int]:
+        """
+        Drop stale images and rewrite the index compactly
+        
+        Args:
+            max_age_days: Remove images not seen for this many days
+            max_images: Keep at most this many images, most recently seen first
+            
+        Returns:
+            Dict with 'removed' and remaining 'images'
+        """
+        with self._lock:
+            (before,) = self._db.execute("SELECT COUNT(*) FROM images").fetchone()
+            if max_age_days is not None:
+                self._db.execute("DELETE FROM images WHERE last_seen < ?", (time.time() - max_age_days * 86400,))
+            if max_images is not None:
+                self._db.execute(
+                    "DELETE FROM images WHERE id NOT IN (SELECT id FROM images ORDER BY last_seen DESC LIMIT ?)",
+                    (max_images,)
+                )
+            # Merge the FTS segments into one b-tree, then return freed pages to the OS
+            self._db.execute("INSERT INTO images_fts (images_fts) VALUES ('optimize')")
+            self._db.execute("VACUUM")
+            (after,) = self._db.execute("SELECT COUNT(*) FROM images").fetchone()
+        return {'removed': before - after, 'images': after}
+    
+    def clear(self):
+        """Remove every image"""
+        with self._lock:
+            self._db.execute("DELETE FROM images")
+            self._db.execute("INSERT INTO images_fts (images_fts) VALUES ('rebuild')")
+    
+    def stats(self) -> Dict[str, Any]:
+        """Number of images, distinct first queries and per-source counts"""
+        with self._lock:
+            (images, queries) = self._db.execute(
+                "SELECT COUNT(*), COUNT(DISTINCT first_query) FROM images"
+            ).fetchone()
+            sources = dict(self._db.execute("SELECT source, COUNT(*) FROM images GROUP BY source").fetchall())
+        return {'images': images, 'queries': queries, 'sources': sources, 'path': self.path, 'enabled': self.enabled}
+
+
+_image_library: Optional[ImageLibrary] = None
+_image_library_lock = threading.Lock()
+
+
+def _default_library_path() -> str:
+    """Library file from IMAGE_SEARCH_LIBRARY_PATH, defaulting to ~/.cache/scribe"""
+    path = os.getenv('IMAGE_SEARCH_LIBRARY_PATH') or os.path.join('~', '.cache', 'scribe', 'image_library.sqlite3')
+    return os.path.expanduser(path)
+
+
+def get_image_library() -> ImageLibrary:
+    """Shared library of previously seen images (opened on first use)"""
+    global _image_library
+    if _image_library is None:
+        with _image_library_lock:
+            if _image_library is None:
+                _image_library = ImageLibrary(_default_library_path())
+                _image_library.enabled = os.getenv('IMAGE_SEARCH_LIBRARY', 'on').lower() not in ('off', '0', 'false')
+    return _image_library
+
+
+def configure_library(path: Optional[str] = None, enabled: bool = True) -> ImageLibrary:
+    """
+    Replace the shared image library
+    
+    Args:
+        path: SQLite file path (defaults to IMAGE_SEARCH_LIBRARY_PATH or ~/.cache/scribe)
+        enabled: Record and answer searches (off leaves the library untouched)
+        
+    Returns:
+        The new library
+    """
+    global _image_library
+    with _image_library_lock:
+        _image_library = ImageLibrary(path or _default_library_path())
+        _image_library.enabled = enabled
+    return _image_library
+
+
+def _library_add(query: str, results: ResultBatch):
+    """Record provider results in the shared library when it is enabled"""
+    library = get_image_library()
+    if library.enabled:
+        library.add(query, results)
+
+
+# Latency histogram bucket bounds in seconds
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Recent request latencies kept per provider for percentile summaries
+LATENCY_WINDOW = 1000
+
+# Span of the operation currently running in this thread/task
+_current_span: ContextVar[Optional['Span']] = ContextVar('image_search_span', default=None)
+
+
+class Span:
+    """
+    One timed operation: a provider request or a traced search function
+    
+    Args:
+        name: Operation name, e.g. 'image_search.request'
+        attributes: Initial attributes (provider, query, attempt, ...)
+        parent: Enclosing span whose trace this span joins
+    """
+    
+    __slots__ = ('name', 'attributes', 'trace_id', 'span_id', 'parent_id', 'start', 'start_unix', 'end', 'status')
+    
+    def __init__(self, name: str, attributes: Optional[Dict[str, Any]] = None, parent: Optional['Span'] = None):
+        self.name = name
+        self.attributes = dict(attributes or {})
+        self.trace_id = parent.trace_id if parent else os.urandom(16).hex()
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent.span_id if parent else None
+        self.start = time.monotonic()
+        self.start_unix = time.time()
+        self.end: Optional[float] = None
+        self.status = 'ok'
+    
+    @property
+    def duration(self) -> float:
+        """Seconds from start to finish (or to now while running)"""
+        return (self.end if self.end is not None else time.monotonic()) - self.start
+    
+    def set(self, **attributes):
+        """Add or overwrite attributes"""
+        self.attributes.update(attributes)
+    
+    def finish(self, error: Optional[BaseException] = None):
+        """Stop the clock, marking the span failed when an exception ended it"""
+        self.end = time.monotonic()
+        if error is not None:
+            self.status = 'error'
+            self.attributes['error'] = str(error) or type(error).__name__
+            if getattr(error, 'status', None) is not None:
+                self.attributes.setdefault('status_code', error.status)
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """Flat JSON-serializable form"""
+        return {
+            'name': self.name,
+            'trace_id': self.trace_id,
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'start': self.start_unix,
+            'duration_ms': round(self.duration * 1000, 3),
+            'status': self.status,
+            'attributes': self.attributes
+        }
+    
+    def to_otel(self) -> Dict[str, Any]:
+        """Field names and units of the OpenTelemetry span data model"""
+        start_ns = int(self.start_unix * 1e9)
+        return {
+            'name': self.name,
+            'context': {'trace_id': self.trace_id, 'span_id': self.span_id},
+            'parent_id': self.parent_id,
+            'start_time_unix_nano': start_ns,
+            'end_time_unix_nano': start_ns + int(self.duration * 1e9),
+            'attributes': {f'image_search.{key}': value for key, value in self.attributes.items()},
+            'status': {'status_code': 'ERROR' if self.status == 'error' else 'OK'}
+        }
+
+
+class MetricsRegistry:
+    """
+    Counters, latency histograms and span exporters for provider calls
+    
+    Every provider request finishes an 'image_search.request' span which
+    updates the per-provider metrics (requests by status code, latency,
+    response bytes, results, retries) and is handed to each exporter.
+    Cache lookups only update counters.
+    """
+    
+    def __init__(self):
+        self.counters: Dict[str, Dict[Tuple[Tuple[str, str], ...], float]] = {}
+        self.histograms: Dict[str, Tuple[List[int], List[float]]] = {}
+        self.exporters: List[Any] = []
+        self._recent: Dict[str, deque] = {}
+        self._lock = threading.Lock()
+    
+    def inc(self, name: str, value: float = 1.0, **labels):
+        """Increase a labelled counter"""
+        key = tuple(sorted((label, str(label_value)) for label, label_value in labels.items()))
+        with self._lock:
+            series = self.counters.setdefault(name, {})
+            series[key] = series.get(key, 0.0) + value
+    
+    def observe(self, provider: str, seconds: float):
+        """Record one request latency"""
+        with self._lock:
+            buckets, totals = self.histograms.setdefault(provider, ([0] * (len(LATENCY_BUCKETS) + 1), [0.0, 0]))
+            index = next((i for i, bound in enumerate(LATENCY_BUCKETS) if seconds <= bound), len(LATENCY_BUCKETS))
+            buckets[index] += 1
+            totals[0] += seconds
+            totals[1] += 1
+            self._recent.setdefault(provider, deque(maxlen=LATENCY_WINDOW)).append(seconds)
+    
+    def add_exporter(self, exporter):
+        """Register an exporter (an object with export(span) and optionally flush(registry))"""
+        self.exporters.append(exporter)
+        return exporter
+    
+    def record_span(self, span: Span):
+        """Fold a finished span into the metrics and pass it to the exporters"""
+        if span.name == 'image_search.request':
+            provider = span.attributes.get('provider', 'unknown')
+            self.inc('image_search_requests_total', provider=provider, status=span.attributes.get('status_code', span.status))
+            self.observe(provider, span.duration)
+            self.inc('image_search_response_bytes_total', span.attributes.get('response_bytes', 0), provider=provider)
+            self.inc('image_search_results_total', span.attributes.get('results', 0), provider=provider)
+            if span.attributes.get('attempt', 1) > 1:
+                self.inc('image_search_retries_total', provider=provider)
+        
+        for exporter in list(self.exporters):
+            try:
+                exporter.export(span)
+            except Exception as e:
+                print(f"Metrics exporter error: {e}")
+    
+    def flush(self):
+        """Let exporters that batch their output write it now"""
+        for exporter in list(self.exporters):
+            if hasattr(exporter, 'flush'):
+                exporter.flush(self)
+    
+    def latency_percentiles(self, provider: str) -> Dict[str, float]:
+        """p50/p95/p99 in milliseconds over the provider's recent requests"""
+        with self._lock:
+            recent = list(self._recent.get(provider, ()))
+        if not recent:
+            return {}
+        p50, p95, p99 = np.percentile(np.array(recent) * 1000, [50, 95, 99])
+        return {'p50_ms': round(float(p50), 1), 'p95_ms': round(float(p95), 1), 'p99_ms': round(float(p99), 1)}
+    
+    def snapshot(self) -> Dict[str, Any]:
+        """Counters plus latency percentiles per provider"""
+        with self._lock:
+            counters = {
+                name: {','.join(f'{label}={value}' for label, value in key): total for key, total in series.items()}
+                for name, series in self.counters.items()
+            }
+            providers = list(self._recent)
+        return {'counters': counters, 'latency': {provider: self.latency_percentiles(provider) for provider in providers}}
+    
+    def prometheus_text(self) -> str:
+        """Metrics in the Prometheus text exposition format"""
+        def labels(pairs) -> str:
+            return '{' + ','.join(f'{label}="{value}"' for label, value in pairs) + '}' if pairs else ''
+        
+        lines = []
+        with self._lock:
+            for name, series in sorted(self.counters.items()):
+                lines.append(f'# TYPE {name} counter')
+                for key, total in sorted(series.items()):
+                    lines.append(f'{name}{labels(key)} {total:g}')
+            
+            lines.append('# TYPE image_search_request_seconds histogram')
+            for provider, (buckets, (total, count)) in sorted(self.histograms.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(LATENCY_BUCKETS + (float('inf'),), buckets):
+                    cumulative += bucket_count
+                    le = '+Inf' if bound == float('inf') else f'{bound:g}'
+                    lines.append(f'image_search_request_seconds_bucket{labels([("provider", provider), ("le", le)])} {cumulative}')
+                lines.append(f'image_search_request_seconds_sum{labels([("provider", provider)])} {total:.6f}')
+                lines.append(f'image_search_request_seconds_count{labels([("provider", provider)])} {count}')
+        return '\n'.join(lines) + '\n'
+    
+    def reset(self):
+        """Clear all metrics (exporters stay registered)"""
+        with self._lock:
+            self.counters.clear()
+            self.histograms.clear()
+            self._recent.clear()
+
+
+class PrometheusTextExporter:
+    """
+    Rewrites a Prometheus textfile-collector file with the current metrics
+    
+    Args:
+        path: Output .prom file (replaced atomically)
+        interval: Minimum seconds between rewrites triggered by finished spans
+    """
+    
+    def __init__(self, path: str, interval: float = 15.0):
+        self.path = os.path.expanduser(path)
+        self.interval = interval
+        self._written = 0.0
+    
+    def export(self, span: Span):
+        if time.monotonic() - self._written >= self.interval:
+            self.flush(_metrics)
+    
+    def flush(self, registry: 'MetricsRegistry'):
+        self._written = time.monotonic()
+        temp_path = f'{self.path}.{os.getpid()}.tmp'
+        with open(temp_path, 'w') as f:
+            f.write(registry.prometheus_text())
+        os.replace(temp_path, self.path)
+
+
+class JsonLinesExporter:
+    """
+    Appends every finished span as one JSON object per line
+    
+    Args:
+        path: Output .jsonl file
+    """
+    
+    def __init__(self, path: str):
+        self.path = os.path.expanduser(path)
+        self._lock = threading.Lock()
+    
+    def export(self, span: Span):
+        line = json.dumps(span.to_dict(), default=str)
+        with self._lock, open(self.path, 'a') as f:
+            f.write(line + '\n')
+
+
+class CallbackExporter:
+    """
+    Hands every finished span to a callback in OpenTelemetry span-data form
+    
+    Args:
+        callback: Called with Span.to_otel() output, e.g. to re-emit through an OTel tracer
+    """
+    
+    def __init__(self, callback):
+        self.callback = callback
+    
+    def export(self, span: Span):
+        self.callback(span.to_otel())
+
+
+_metrics = MetricsRegistry()
+if os.getenv('IMAGE_SEARCH_METRICS_PATH'):
+    _metrics.add_exporter(PrometheusTextExporter(os.getenv('IMAGE_SEARCH_METRICS_PATH')))
+if os.getenv('IMAGE_SEARCH_TRACE_PATH'):
+    _metrics.add_exporter(JsonLinesExporter(os.getenv('IMAGE_SEARCH_TRACE_PATH')))
+
+
+def get_metrics() -> MetricsRegistry:
+    """Shared metrics registry"""
+    return _metrics
+
+
+@contextmanager
+def trace(name: str, **attributes) -> Iterator[Span]:
+    """
+    Time a block as a span, nested under the span already running (if any)
+    
+    Args:
+        name: Span name
+        **attributes: Initial span attributes
+        
+    Yields:
+        The running span
+    """
+    span = Span(name, attributes, parent=_current_span.get())
+    token = _current_span.set(span)
+    try:
+        yield span
+    except BaseException as e:
+        span.finish(e)
+        raise
+    else:
+        span.finish()
+    finally:
+        _current_span.reset(token)
+        _metrics.record_span(span)
+
+
+def traced(name: str):
+    """Decorator running a sync or async search function inside trace(name)"""
+    def decorator(fn):
+        def attributes(args) -> Dict[str, Any]:
+            return {'query': args[0]} if args and isinstance(args[0], str) else {}
+        
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with trace(name, **attributes(args)):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+        
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with trace(name, **attributes(args)):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _record_response(status: int, size: int):
+    """Attach the HTTP status and body size to the request span in progress"""
+    span = _current_span.get()
+    if span is not None:
+        span.set(status_code=status, response_bytes=size)
+
+
+# Response bodies at least this large (or of unknown length) are decoded by
+# streaming them through ijson and keeping only the projected fields; smaller
+# ones decode faster in a single orjson/json call
+JSON_STREAM_MIN_BYTES = int(os.getenv('IMAGE_SEARCH_JSON_STREAM_MIN_BYTES', str(256 * 1024)))
+
+# Bytes handed to the streaming parser at a time
+JSON_CHUNK_SIZE = 64 * 1024
+
+# Fields each provider parser reads; the rest of a streamed response is skipped.
+# A dict keeps the listed keys of an object, a one-item list applies its item
+# to every element of an array, and True keeps a value whole.
+PEXELS_PROJECTION = {
+    'photos': [{
+        'src': {'original': True, 'medium': True},
+        'width': True, 'height': True, 'photographer': True, 'photographer_url': True, 'alt': True,
+    }],
+}
+EVERYPIXEL_PROJECTION = {
+    'data': [dict.fromkeys(('url', 'preview', 'source', 'price', 'width', 'height', 'title', 'score'), True)],
+}
+DATAFORSEO_PROJECTION = {
+    'tasks': [{
+        'status_code': True,
+        'status_message': True,
+        'data': {'tag': True, 'keyword': True},
+        'result': [{
+            'items': [dict.fromkeys(('type', 'source_url', 'encoded_url', 'title', 'alt', 'subtitle', 'url'), True)],
+        }],
+    }],
+}
+
+_JSON_CONTAINERS = ('start_map', 'start_array')
+
+
+def _orjson():
+    """orjson, or None when it is not installed (json decodes instead)"""
+    try:
+        import orjson
+    except ImportError:
+        return None
+    return orjson
+
+
+def _ijson():
+    """ijson, or None when it is not installed (bodies are then decoded whole)"""
+    try:
+        import ijson
+    except ImportError:
+        return None
+    return ijson
+
+
+def json_loads(body: Union[bytes, str]) -> Any:
+    """Decode a whole JSON document with orjson when available"""
+    orjson = _orjson()
+    if orjson is not None:
+        return orjson.loads(body)
+    return json.loads(body)
+
+
+def _should_stream(size: Optional[int]) -> bool:
+    """Whether a body of `size` bytes (None when unknown) is worth streaming"""
+    return (size is None or size >= JSON_STREAM_MIN_BYTES) and _ijson() is not None
+
+
+def _project_value(event: str, value: Any, projection: Any):
+    """Generator receiving ijson events for one value and returning its projection"""
+    if event == 'start_map':
+        obj = {}
+        while True:
+            event, key = yield
+            if event == 'end_map':
+                return obj
+            keep = True if projection is True else projection.get(key) if isinstance(projection, dict) else None
+            event, value = yield
+            if keep is not None:
+                obj[key] = yield from _project_value(event, value, keep)
+            elif event in _JSON_CONTAINERS:
+                yield from _skip_value()
+    if event == 'start_array':
+        items = []
+        keep = True if projection is True else projection[0] if isinstance(projection, list) else None
+        while True:
+            event, value = yield
+            if event == 'end_array':
+                return items
+            if keep is not None:
+                items.append((yield from _project_value(event, value, keep)))
+            elif event in _JSON_CONTAINERS:
+                yield from _skip_value()
+    return value
+
+
+def _skip_value():
+    """Generator consuming the events of a container value that is not kept"""
+    depth = 1
+    while depth:
+        event, _ = yield
+        if event in _JSON_CONTAINERS:
+            depth += 1
+        elif event in ('end_map', 'end_array'):
+            depth -= 1
+
+
+class JsonProjector:
+    """
+    Incremental JSON decoder that only materializes projected fields
+    
+    Chunks are pushed through ijson as they arrive, so neither the whole body
+    nor the full object tree is held in memory at once:
+    
+        projector = JsonProjector(DATAFORSEO_PROJECTION)
+        for chunk in chunks:
+            projector.feed(chunk)
+        data = projector.close()
+    """
+    
+    def __init__(self, projection: Any):
+        self.size = 0
+        self._result = []
+        self._builder = self._build(projection)
+        next(self._builder)
+        self._parser = _ijson().basic_parse_coro(self._builder, use_float=True)
+    
+    def _build(self, projection: Any):
+        event, value = yield
+        self._result.append((yield from _project_value(event, value, projection)))
+        while True:
+            yield
+    
+    def feed(self, chunk: bytes):
+        """Parse the next chunk of the body"""
+        self.size += len(chunk)
+        try:
+            self._parser.send(chunk)
+        except _ijson().JSONError as e:
+            raise ValueError(f"invalid JSON: {e}") from e
+    
+    def close(self) -> Any:
+        """Finish parsing and return the projected document"""
+        try:
+            self._parser.close()
+        except _ijson().JSONError as e:
+            raise ValueError(f"invalid JSON: {e}") from e
+        if not self._result:
+            raise ValueError("invalid JSON: empty document")
+        return self._result[0]
+
+
+def decode_json(body: bytes, projection: Any = True) -> Any:
+    """Decode a buffered body, streaming large ones through `projection`"""
+    if projection is True or not _should_stream(len(body)):
+        return json_loads(body)
+    projector = JsonProjector(projection)
+    view = memoryview(body)
+    for offset in range(0, len(body), JSON_CHUNK_SIZE):
+        projector.feed(view[offset:offset + JSON_CHUNK_SIZE])
+    return projector.close()
+
+
+async def read_json(response: aiohttp.ClientResponse, projection: Any = True) -> Tuple[Any, int]:
+    """
+    Decode an aiohttp response body as it arrives
+    
+    Returns:
+        The (projected) document and the body size in bytes
+    """
+    if projection is True or not _should_stream(response.content_length):
+        body = await response.read()
+        return json_loads(body), len(body)
+    projector = JsonProjector(projection)
+    async for chunk in response.content.iter_chunked(JSON_CHUNK_SIZE):
+        projector.feed(chunk)
+    return projector.close(), projector.size
+
+
+def read_json_sync(response: requests.Response, projection: Any = True) -> Tuple[Any, int]:
+    """
+    Decode a requests response sent with stream=True as it arrives
+    
+    Returns:
+        The (projected) document and the body size in bytes
+    """
+    length = response.headers.get('Content-Length')
+    if projection is True or not _should_stream(int(length) if length and length.isdigit() else None):
+        body = response.content
+        return json_loads(body), len(body)
+    projector = JsonProjector(projection)
+    for chunk in response.iter_content(JSON_CHUNK_SIZE):
+        projector.feed(chunk)
+    return projector.close(), projector.size
+
+
+# Token-bucket and concurrency settings per provider
+DEFAULT_RATE_LIMITS = {
+    'pexels': {'rate': 200 / 3600, 'burst': 200, 'max_concurrency': 8},       # 200 requests/hour
+    'dataforseo': {'rate': 2000 / 60, 'burst': 30, 'max_concurrency': 30},    # 2000 calls/minute
+    'everypixel': {'rate': 5.0, 'burst': 10, 'max_concurrency': 8},
+}
+
+# Attempts per provider call when the provider throttles (429/5xx)
+RATE_LIMIT_ATTEMPTS = 3
+
+
+def _parse_retry_after(headers) -> Optional[float]:
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP date)"""
+    value = headers.get('Retry-After') if headers is not None else None
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class ProviderRateLimiter:
+    """
+    Token bucket plus AIMD adaptive concurrency for one provider
+    
+    Each request takes a token (refilled at `rate` per second up to `burst`)
+    and a concurrency slot. The concurrency limit grows by about one slot per
+    window of successful requests and halves on 429/5xx responses.
+    Retry-After (or an exponential backoff when absent) pauses the provider
+    entirely until it expires.
+    
+    Args:
+        provider: Provider name
+        rate: Sustained requests per second
+        burst: Bucket capacity
+        max_concurrency: Upper bound of the adaptive concurrency limit
+        min_concurrency: Lower bound of the adaptive concurrency limit
+        max_wait: Longest a request may queue before failing, in seconds
+    """
+    
+    def __init__(
+        self,
+        provider: str,
+        rate: float,
+        burst: int,
+        max_concurrency: int = 8,
+        min_concurrency: int = 1,
+        max_wait: float = 60.0
+    ):
+        self.provider = provider
+        self.rate = rate
+        self.burst = burst
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.max_wait = max_wait
+        self.limit = float(max(min_concurrency, max_concurrency // 2))
+        self.tokens = float(burst)
+        self.in_flight = 0
+        self.blocked_until = 0.0
+        self.throttled = 0
+        self._failures = 0
+        self._updated = time.monotonic()
+        self._condition = threading.Condition()
+    
+    def _reserve(self) -> float:
+        """Take a token and a slot, or return how long to wait before retrying"""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        if self.in_flight >= int(self.limit):
+            return 0.05
+        if self.tokens < 1:
+            return (1 - self.tokens) / self.rate
+        
+        self.tokens -= 1
+        self.in_flight += 1
+        return 0.0
+    
+    def _check_wait(self, start: float, delay: float, deadline: Optional[float]):
+        """Fail fast when waiting `delay` more seconds would pass max_wait or the request deadline"""
+        now = time.monotonic()
+        if deadline is not None and now + delay > deadline:
+            raise ProviderError(
+                self.provider,
+                f"rate limit wait of {delay:.1f}s would pass the request deadline ({max(0.0, deadline - now):.1f}s left)"
+            )
+        if now - start + delay > self.max_wait:
+            raise ProviderError(self.provider, f"rate limit queue wait exceeded {now - start:.1f}s", status=429)
+    
+    def acquire(self, deadline: Optional[float] = None):
+        """
+        Block until a request may be sent
+        
+        Args:
+            deadline: time.monotonic() instant the request must be sent by (None for max_wait only)
+        """
+        start = time.monotonic()
+        with self._condition:
+            while True:
+                delay = self._reserve()
+                if delay == 0.0:
+                    return
+                self._check_wait(start, delay, deadline)
+                self._condition.wait(delay)
+    
+    async def acquire_async(self, deadline: Optional[float] = None):
+        """
+        Wait without blocking the event loop until a request may be sent
+        
+        Args:
+            deadline: time.monotonic() instant the request must be sent by (None for max_wait only)
+        """
+        start = time.monotonic()
+        while True:
+            with self._condition:
+                delay = self._reserve()
+            if delay == 0.0:
+                return
+            self._check_wait(start, delay, deadline)
+            await asyncio.sleep(delay)
+    
+    def release(self, throttled: bool = False, retry_after: Optional[float] = None):
+        """Return the slot and adapt the concurrency limit to the outcome"""
+        with self._condition:
+            self.in_flight = max(0, self.in_flight - 1)
+            if throttled:
+                self.throttled += 1
+                self._failures += 1
+                self.limit = max(float(self.min_concurrency), self.limit / 2)
+                backoff = retry_after if retry_after is not None else min(2 ** self._failures, 30)
+                self.blocked_until = max(self.blocked_until, time.monotonic() + backoff)
+            else:
+                self._failures = 0
+                self.limit = min(float(self.max_concurrency), self.limit + 1 / self.limit)
+            self._condition.notify_all()
+    
+    def stats(self) -> Dict[str, Any]:
+        """Current limiter state"""
+        with self._condition:
+            return {
+                'rate': self.rate,
+                'tokens': round(self.tokens, 2),
+                'concurrency_limit': round(self.limit, 2),
+                'in_flight': self.in_flight,
+                'throttled': self.throttled,
+                'blocked_for': round(max(0.0, self.blocked_until - time.monotonic()), 2)
+            }
+
+
+_rate_limiters: Dict[str, ProviderRateLimiter] = {}
+_rate_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(provider: str) -> ProviderRateLimiter:
+    """Shared rate limiter for a provider"""
+    limiter = _rate_limiters.get(provider)
+    if limiter is None:
+        with _rate_limiters_lock:
+            limiter = _rate_limiters.get(provider)
+            if limiter is None:
+                settings = DEFAULT_RATE_LIMITS.get(provider, {'rate': 10.0, 'burst': 10, 'max_concurrency': 8})
+                limiter = ProviderRateLimiter(provider, **settings)
+                _rate_limiters[provider] = limiter
+    return limiter
+
+
+def configure_rate_limit(provider: str, **settings) -> ProviderRateLimiter:
+    """
+    Replace a provider's rate limiter
+    
+    Args:
+        provider: Provider name ('pexels', 'dataforseo', 'everypixel')
+        **settings: ProviderRateLimiter arguments (rate, burst, max_concurrency, min_concurrency, max_wait)
+        
+    Returns:
+        The new limiter
+    """
+    merged = {**DEFAULT_RATE_LIMITS.get(provider, {'rate': 10.0, 'burst': 10, 'max_concurrency': 8}), **settings}
+    limiter = ProviderRateLimiter(provider, **merged)
+    with _rate_limiters_lock:
+        _rate_limiters[provider] = limiter
+    return limiter
+
+
+def rate_limit_stats() -> Dict[str, Dict[str, Any]]:
+    """Limiter state for every provider used so far"""
+    return {provider: limiter.stats() for provider, limiter in list(_rate_limiters.items())}
+
+
+# time.monotonic() instant the running search must be done by (None when
+# unbounded); requests that cannot be sent before it fail instead of queueing
+_request_deadline: ContextVar[Optional[float]] = ContextVar('image_search_request_deadline', default=None)
+
+
+def _result_count(results: Union[ResultBatch, List[Optional[ResultBatch]]]) -> int:
+    """Number of results in a batch, or across the batches of a multi-task request"""
+    if isinstance(results, ResultBatch):
+        return len(results)
+    return sum(len(batch) for batch in results if batch is not None)
+
+
+def _rate_limited(provider: str, fetch) -> ResultBatch:
+    """Send a sync request under the provider's limiter and breaker, retrying when throttled"""
+    limiter = get_rate_limiter(provider)
+    for attempt in range(RATE_LIMIT_ATTEMPTS):
+        # Checked before queueing so a tripped provider costs nothing
+        _check_deadline(provider)
+        breaker = _check_circuit(provider)
+        try:
+            limiter.acquire(_request_deadline.get())
+        except BaseException:
+            breaker.release_probe()
+            raise
+        _charge(provider)
+        start = time.monotonic()
+        try:
+            with trace('image_search.request', provider=provider, attempt=attempt + 1) as span:
+                results = fetch()
+                span.set(results=_result_count(results))
+        except ProviderError as e:
+            limiter.release(throttled=e.throttled, retry_after=e.retry_after)
+            if e.status != 429:
+                breaker.record(False, time.monotonic() - start)
+            else:
+                # Throttling says nothing about health, but a half-open probe must free its slot
+                breaker.release_probe()
+            if not e.throttled or attempt == RATE_LIMIT_ATTEMPTS - 1:
+                raise
+            continue
+        except BaseException:
+            limiter.release()
+            breaker.release_probe()
+            raise
+        limiter.release()
+        breaker.record(True, time.monotonic() - start)
+        return results
+
+
+async def _async_rate_limited(provider: str, fetch) -> ResultBatch:
+    """Send an async request under the provider's limiter and breaker, retrying when throttled"""
+    limiter = get_rate_limiter(provider)
+    for attempt in range(RATE_LIMIT_ATTEMPTS):
+        # Checked before queueing so a tripped provider costs nothing
+        _check_deadline(provider)
+        breaker = _check_circuit(provider)
+        try:
+            await limiter.acquire_async(_request_deadline.get())
+        except BaseException:
+            breaker.release_probe()
+            raise
+        _charge(provider)
+        start = time.monotonic()
+        try:
+            with trace('image_search.request', provider=provider, attempt=attempt + 1) as span:
+                results = await fetch()
+                span.set(results=_result_count(results))
+        except ProviderError as e:
+            limiter.release(throttled=e.throttled, retry_after=e.retry_after)
+            if e.status != 429:
+                breaker.record(False, time.monotonic() - start)
+            else:
+                # Throttling says nothing about health, but a half-open probe must free its slot
+                breaker.release_probe()
+            if not e.throttled or attempt == RATE_LIMIT_ATTEMPTS - 1:
+                raise
+            continue
+        except BaseException:
+            limiter.release()
+            breaker.release_probe()
+            raise
+        limiter.release()
+        breaker.record(True, time.monotonic() - start)
+        return results
+
+
+
+class CircuitBreaker:
+    """
+    Per-provider circuit breaker with error-rate and latency windows
+    
+    Closed: requests flow and outcomes are recorded over a sliding window.
+    The breaker opens when, with at least min_requests in the window, the
+    error rate reaches error_threshold or the 90th percentile latency exceeds
+    latency_threshold. Open: requests fail immediately until cooldown has
+    passed. Half-open: a single probe request is let through; success closes
+    the breaker, failure re-opens it.
+    
+    Args:
+        provider: Provider name
+        window: Sliding window length in seconds
+        min_requests: Requests needed in the window before tripping
+        error_threshold: Error rate that trips the breaker
+        latency_threshold: p90 latency in seconds that trips the breaker
+        cooldown: Seconds to stay open before probing
+    """
+    
+    def __init__(
+        self,
+        provider: str,
+        window: float = 60.0,
+        min_requests: int = 5,
+        error_threshold: float = 0.5,
+        latency_threshold: float = 8.0,
+        cooldown: float = 30.0
+    ):
+        self.provider = provider
+        self.window = window
+        self.min_requests = min_requests
+        self.error_threshold = error_threshold
+        self.latency_threshold = latency_threshold
+        self.cooldown = cooldown
+        self.state = 'closed'
+        self.opened_at = 0.0
+        self.trips = 0
+        self.rejected = 0
+        self._probing = False
+        self._outcomes: deque = deque()
+        self._lock = threading.Lock()
+    
+    def allow(self) -> bool:
+        """Whether a request may be sent now"""
+        with self._lock:
+            if self.state == 'closed':
+                return True
+            if self.state == 'open' and time.monotonic() - self.opened_at >= self.cooldown:
+                self.state = 'half_open'
+                self._probing = False
+            if self.state == 'half_open' and not self._probing:
+                self._probing = True
+                return True
+            self.rejected += 1
+            return False
+    
+    def is_open(self) -> bool:
+        """Whether requests are currently rejected (open and still cooling down)"""
+        return self.state == 'open' and time.monotonic() - self.opened_at < self.cooldown
+    
+    def record(self, success: bool, latency: float):
+        """Record the outcome of a request let through by allow()"""
+        now = time.monotonic()
+        with self._lock:
+            if self.state == 'half_open':
+                self._probing = False
+                if success:
+                    self.state = 'closed'
+                    self._outcomes.clear()
+                else:
+                    self._trip(now)
+                return
+            
+            self._outcomes.append((now, success, latency))
+            self._prune(now)
+            if self.state == 'closed' and len(self._outcomes) >= self.min_requests:
+                if self._error_rate() >= self.error_threshold or self._p90_latency() > self.latency_threshold:
+                    self._trip(now)
+    
+    def release_probe(self):
+        """Give back a half-open probe slot whose request never completed"""
+        with self._lock:
+            self._probing = False
+    
+    def _trip(self, now: float):
+        self.state = 'open'
+        self.opened_at = now
+        self.trips += 1
+        self._outcomes.clear()
+    
+    def _prune(self, now: float):
+        while self._outcomes and self._outcomes[0][0] < now - self.window:
+            self._outcomes.popleft()
+    
+    def _error_rate(self) -> float:
+        if not self._outcomes:
+            return 0.0
+        return sum(1 for _, success, _ in self._outcomes if not success) / len(self._outcomes)
+    
+    def _p90_latency(self) -> float:
+        if not self._outcomes:
+            return 0.0
+        latencies = sorted(latency for _, _, latency in self._outcomes)
+        return latencies[min(len(latencies) - 1, int(len(latencies) * 0.9))]
+    
+    def health(self) -> Dict[str, Any]:
+        """Current breaker state and window statistics"""
+        with self._lock:
+            self._prune(time.monotonic())
+            return {
+                'state': self.state,
+                'requests': len(self._outcomes),
+                'error_rate': round(self._error_rate(), 3),
+                'p90_latency_ms': round(self._p90_latency() * 1000, 1),
+                'trips': self.trips,
+                'rejected': self.rejected,
+                'retry_in': round(max(0.0, self.opened_at + self.cooldown - time.monotonic()), 1)
+                if self.state == 'open' else 0.0
+            }
+
+
+_circuit_breakers: Dict[str, CircuitBreaker] = {}
+_circuit_breakers_lock = threading.Lock()
+
+
+def get_circuit_breaker(provider: str) -> CircuitBreaker:
+    """Shared circuit breaker for a provider"""
+    breaker = _circuit_breakers.get(provider)
+    if breaker is None:
+        with _circuit_breakers_lock:
+            breaker = _circuit_breakers.setdefault(provider, CircuitBreaker(provider))
+    return breaker
+
+
+def configure_circuit_breaker(provider: str, **settings) -> CircuitBreaker:
+    """
+    Replace a provider's circuit breaker
+    
+    Args:
+        provider: Provider name
+        **settings: CircuitBreaker arguments (window, min_requests, error_threshold, latency_threshold, cooldown)
+        
+    Returns:
+        The new breaker
+    """
+    breaker = CircuitBreaker(provider, **settings)
+    with _circuit_breakers_lock:
+        _circuit_breakers[provider] = breaker
+    return breaker
+
+
+def provider_health() -> Dict[str, Dict[str, Any]]:
+    """Breaker health for every provider used so far"""
+    return {provider: breaker.health() for provider, breaker in list(_circuit_breakers.items())}
+
+
+def _check_circuit(provider: str) -> CircuitBreaker:
+    """Fail fast with ProviderUnavailable when the provider's breaker is open"""
+    breaker = get_circuit_breaker(provider)
+    if not breaker.allow():
+        _metrics.inc('image_search_circuit_rejections_total', provider=provider)
+        raise ProviderUnavailable(provider, "circuit open, skipping provider")
+    return breaker
+
+
+# Set while a hedged plan step runs; once the event is set the step stops
+# before its next request that the cache cannot answer
+_step_cancelled: ContextVar[Optional[threading.Event]] = ContextVar('image_search_step_cancelled', default=None)
+
+
+def _check_cancelled(provider: str):
+    """Raise SearchCancelled when the running plan step has been called off"""
+    cancelled = _step_cancelled.get()
+    if cancelled is not None and cancelled.is_set():
+        raise SearchCancelled(provider, "hedged step cancelled, earlier tier was enough")
+
+
+def _check_deadline(provider: str):
+    """Raise ProviderError instead of sending a request once the running search's deadline has passed"""
+    deadline = _request_deadline.get()
+    if deadline is not None and time.monotonic() >= deadline:
+        raise ProviderError(provider, "search deadline passed, request not sent")
+
+
+class SpendMeter:
+    """
+    USD spent on the provider requests actually sent, against a spend cap
+    
+    Every request leaving _rate_limited/_async_rate_limited is charged at
+    PROVIDER_COSTS to the meter of the running context and its parents
+    (cache hits and coalesced calls send nothing and cost nothing).
+    `rebought` counts the results paid for twice: DataForSEO has no result
+    offset, so each wider fetch_until request returns (and bills) the rows
+    of the narrower one again.
+    
+    Args:
+        limit: Spend cap in USD
+        parent: Meter also charged, whose cap applies too (e.g. the whole search's)
+    """
+    
+    def __init__(self, limit: float = float('inf'), parent: Optional['SpendMeter'] = None):
+        self.limit = limit
+        self.parent = parent
+        self.spent = 0.0
+        self.requests = 0
+        self.rebought = 0
+        self._lock = threading.Lock()
+    
+    def charge(self, provider: str):
+        """Record one request sent to provider"""
+        with self._lock:
+            self.spent += PROVIDER_COSTS.get(provider, 0.0)
+            self.requests += 1
+        if self.parent is not None:
+            self.parent.charge(provider)
+    
+    def rebuy(self, results: int):
+        """Record results a request paid for again"""
+        with self._lock:
+            self.rebought += results
+        if self.parent is not None:
+            self.parent.rebuy(results)
+    
+    def headroom(self) -> float:
+        """USD left under this cap and every parent's"""
+        own = self.limit - self.spent
+        return own if self.parent is None else min(own, self.parent.headroom())
+
+
+# Meter of the running plan step (None outside planned searches)
+_spend_meter: ContextVar[Optional[SpendMeter]] = ContextVar('image_search_spend_meter', default=None)
+
+
+def _charge(provider: str):
+    meter = _spend_meter.get()
+    if meter is not None:
+        meter.charge(provider)
+
+
+def _requests_sent() -> int:
+    """Requests charged so far to the running plan step (0 outside planned searches)"""
+    meter = _spend_meter.get()
+    return meter.requests if meter is not None else 0
+
+
+def _rebuy(results: int):
+    meter = _spend_meter.get()
+    if meter is not None and results:
+        meter.rebuy(results)
+
+
+def _affordable(provider: str, wanted: int = 1) -> int:
+    """How many of `wanted` further requests to provider the running plan step can pay for"""
+    meter = _spend_meter.get()
+    cost = PROVIDER_COSTS.get(provider, 0.0)
+    if meter is None or cost <= 0.0:
+        return wanted
+    return max(0, min(wanted, int((meter.headroom() + 1e-9) / cost)))
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent identical calls onto a single in-flight execution
+    
+    The first caller for a key runs the call; callers arriving while it is
+    still running wait for and share its outcome (result or exception).
+    Sync calls are shared across threads, async calls across tasks of the
+    same event loop.
+    """
+    
+    def __init__(self):
+        self._calls: Dict[str, Future] = {}
+        self._async_calls: Dict[Tuple[str, int], asyncio.Task] = {}
+        self._lock = threading.Lock()
+        self.coalesced = 0
+    
+    def do(self, key: str, fn):
+        """Run fn() once for all concurrent callers with the same key"""
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._calls[key] = future
+            else:
+                self.coalesced += 1
+        
+        if not leader:
+            return future.result()
+        
+        try:
+            result = fn()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+    
+    async def do_async(self, key: str, fn):
+        """Await fn() once for all concurrent tasks with the same key"""
+        loop = asyncio.get_running_loop()
+        call_key = (key, id(loop))
+        
+        with self._lock:
+            # A sync or claimed call for the key is joined across threads
+            future = self._calls.get(key)
+            task = self._async_calls.get(call_key) if future is None else None
+            if future is None and task is None:
+                task = loop.create_task(fn())
+                self._async_calls[call_key] = task
+                task.add_done_callback(lambda done: self._finish_async(call_key, done))
+            else:
+                self.coalesced += 1
+        
+        if future is not None:
+            return await asyncio.wrap_future(future)
+        # Shielded so one cancelled waiter does not cancel the call for the others
+        return await asyncio.shield(task)
+    
+    def claim(self, key: str, loop: Optional[asyncio.AbstractEventLoop] = None) -> Optional[Future]:
+        """
+        Reserve a key for a call the caller runs itself (e.g. inside a batched request)
+        
+        Args:
+            key: Call key
+            loop: Event loop whose async calls also count as in flight
+            
+        Returns:
+            A future to resolve with settle(), or None when a call for the key is already in flight
+        """
+        with self._lock:
+            if key in self._calls or (loop is not None and (key, id(loop)) in self._async_calls):
+                return None
+            future = Future()
+            self._calls[key] = future
+            return future
+    
+    def settle(self, key: str, future: Future, result: Any = None, error: Optional[BaseException] = None):
+        """Resolve a claimed call, handing its result or error to the callers that joined it"""
+        with self._lock:
+            if self._calls.get(key) is future:
+                del self._calls[key]
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+    
+    def _finish_async(self, call_key: Tuple[str, int], task: asyncio.Task):
+        """Forget a finished async call and mark its exception as retrieved"""
+        with self._lock:
+            if self._async_calls.get(call_key) is task:
+                del self._async_calls[call_key]
+        if not task.cancelled():
+            task.exception()
+    
+    def stats(self) -> Dict[str, int]:
+        """In-flight and coalesced call counts"""
+        with self._lock:
+            return {
+                'in_flight': len(self._calls) + len(self._async_calls),
+                'coalesced': self.coalesced
+            }
+
+
+_inflight = SingleFlight()
+
+
+def get_single_flight() -> SingleFlight:
+    """Shared single-flight group used by all provider calls"""
+    return _inflight
+
+
+def _flight_key(provider: str, query: str, params: Dict[str, Any], bypass_cache: bool) -> str:
+    """Single-flight key of a provider call"""
+    return f"{get_result_cache().make_key(provider, query, params)}:{int(bypass_cache)}"
+
+
+def _call_provider(
+    provider: str,
+    query: str,
+    params: Dict[str, Any],
+    fetch,
+    bypass_cache: bool = False
+) -> ResultBatch:
+    """Run a sync provider request through the result cache, single-flight group and rate limiter"""
+    if not bypass_cache:
+        cached = _cache_get(provider, query, params)
+        if cached is not None:
+            return cached
+    _check_cancelled(provider)
+    _check_deadline(provider)
+    
+    def fetch_and_store():
+        results = _rate_limited(provider, fetch)
+        if not bypass_cache:
+            _cache_put(provider, query, params, results)
+        _library_add(query, results)
+        return results
+    
+    results = _inflight.do(_flight_key(provider, query, params, bypass_cache), fetch_and_store)
+    return results.copy()
+
+
+async def _acall_provider(
+    provider: str,
+    query: str,
+    params: Dict[str, Any],
+    fetch,
+    bypass_cache: bool = False
+) -> ResultBatch:
+    """Run an async provider request (fetch returns an awaitable) through the result cache, single-flight group and rate limiter"""
+    # The cache is SQLite: reads, writes and evictions run off the event loop
+    if not bypass_cache:
+        cached = await asyncio.to_thread(_cache_get, provider, query, params)
+        if cached is not None:
+            return cached
+    _check_cancelled(provider)
+    _check_deadline(provider)
+    
+    async def fetch_and_store():
+        results = await _async_rate_limited(provider, fetch)
+        if not bypass_cache:
+            await asyncio.to_thread(_cache_put, provider, query, params, results)
+        # The library insert is an FTS5 transaction, kept off the loop too
+        await asyncio.to_thread(_library_add, query, results)
+        return results
+    
+    results = await _inflight.do_async(_flight_key(provider, query, params, bypass_cache), fetch_and_store)
+    return results.copy()
+
+
+# Per-source time budgets (seconds) for the concurrent search_all_images fan-out
+DEFAULT_SOURCE_DEADLINES = {
+    'dataforseo': 20.0,
+    'pexels': 8.0,
+    'everypixel': 8.0,
+}
+
+# Worker threads running sync provider calls concurrently
+_search_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv('IMAGE_SEARCH_WORKERS', '16')),
+    thread_name_prefix='image-search'
+)
+
+# Worker threads fetching the pages of paginated searches (kept apart from the
+# search workers, which wait on them)
+_page_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv('IMAGE_SEARCH_PAGE_WORKERS', '8')),
+    thread_name_prefix='image-page'
+)
+
+
+# Query parameters that only track the visit and never change the image
+TRACKING_PARAMS = {
+    'utm_source', 'utm_medium', 'utm_campaign', 'utm_term', 'utm_content',
+    'fbclid', 'gclid', 'dclid', 'msclkid', 'mc_cid', 'mc_eid', 'igshid',
+    'ref', 'ref_src', 'ref_url', '_ga', 'spm'
+}
+
+# Resize/format parameters image CDNs use to serve variants of the same asset
+SIZE_PARAMS = {
+    'w', 'h', 'width', 'height', 'fit', 'crop', 'auto', 'cs', 'dpr', 'q', 'quality',
+    'fm', 'format', 'ixlib', 'ixid', 'resize', 'size', 'sz', 'lossless'
+}
+
+# Hosts whose query strings only carry resize/format options
+IMAGE_CDN_HOSTS = ('pexels.com', 'unsplash.com', 'wikimedia.org', 'pixabay.com', 'staticflickr.com')
+
+_PEXELS_PHOTO_ID = re.compile(r'^/(?:photos|photo)/(?:[^/]*-)?(\d+)(?:/|$)')
+_WIKIMEDIA_THUMB = re.compile(r'^(/wikipedia/[^/]+)/thumb(/[0-9a-f]/[0-9a-f]{2}/[^/]+)/[^/]+$')
+_FLICKR_SIZE_SUFFIX = re.compile(r'^(/\d+/\d+_[0-9a-f]+)(?:_[a-z0-9])?(\.\w+)$')
+
+
+def canonical_url(url: str) -> str:
+    """
+    Canonical identity of an image URL
+    
+    Drops scheme, 'www.', host case, trailing slashes, tracking parameters
+    and CDN resize parameters, and maps known size variants (Pexels photo
+    IDs, Wikimedia thumbnails, Flickr size suffixes) onto the original asset.
+    """
+    try:
+        parts = urlsplit(url.strip())
+    except ValueError:
+        return url.strip()
+    
+    host = (parts.hostname or '').lower()
+    if host.startswith('www.'):
+        host = host[4:]
+    path = parts.path.rstrip('/') or '/'
+    
+    if host.endswith('pexels.com'):
+        match = _PEXELS_PHOTO_ID.match(path)
+        if match:
+            return f"pexels:{match.group(1)}"
+    
+    if host == 'upload.wikimedia.org':
+        match = _WIKIMEDIA_THUMB.match(path)
+        if match:
+            path = match.group(1) + match.group(2)
+    
+    if host.endswith('staticflickr.com'):
+        match = _FLICKR_SIZE_SUFFIX.match(path)
+        if match:
+            path = match.group(1) + match.group(2)
+            host = 'staticflickr.com'
+    
+    drop = TRACKING_PARAMS | SIZE_PARAMS if host.endswith(IMAGE_CDN_HOSTS) else TRACKING_PARAMS
+    params = sorted(
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if key.lower() not in drop and not key.lower().startswith('utm_')
+    )
+    
+    canonical = f"//{host}{path}"
+    if params:
+        canonical += '?' + urlencode(params)
+    return canonical
+
+
+# Perceptual hashes of preview images, keyed by preview URL
+_preview_hashes: 'OrderedDict[str, Optional[int]]' = OrderedDict()
+_preview_hashes_lock = threading.Lock()
+PREVIEW_HASH_CACHE_SIZE = 10000
+
+
+def perceptual_hash(image_bytes: bytes) -> Optional[int]:
+    """64-bit difference hash (dHash) of an image, or None if it cannot be decoded"""
+    Image = _pil_image()
+    if Image is None:
+        return None
+    try:
+        with Image.open(io.BytesIO(image_bytes)) as image:
+            pixels = list(image.convert('L').resize((9, 8)).getdata())
+    except Exception:
+        return None
+    
+    value = 0
+    for row in range(8):
+        for col in range(8):
+            value = (value << 1) | (pixels[row * 9 + col] > pixels[row * 9 + col + 1])
+    return value
+
+
+def preview_hash(preview_url: str, timeout: float = 5) -> Optional[int]:
+    """Perceptual hash of a preview image, fetched once and cached by URL"""
+    with _preview_hashes_lock:
+        if preview_url in _preview_hashes:
+            _preview_hashes.move_to_end(preview_url)
+            return _preview_hashes[preview_url]
+    
+    value = None
+    try:
+        response = _transport.session('previews').get(preview_url, timeout=timeout)
+        if response.status_code == 200:
+            value = perceptual_hash(response.content)
+    except requests.RequestException:
+        pass
+    
+    with _preview_hashes_lock:
+        _preview_hashes[preview_url] = value
+        while len(_preview_hashes) > PREVIEW_HASH_CACHE_SIZE:
+            _preview_hashes.popitem(last=False)
+    return value
+
+
+class DedupIndex:
+    """
+    Incremental duplicate detector for image results
+    
+    Results are first collapsed on canonical_url(). With perceptual=True,
+    preview images are also hashed and results within max_distance bits
+    (Hamming) of an earlier one are dropped. Hashes are split into
+    max_distance + 1 bands indexed in dicts, so any near match shares at
+    least one exact band and lookups stay O(1) per result.
+    
+    Args:
+        perceptual: Also collapse near-identical images by preview hash (needs Pillow)
+        max_distance: Maximum Hamming distance between duplicate hashes
+    """
+    
+    def __init__(self, perceptual: bool = False, max_distance: int = 3):
+        self.perceptual = perceptual and _pil_image() is not None
+        self.max_distance = max_distance
+        self._urls = set()
+        self._bands: Dict[Tuple[int, int], List[int]] = {}
+        self._band_width = 64 // (max_distance + 1)
+        self._band_count = max_distance + 1
+    
+    def _band_keys(self, value: int) -> List[Tuple[int, int]]:
+        keys = []
+        for band in range(self._band_count):
+            shift = band * self._band_width
+            width = 64 - shift if band == self._band_count - 1 else self._band_width
+            keys.append((band, (value >> shift) & ((1 << width) - 1)))
+        return keys
+    
+    def seen_url(self, url: str) -> bool:
+        """Record a URL, returning True if its canonical form was already seen"""
+        key = canonical_url(url)
+        if key in self._urls:
+            return True
+        self._urls.add(key)
+        return False
+    
+    def seen_hash(self, value: Optional[int]) -> bool:
+        """Record a perceptual hash, returning True if a near-identical one was already seen"""
+        if value is None:
+            return False
+        keys = self._band_keys(value)
+        for key in keys:
+            for other in self._bands.get(key, ()):
+                if bin(value ^ other).count('1') <= self.max_distance:
+                    return True
+        for key in keys:
+            self._bands.setdefault(key, []).append(value)
+        return False
+    
+    def dedup(self, results: Union[ResultBatch, List[Dict[str, Any]]]) -> Union[ResultBatch, List[Dict[str, Any]]]:
+        """Filter results (batch or list of dicts), keeping the first occurrence of each image"""
+        if isinstance(results, ResultBatch):
+            urls, previews = results.url, results.preview_url
+        else:
+            urls = [img.get('url') or '' for img in results]
+            previews = [img.get('preview_url') or '' for img in results]
+        
+        keep = [i for i, url in enumerate(urls) if url and not self.seen_url(url)]
+        if self.perceptual:
+            hashes = list(_search_executor.map(preview_hash, [previews[i] or urls[i] for i in keep]))
+            keep = [i for i, value in zip(keep, hashes) if not self.seen_hash(value)]
+        
+        if isinstance(results, ResultBatch):
+            return results.take(keep)
+        return [results[i] for i in keep]
+
+
+def dedup_results(
+    results: Union[ResultBatch, List[Dict[str, Any]]],
+    perceptual: bool = False
+) -> Union[ResultBatch, List[Dict[str, Any]]]:
+    """
+    Remove duplicate images from a result list
+    
+    Args:
+        results: Image results in priority order (ResultBatch or list of dicts)
+        perceptual: Also collapse near-identical images by preview hash
+        
+    Returns:
+        Results with duplicates removed, first occurrence kept
+    """
+    return DedupIndex(perceptual=perceptual).dedup(results)
+
+
+# Image header probing: bytes requested per probe and the most read when the
+# server ignores Range (JPEG EXIF blocks can push the frame header past 32 KB)
+PROBE_RANGE_BYTES = 4096
+PROBE_MAX_BYTES = 65536
+PROBE_CONCURRENCY = 16
+PROBE_CACHE_SIZE = 10000
+
+# Probed (content type, width, height) keyed by image URL; None when unreadable
+_probe_cache: 'OrderedDict[str, Optional[Tuple[str, int, int]]]' = OrderedDict()
+_probe_cache_lock = threading.Lock()
+
+# JPEG start-of-frame markers (baseline, progressive, lossless, arithmetic variants)
+_JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+def parse_image_header(data: bytes) -> Optional[Tuple[str, int, int]]:
+    """
+    Content type and dimensions from the first bytes of a PNG, JPEG, WebP or GIF
+    
+    Args:
+        data: Leading bytes of the image file
+        
+    Returns:
+        (content_type, width, height), or None when the header is incomplete or unknown
+    """
+    if data[:8] == b'\x89PNG\r\n\x1a\n':
+        if len(data) >= 24 and data[12:16] == b'IHDR':
+            return 'image/png', int.from_bytes(data[16:20], 'big'), int.from_bytes(data[20:24], 'big')
+        return None
+    
+    if data[:6] in (b'GIF87a', b'GIF89a'):
+        if len(data) >= 10:
+            return 'image/gif', int.from_bytes(data[6:8], 'little'), int.from_bytes(data[8:10], 'little')
+        return None
+    
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        chunk = data[12:16]
+        if chunk == b'VP8 ' and len(data) >= 30:
+            return 'image/webp', int.from_bytes(data[26:28], 'little') & 0x3FFF, int.from_bytes(data[28:30], 'little') & 0x3FFF
+        if chunk == b'VP8L' and len(data) >= 25:
+            bits = int.from_bytes(data[21:25], 'little')
+            return 'image/webp', (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+        if chunk == b'VP8X' and len(data) >= 30:
+            return 'image/webp', int.from_bytes(data[24:27], 'little') + 1, int.from_bytes(data[27:30], 'little') + 1
+        return None
+    
+    if data[:2] == b'\xff\xd8':
+        # Walk the marker segments until a start-of-frame carries the size
+        pos = 2
+        while pos + 4 <= len(data):
+            if data[pos] != 0xFF:
+                return None
+            marker = data[pos + 1]
+            if marker == 0xFF:
+                pos += 1
+                continue
+            if marker == 0xD8 or 0xD0 <= marker <= 0xD7:
+                pos += 2
+                continue
+            length = int.from_bytes(data[pos + 2:pos + 4], 'big')
+            if marker in _JPEG_SOF_MARKERS:
+                if pos + 9 > len(data):
+                    return None
+                return 'image/jpeg', int.from_bytes(data[pos + 7:pos + 9], 'big'), int.from_bytes(data[pos + 5:pos + 7], 'big')
+            pos += 2 + length
+        return None
+    
+    return None
+
+
+async def probe_image(session: aiohttp.ClientSession, url: str, timeout: float = 5) -> Optional[Tuple[str, int, int]]:
+    """
+    Content type and dimensions of a remote image, reading only its first bytes
+    
+    Requests a small Range and keeps reading (up to PROBE_MAX_BYTES) only while
+    the header is still incomplete, so servers that ignore Range are cut off
+    early too. Results, including failures, are cached by URL.
+    
+    Args:
+        session: aiohttp session used for the request
+        url: Image URL
+        timeout: Request timeout in seconds
+        
+    Returns:
+        (content_type, width, height), or None when the image could not be read
+    """
+    with _probe_cache_lock:
+        if url in _probe_cache:
+            _probe_cache.move_to_end(url)
+            return _probe_cache[url]
+    
+    info = None
+    data = b''
+    try:
+        # A second, wider Range covers JPEGs whose frame header sits behind large metadata
+        for end in (PROBE_RANGE_BYTES, PROBE_MAX_BYTES):
+            async with session.get(
+                url,
+                headers={'Range': f'bytes={len(data)}-{end - 1}'},
+                timeout=aiohttp.ClientTimeout(total=timeout)
+            ) as response:
+                if response.status not in (200, 206):
+                    break
+                if response.status == 200:
+                    data = b''
+                async for chunk in response.content.iter_chunked(PROBE_RANGE_BYTES):
+                    data += chunk
+                    info = parse_image_header(data)
+                    if info is not None or len(data) >= PROBE_MAX_BYTES:
+                        break
+                ranged = response.status == 206
+            if info is not None or not ranged or len(data) < end:
+                break
+    except (aiohttp.ClientError, asyncio.TimeoutError, ValueError):
+        pass
+    
+    with _probe_cache_lock:
+        _probe_cache[url] = info
+        while len(_probe_cache) > PROBE_CACHE_SIZE:
+            _probe_cache.popitem(last=False)
+    return info
+
+
+async def probe_dimensions(
+    results: ResultBatch,
+    session: Optional[aiohttp.ClientSession] = None,
+    concurrency: int = PROBE_CONCURRENCY,
+    timeout: float = 5,
+    deadline: Optional[float] = None
+) -> ResultBatch:
+    """
+    Fill in width/height for results whose size is unknown (0), in place
+    
+    Args:
+        results: Results to complete
+        session: aiohttp session (defaults to the pooled transport session)
+        concurrency: Probes in flight at once
+        timeout: Per-probe timeout in seconds
+        deadline: Time budget for all probes in seconds; probes still running then
+            are cancelled and their results keep an unknown size
+        
+    Returns:
+        The same batch
+    """
+    if session is None:
+        # The pooled session is closed with the loop's last scope, as in search_multiple_sources
+        async with _transport.loop_scope():
+            return await probe_dimensions(results, _transport.async_session('probe'), concurrency, timeout, deadline)
+    semaphore = asyncio.Semaphore(concurrency)
+    
+    async def probe(index: int):
+        async with semaphore:
+            info = await probe_image(session, results.url[index], timeout)
+        if info is not None:
+            results.width[index], results.height[index] = info[1], info[2]
+    
+    unknown = [i for i in range(len(results)) if results.url[i] and not (results.width[i] and results.height[i])]
+    probes = asyncio.gather(*(probe(i) for i in unknown))
+    try:
+        await asyncio.wait_for(probes, deadline)
+    except asyncio.TimeoutError:
+        pass
+    return results
+
+
+def probe_dimensions_sync(
+    results: ResultBatch,
+    concurrency: int = PROBE_CONCURRENCY,
+    timeout: float = 5,
+    deadline: Optional[float] = None
+) -> ResultBatch:
+    """probe_dimensions for sync callers, safe to use while an event loop is running"""
+    async def run():
+        connector = aiohttp.TCPConnector(limit=concurrency)
+        async with aiohttp.ClientSession(connector=connector) as session:
+            return await probe_dimensions(results, session, concurrency, timeout, deadline)
+    
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(run())
+    # asyncio.run can't nest inside a running loop, so use a worker thread
+    return _search_executor.submit(asyncio.run, run()).result()
+
+
+def filter_by_resolution(results: ResultBatch, min_width: int, min_height: int) -> ResultBatch:
+    """Keep results known to be at least min_width x min_height (unknown sizes are dropped)"""
+    return results.take(
+        i for i in range(len(results))
+        if results.width[i] >= min_width and results.height[i] >= min_height
+    )
+
+
+# Orientations SearchFilters accepts besides 'all'
+FILTER_ORIENTATIONS = ('landscape', 'portrait', 'square')
+
+# Width/height ratios within this of 1 count as square in client-side checks
+SQUARE_TOLERANCE = 0.1
+
+# Filters each provider applies natively; the others fall back to query
+# keywords (color, category) or a client-side check on known sizes (orientation)
+PROVIDER_FILTERS = {
+    'pexels': ('orientation', 'color'),
+    'everypixel': ('orientation',),
+    'dataforseo': ('orientation', 'color'),
+}
+
+# Native orientation values per provider (DataForSEO forwards Google's tbs=iar)
+PROVIDER_ORIENTATIONS = {
+    'pexels': {'landscape': 'landscape', 'portrait': 'portrait', 'square': 'square'},
+    'everypixel': {'landscape': 'horizontal', 'portrait': 'vertical', 'square': 'square'},
+    'dataforseo': {'landscape': 'iar:w', 'portrait': 'iar:t', 'square': 'iar:s'},
+}
+
+# Named colors Pexels accepts (hex codes are accepted too)
+PEXELS_COLORS = ('red', 'orange', 'yellow', 'green', 'turquoise', 'blue', 'violet', 'pink', 'brown', 'black', 'gray', 'white')
+
+# Google Images color swatches (tbs=ic:specific,isc:<name>) with their RGB values
+GOOGLE_IMAGE_COLORS = {
+    'red': (204, 0, 0), 'orange': (251, 148, 11), 'yellow': (255, 255, 0), 'green': (0, 204, 0),
+    'teal': (3, 192, 198), 'blue': (0, 0, 255), 'purple': (118, 44, 167), 'pink': (255, 152, 191),
+    'white': (255, 255, 255), 'gray': (153, 153, 153), 'black': (0, 0, 0), 'brown': (136, 84, 24),
+}
+
+# Spellings of the same color across providers
+COLOR_ALIASES = {'grey': 'gray', 'turquoise': 'teal', 'violet': 'purple'}
+PEXELS_COLOR_ALIASES = {'grey': 'gray', 'teal': 'turquoise', 'purple': 'violet'}
+
+
+def normalize_filters(filters: Union[SearchFilters, Dict[str, Any], None]) -> Dict[str, str]:
+    """
+    Active search filters from a SearchFilters model or a plain dict
+    
+    'all' and empty values are dropped, so no filters gives {} (and the
+    provider requests and cache keys of an unfiltered search).
+    """
+    if filters is None:
+        return {}
+    if isinstance(filters, SearchFilters):
+        filters = filters.model_dump()
+    
+    active = {}
+    for name in ('orientation', 'color', 'category'):
+        value = str(filters.get(name) or 'all').strip().lower()
+        if value != 'all':
+            active[name] = value
+    
+    orientation = active.get('orientation')
+    if orientation and orientation not in FILTER_ORIENTATIONS:
+        raise ValueError(f"Unknown orientation: {orientation} (expected one of {', '.join(FILTER_ORIENTATIONS)} or all)")
+    return active
+
+
+def _hex_color(color: str) -> Optional[Tuple[int, int, int]]:
+    """RGB of a '#rrggbb' or 'rrggbb' color, None for anything else"""
+    value = color.lstrip('#')
+    if not re.fullmatch(r'[0-9a-f]{6}', value):
+        return None
+    return int(value[0:2], 16), int(value[2:4], 16), int(value[4:6], 16)
+
+
+def _native_color(provider: str, color: str) -> Optional[str]:
+    """A provider's own value for `color`, or None when it cannot filter on it"""
+    rgb = _hex_color(color)
+    if provider == 'pexels':
+        if rgb is not None:
+            return '#' + color.lstrip('#')
+        color = PEXELS_COLOR_ALIASES.get(color, color)
+        return color if color in PEXELS_COLORS else None
+    if provider == 'dataforseo':
+        if rgb is not None:
+            # Google only offers swatches, so hex codes go to the nearest one
+            return min(
+                GOOGLE_IMAGE_COLORS,
+                key=lambda name: sum((a - b) ** 2 for a, b in zip(GOOGLE_IMAGE_COLORS[name], rgb))
+            )
+        color = COLOR_ALIASES.get(color, color)
+        return color if color in GOOGLE_IMAGE_COLORS else None
+    return None
+
+
+def push_down_filters(provider: str, query: str, filters: Dict[str, str]) -> Tuple[str, Dict[str, str], Dict[str, str]]:
+    """
+    Translate normalized filters into a provider's native request parameters
+    
+    Args:
+        provider: 'pexels', 'everypixel' or 'dataforseo'
+        query: Search query
+        filters: Output of normalize_filters
+    
+    Returns:
+        The query (with keywords for filters the provider has no parameter
+        for), the native parameters, and the filters left to check
+        client-side with apply_client_filters
+    """
+    native, client = {}, {}
+    supported = PROVIDER_FILTERS.get(provider, ())
+    keywords = []
+    
+    orientation = filters.get('orientation')
+    if orientation:
+        if 'orientation' in supported:
+            native['orientation'] = PROVIDER_ORIENTATIONS[provider][orientation]
+        else:
+            client['orientation'] = orientation
+    
+    color = filters.get('color')
+    if color:
+        value = _native_color(provider, color) if 'color' in supported else None
+        if value is not None:
+            native['color'] = value
+        else:
+            keywords.append(color)
+    
+    if filters.get('category'):
+        keywords.append(filters['category'])
+    
+    if provider == 'dataforseo' and native:
+        # Google Images takes both as tbs options, passed through search_param
+        tbs = [native['orientation']] if 'orientation' in native else []
+        if 'color' in native:
+            tbs.append(f"ic:specific,isc:{native['color']}")
+        native = {'search_param': f"&tbs={','.join(tbs)}"}
+    
+    if keywords:
+        query = f"{query} {' '.join(keywords)}"
+    return query, native, client
+
+
+def filter_by_orientation(results: ResultBatch, orientation: str) -> ResultBatch:
+    """Keep results of the given orientation (unknown sizes are kept)"""
+    def matches(width: int, height: int) -> bool:
+        if not width or not height:
+            return True
+        ratio = width / height
+        if orientation == 'square':
+            return abs(ratio - 1) <= SQUARE_TOLERANCE
+        if orientation == 'landscape':
+            return ratio > 1 + SQUARE_TOLERANCE
+        return ratio < 1 - SQUARE_TOLERANCE
+    
+    return results.take(i for i in range(len(results)) if matches(results.width[i], results.height[i]))
+
+
+def apply_client_filters(results: ResultBatch, client_filters: Dict[str, str]) -> ResultBatch:
+    """Apply the filters push_down_filters could not send to the provider"""
+    if client_filters.get('orientation'):
+        results = filter_by_orientation(results, client_filters['orientation'])
+    return results
+
+
+# Prior usefulness of each source's results before looking at the result itself
+PROVIDER_PRIORS = {
+    'pexels': 0.9,
+    'everypixel': 0.7,
+    'dataforseo': 0.5,
+    'dalle-3': 1.0,
+}
+
+# Penalty in [0, 1] for licenses that need clearing or payment
+LICENSE_PENALTIES = {
+    'CC0': 0.0,
+    'free': 0.0,
+    'ai-generated': 0.0,
+    'likely free': 0.15,
+    'commercial': 0.4,
+    'premium/paid': 0.4,
+    'verify required': 0.5,
+    'unknown': 0.5,
+}
+
+# Weights of the ranking components
+RANKING_WEIGHTS = {
+    'text': 0.5,
+    'resolution': 0.2,
+    'provider': 0.1,
+    'license': 0.15,
+    'cost': 0.05,
+}
+
+_TOKEN_PATTERN = re.compile(r'[a-z0-9]+')
+
+
+def _tokenize(text: str) -> List[str]:
+    """Lowercase alphanumeric tokens"""
+    return _TOKEN_PATTERN.findall(text.lower())
+
+
+def rank_results(
+    query: str,
+    results: Union[ResultBatch, List[Dict[str, Any]]],
+    aspect: float = 16 / 9,
+    min_width: int = 1920,
+    weights: Optional[Dict[str, float]] = None,
+    k1: float = 1.2,
+    b: float = 0.75
+) -> Union[ResultBatch, List[Dict[str, Any]]]:
+    """
+    Score and sort candidates in one vectorized pass
+    
+    Combines BM25 matching of the query against title/alt, resolution fit
+    against the requested aspect and width, provider priors and
+    license/cost penalties. Returns new results, best first (ties keep
+    provider order), carrying the score in 'relevance_score'; the input
+    is left untouched, since it may be a cached or shared batch.
+    
+    Args:
+        query: Search query the results were retrieved for
+        results: Candidate results (ResultBatch or list of dicts)
+        aspect: Target width/height ratio
+        min_width: Width at which resolution stops adding to the score
+        weights: Overrides of RANKING_WEIGHTS
+        k1: BM25 term-frequency saturation
+        b: BM25 length normalization
+        
+    Returns:
+        Results sorted by descending relevance_score, same type as the input
+    """
+    if not results:
+        return results
+    
+    if isinstance(results, ResultBatch):
+        texts = [f"{title} {alt}" for title, alt in zip(results.title, results.alt)]
+        width = np.asarray(results.width, dtype=np.float32)
+        height = np.asarray(results.height, dtype=np.float32)
+        sources, licenses = results.source, results.license
+        cost = np.asarray(results.cost, dtype=np.float32)
+    else:
+        texts = [f"{img.get('title') or ''} {img.get('alt') or ''}" for img in results]
+        width = np.array([img.get('width') or 0 for img in results], dtype=np.float32)
+        height = np.array([img.get('height') or 0 for img in results], dtype=np.float32)
+        sources = [img.get('source', '') for img in results]
+        licenses = [img.get('license', 'unknown') for img in results]
+        cost = np.array([img.get('cost') or 0.0 for img in results], dtype=np.float32)
+    
+    weights = {**RANKING_WEIGHTS, **(weights or {})}
+    terms = list(dict.fromkeys(_tokenize(query)))
+    n = len(texts)
+    
+    # Term frequencies of the query terms in each candidate's text
+    tf = np.zeros((n, max(len(terms), 1)), dtype=np.float32)
+    lengths = np.zeros(n, dtype=np.float32)
+    for i, text in enumerate(texts):
+        tokens = _tokenize(text)
+        lengths[i] = len(tokens)
+        counts = Counter(tokens)
+        for j, term in enumerate(terms):
+            tf[i, j] = counts.get(term, 0)
+    
+    # BM25 with document frequencies taken over the candidate set, scaled to [0, 1]
+    df = (tf > 0).sum(axis=0)
+    idf = np.log1p((n - df + 0.5) / (df + 0.5))
+    avg_length = max(float(lengths.mean()), 1.0)
+    norm = k1 * (1 - b + b * lengths / avg_length)
+    bm25 = (idf * tf * (k1 + 1) / (tf + norm[:, None])).sum(axis=1)
+    text_score = bm25 / bm25.max() if bm25.max() > 0 else bm25
+    
+    # Resolution fit: aspect ratio closeness and sufficient width; unknown sizes are neutral
+    known = (width > 0) & (height > 0)
+    ratio = np.where(known, width / np.where(height > 0, height, 1), aspect)
+    aspect_fit = np.exp(-2.0 * np.abs(np.log(ratio / aspect)))
+    size_fit = np.minimum(width / float(min_width), 1.0)
+    resolution = np.where(known, 0.5 * aspect_fit + 0.5 * size_fit, 0.5)
+    
+    provider = np.array([PROVIDER_PRIORS.get(source, 0.5) for source in sources], dtype=np.float32)
+    license_penalty = np.array([LICENSE_PENALTIES.get(license, 0.5) for license in licenses], dtype=np.float32)
+    cost_penalty = cost / (cost + 1.0)
+    
+    scores = (
+        weights['text'] * text_score
+        + weights['resolution'] * resolution
+        + weights['provider'] * provider
+        - weights['license'] * license_penalty
+        - weights['cost'] * cost_penalty
+    )
+    scores = np.round(np.clip(scores, 0.0, 1.0), 4)
+    order = np.argsort(-scores, kind='stable')
+    
+    if isinstance(results, ResultBatch):
+        ranked = results.take(order.tolist())
+        ranked.relevance_score = array('d', scores[order].tolist())
+        return ranked
+    
+    return [{**results[i], 'relevance_score': float(scores[i])} for i in order]
+
+
+
+# Incremental DataForSEO retrieval: first depth requested, granularity of
+# widened depths and the deepest request fetch_until will make
+DATAFORSEO_START_DEPTH = 20
+DATAFORSEO_DEPTH_STEP = 10
+DATAFORSEO_MAX_DEPTH = 200
+
+# Most tasks packed into one DataForSEO request by fetch_many. The Live
+# endpoints take a single task per request, so packing is opt-in
+DATAFORSEO_MAX_TASKS = int(os.getenv('DATAFORSEO_MAX_TASKS', '1'))
+
+
+class _DataForSEOClient:
+    """Credentials, payloads and response parsing shared by the sync and async DataForSEO clients"""
+    
+    def __init__(self):
+        self.login = os.getenv('DATAFORSEO_LOGIN')
+        self.password = os.getenv('DATAFORSEO_PASSWORD')
+        self.base_url = PROVIDER_ENDPOINTS['dataforseo']
+        
+        if not self.login or not self.password:
+            raise ValueError("DataForSEO credentials not found. Set DATAFORSEO_LOGIN and DATAFORSEO_PASSWORD in .env")
+        
+        # Create auth header
+        credentials = f"{self.login}:{self.password}"
+        self.auth_header = f"Basic {base64.b64encode(credentials.encode()).decode('utf-8')}"
+        self.max_tasks = DATAFORSEO_MAX_TASKS
+    
+    @property
+    def endpoint(self) -> str:
+        """Google Images live endpoint"""
+        return f"{self.base_url}/serp/google/images/live/advanced"
+    
+    def _headers(self) -> Dict[str, str]:
+        """Request headers shared by the sync and async clients"""
+        return {
+            'Authorization': self.auth_header,
+            'Content-Type': 'application/json'
+        }
+    
+    def _build_task(self, query: str, depth: int, search_params: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+        """One search task for the live endpoint (search_params from push_down_filters)"""
+        return {
+            "keyword": query,
+            "location_code": 2840,  # United States
+            "language_code": "en",
+            "device": "desktop",
+            "os": "windows",
+            "depth": depth,
+            **(search_params or {})
+        }
+    
+    def _build_payload(self, query: str, depth: int, search_params: Optional[Dict[str, str]] = None) -> List[Dict[str, Any]]:
+        """Build the task list sent to the live endpoint"""
+        return [self._build_task(query, depth, search_params)]
+    
+    def _build_batch_payload(self, queries: List[str], depth: int) -> List[Dict[str, Any]]:
+        """Task list for several queries, each tagged with its position for demultiplexing"""
+        return [{**self._build_task(query, depth), "tag": str(i)} for i, query in enumerate(queries)]
+    
+    @staticmethod
+    def _cached_many(queries: List[str], depth: int, bypass_cache: bool) -> Tuple[Dict[str, ResultBatch], List[str]]:
+        """Split queries into cached results and the ones that still need a request"""
+        results, missing = {}, []
+        for query in dict.fromkeys(queries):
+            cached = None if bypass_cache else _cache_get('dataforseo', query, {'depth': depth})
+            if cached is not None:
+                results[query] = cached
+            else:
+                missing.append(query)
+        return results, missing
+    
+    @staticmethod
+    def _claim_many(
+        queries: List[str],
+        depth: int,
+        bypass_cache: bool,
+        loop: Optional[asyncio.AbstractEventLoop] = None
+    ) -> Tuple[Dict[str, Future], List[str]]:
+        """Claim queries in the single-flight group; queries another call is already fetching are returned to join"""
+        claims, joined = {}, []
+        for query in queries:
+            claim = _inflight.claim(_flight_key('dataforseo', query, {'depth': depth}, bypass_cache), loop)
+            if claim is None:
+                joined.append(query)
+            else:
+                claims[query] = claim
+        return claims, joined
+    
+    @staticmethod
+    def _settle(
+        query: str,
+        claim: Future,
+        outcome: Union[ResultBatch, ProviderError],
+        depth: int,
+        bypass_cache: bool
+    ) -> Optional[ResultBatch]:
+        """Cache a claimed query's results and hand them (or its error) to the calls that joined it"""
+        key = _flight_key('dataforseo', query, {'depth': depth}, bypass_cache)
+        if isinstance(outcome, ProviderError):
+            print(f"DataForSEO search error for '{query}': {outcome}")
+            _inflight.settle(key, claim, error=outcome)
+            return None
+        if not bypass_cache:
+            _cache_put('dataforseo', query, {'depth': depth}, outcome)
+        _library_add(query, outcome)
+        _inflight.settle(key, claim, result=outcome)
+        return outcome.copy()
+    
+    def _abandon(self, claims: Dict[str, Future], depth: int, bypass_cache: bool):
+        """Fail the claims a batch left unresolved, so the calls that joined them do not wait forever"""
+        for query, claim in claims.items():
+            self._settle(query, claim, ProviderError('dataforseo', "batched search aborted"), depth, bypass_cache)
+    
+    @staticmethod
+    def _collect(
+        batch: ResultBatch,
+        seen: int,
+        accept: Optional[Callable[[ResultBatch, int], bool]],
+        results: ResultBatch,
+        count: int
+    ) -> int:
+        """Add qualifying rows past `seen` to results (up to count) and return the new seen mark"""
+        rows = [i for i in range(seen, len(batch)) if accept is None or accept(batch, i)]
+        results.extend(batch.take(rows[:count - len(results)]))
+        return max(seen, len(batch))
+    
+    @staticmethod
+    def _next_depth(depth: int, kept: int, needed: int, max_depth: int) -> int:
+        """Depth expected to cover the shortfall at the yield observed so far"""
+        # Assume at least one in ten items qualifies so sparse queries still widen
+        rate = max(kept / depth, 0.1)
+        wanted = depth + int(needed / rate * 1.25) + 1
+        wanted = -(-wanted // DATAFORSEO_DEPTH_STEP) * DATAFORSEO_DEPTH_STEP
+        return min(max(wanted, depth + DATAFORSEO_DEPTH_STEP), max_depth)
+    
+    def _demux_tasks(self, data: Dict[str, Any], count: int) -> List[Optional[ResultBatch]]:
+        """Results of a batched request in query order (None where a task failed)"""
+        batches: List[Optional[ResultBatch]] = [None] * count
+        for position, task in enumerate(data.get('tasks') or []):
+            # The tag is echoed back in task data; fall back to response order without it
+            tag = (task.get('data') or {}).get('tag')
+            index = int(tag) if tag is not None and str(tag).isdigit() else position
+            if index >= count:
+                continue
+            if task.get('status_code') not in (None, 20000):
+                print(f"DataForSEO task error for '{(task.get('data') or {}).get('keyword', '')}': {task.get('status_message', '')}")
+                continue
+            batches[index] = self._parse_task(task)
+        return batches
+    
+    def _parse_dataforseo_results(self, data: Dict[str, Any]) -> ResultBatch:
+        """Parse DataForSEO image search results"""
+        if data.get('tasks') and len(data['tasks']) > 0:
+            return self._parse_task(data['tasks'][0])
+        return ResultBatch()
+    
+    def _parse_task(self, task: Dict[str, Any]) -> ResultBatch:
+        """Parse the image items of one DataForSEO task"""
+        results = ResultBatch()
+        
+        if task.get('result') and len(task['result']) > 0:
+            result_data = task['result'][0]
+            
+            # Extract image items
+            items = result_data.get('items') or []
+            for item in items:
+                if item.get('type') == 'images_search':
+                    results.append(
+                        url=item.get('source_url', ''),
+                        preview_url=item.get('encoded_url', ''),
+                        title=item.get('title', ''),
+                        alt=item.get('alt', ''),
+                        source='dataforseo',
+                        source_website=item.get('subtitle', ''),
+                        original_url=item.get('url', ''),
+                        width=0,  # DataForSEO doesn't provide dimensions directly
+                        height=0,
+                        license='unknown',  # Need to check source
+                        cost=0.0,
+                        relevance_score=0.8
+                    )
+        
+        return results
+
+
+class DataForSEOImageSearch(_DataForSEOClient):
+    """DataForSEO Image Search client"""
+    
+    def search_images(self, query: str, depth: int = 100, timeout: float = 30, bypass_cache: bool = False) -> List[Dict[str, Any]]:
+        """Search images using DataForSEO Google Images API"""
+        try:
+            return self.fetch_images(query, depth=depth, timeout=timeout, bypass_cache=bypass_cache).to_dicts()
+        except Exception as e:
+            print(f"DataForSEO search error: {e}")
+            return []
+    
+    def fetch_images(
+        self,
+        query: str,
+        depth: int = 100,
+        timeout: float = 30,
+        bypass_cache: bool = False,
+        filters: Optional[Dict[str, str]] = None
+    ) -> ResultBatch:
+        """Search images, raising ProviderError instead of returning an empty list on failure"""
+        # Orientation and color both map to Google tbs options, so nothing is left client-side
+        query, search_params, _ = push_down_filters('dataforseo', query, filters or {})
+        return _call_provider(
+            'dataforseo', query, {'depth': depth, **search_params},
+            lambda: self._request_images(query, depth, timeout, search_params),
+            bypass_cache
+        )
+    
+    def fetch_many(
+        self,
+        queries: List[str],
+        depth: int = 100,
+        timeout: float = 30,
+        bypass_cache: bool = False
+    ) -> Dict[str, ResultBatch]:
+        """
+        Search many queries with as few requests as possible
+        
+        Cached queries are answered locally and queries another call is
+        already fetching join that call. The rest are claimed in the
+        single-flight group and packed up to max_tasks per request, each
+        returned task matched back to its query through the task tag; a
+        query whose task or packed request failed gets a request of its own.
+        
+        Args:
+            queries: Search queries (duplicates are searched once)
+            depth: Results per query
+            timeout: Per-request timeout in seconds
+            bypass_cache: Skip the result cache
+            
+        Returns:
+            Results per query; queries whose own request also failed are missing
+        """
+        results, missing = self._cached_many(queries, depth, bypass_cache)
+        claims, joined = self._claim_many(missing, depth, bypass_cache)
+        pending = list(claims)
+        try:
+            for start in range(0, len(pending), self.max_tasks):
+                chunk = pending[start:start + self.max_tasks]
+                for query, outcome in zip(chunk, self._fetch_chunk(chunk, depth, timeout)):
+                    batch = self._settle(query, claims.pop(query), outcome, depth, bypass_cache)
+                    if batch is not None:
+                        results[query] = batch
+        finally:
+            self._abandon(claims, depth, bypass_cache)
+        
+        for query in joined:
+            try:
+                results[query] = self.fetch_images(query, depth=depth, timeout=timeout, bypass_cache=bypass_cache)
+            except ProviderError as e:
+                print(f"DataForSEO search error for '{query}': {e}")
+        return results
+    
+    def _fetch_chunk(self, chunk: List[str], depth: int, timeout: float) -> List[Union[ResultBatch, ProviderError]]:
+        """Results (or error) per query of one packed request, failed tasks retried one query per request"""
+        batches: List[Optional[ResultBatch]] = [None] * len(chunk)
+        if len(chunk) > 1:
+            try:
+                batches = _rate_limited('dataforseo', lambda: self._request_many(chunk, depth, timeout))
+            except ProviderError as e:
+                print(f"DataForSEO batch error: {e}")
+        
+        outcomes = []
+        for query, batch in zip(chunk, batches):
+            if batch is None:
+                # Single-task requests are what the Live endpoint always accepts
+                try:
+                    batch = _rate_limited('dataforseo', lambda: self._request_images(query, depth, timeout))
+                except ProviderError as e:
+                    batch = e
+            outcomes.append(batch)
+        return outcomes
+    
+    def fetch_until(
+        self,
+        query: str,
+        count: int,
+        accept: Optional[Callable[[ResultBatch, int], bool]] = None,
+        start_depth: int = DATAFORSEO_START_DEPTH,
+        max_depth: int = DATAFORSEO_MAX_DEPTH,
+        timeout: float = 30,
+        bypass_cache: bool = False,
+        filters: Optional[Dict[str, str]] = None
+    ) -> ResultBatch:
+        """
+        Fetch shallow pages and widen the depth only until `count` results qualify
+        
+        Each request asks for a small depth; only the items beyond the previous
+        depth are filtered, and the next depth is sized from the yield observed
+        so far. Stops as soon as the quota is met, the provider runs out of
+        results, max_depth is reached or, inside a planned search, another
+        request would exceed its budget.
+        
+        The API has no result offset, so a wider request returns (and is billed
+        for) the rows of the previous one again; those rows are recorded as
+        `rebought` on the running SpendMeter. The yield-based sizing keeps
+        widenings, and so the overlap, to a minimum.
+        
+        Args:
+            query: Search query
+            count: Number of qualifying results wanted
+            accept: Predicate on (batch, row index); every result qualifies when None
+            start_depth: Depth of the first request
+            max_depth: Deepest request allowed
+            timeout: Per-request timeout in seconds
+            bypass_cache: Skip the result cache
+            filters: Normalized search filters, sent to Google with each request
+            
+        Returns:
+            Up to `count` qualifying results, in provider order
+        """
+        results = ResultBatch()
+        depth, seen = min(start_depth, max_depth), 0
+        while True:
+            sent = _requests_sent()
+            batch = self.fetch_images(query, depth=depth, timeout=timeout, bypass_cache=bypass_cache, filters=filters)
+            if _requests_sent() > sent:
+                # No offset: the wider request paid again for the rows already seen
+                _rebuy(min(seen, len(batch)))
+            seen = self._collect(batch, seen, accept, results, count)
+            if len(results) >= count or len(batch) < depth or depth >= max_depth:
+                return results
+            # Each widening is another billed request; stop where the search budget ends
+            if not _affordable('dataforseo'):
+                return results
+            depth = self._next_depth(depth, len(results), count - len(results), max_depth)
+    
+    def _request_images(
+        self,
+        query: str,
+        depth: int,
+        timeout: float,
+        search_params: Optional[Dict[str, str]] = None
+    ) -> ResultBatch:
+        """Single live request to the DataForSEO API"""
+        try:
+            response = _transport.session('dataforseo').post(
+                self.endpoint,
+                headers=self._headers(),
+                json=self._build_payload(query, depth, search_params),
+                timeout=timeout,
+                stream=True
+            )
+        except requests.RequestException as e:
+            raise ProviderError('dataforseo', str(e)) from e
+        
+        with response:
+            if response.status_code != 200:
+                _record_response(response.status_code, len(response.content))
+                raise ProviderError(
+                    'dataforseo', response.text[:500],
+                    status=response.status_code, retry_after=_parse_retry_after(response.headers)
+                )
+            try:
+                data, size = read_json_sync(response, DATAFORSEO_PROJECTION)
+            except requests.RequestException as e:
+                raise ProviderError('dataforseo', str(e)) from e
+            except ValueError as e:
+                raise ProviderError('dataforseo', f"invalid JSON response: {e}") from e
+        _record_response(response.status_code, size)
+        return self._parse_dataforseo_results(data)
+    
+    def _request_many(self, queries: List[str], depth: int, timeout: float) -> List[Optional[ResultBatch]]:
+        """Single live request carrying one task per query"""
+        try:
+            response = _transport.session('dataforseo').post(
+                self.endpoint,
+                headers=self._headers(),
+                json=self._build_batch_payload(queries, depth),
+                timeout=timeout,
+                stream=True
+            )
+        except requests.RequestException as e:
+            raise ProviderError('dataforseo', str(e)) from e
+        
+        with response:
+            if response.status_code != 200:
+                _record_response(response.status_code, len(response.content))
+                raise ProviderError(
+                    'dataforseo', response.text[:500],
+                    status=response.status_code, retry_after=_parse_retry_after(response.headers)
+                )
+            try:
+                data, size = read_json_sync(response, DATAFORSEO_PROJECTION)
+            except requests.RequestException as e:
+                raise ProviderError('dataforseo', str(e)) from e
+            except ValueError as e:
+                raise ProviderError('dataforseo', f"invalid JSON response: {e}") from e
+        _record_response(response.status_code, size)
+        return self._demux_tasks(data, len(queries))
+
+
+class AsyncDataForSEOImageSearch(_DataForSEOClient):
+    """Async DataForSEO Image Search client running on a caller-provided aiohttp session or the shared pool"""
+    
+    def __init__(self, session: Optional[aiohttp.ClientSession] = None):
+        super().__init__()
+        self.session = session
+    
+    def _session(self) -> aiohttp.ClientSession:
+        """Caller's session, else the running loop's pooled one (looked up per request, not in __init__)"""
+        return self.session or _transport.async_session('dataforseo')
+    
+    async def search_images(self, query: str, depth: int = 100, timeout: float = 30, bypass_cache: bool = False) -> List[Dict[str, Any]]:
+        """Search images using DataForSEO Google Images API without blocking the event loop"""
+        try:
+            batch = await self.fetch_images(query, depth=depth, timeout=timeout, bypass_cache=bypass_cache)
+            return batch.to_dicts()
+        except Exception as e:
+            print(f"Async DataForSEO search error: {e}")
+            return []
+    
+    async def fetch_images(
+        self,
+        query: str,
+        depth: int = 100,
+        timeout: float = 30,
+        bypass_cache: bool = False,
+        filters: Optional[Dict[str, str]] = None
+    ) -> ResultBatch:
+        """Async search, raising ProviderError instead of returning an empty list on failure"""
+        query, search_params, _ = push_down_filters('dataforseo', query, filters or {})
+        # A pooled session opened here is closed with the loop's last scope
+        async with _transport.loop_scope():
+            return await _acall_provider(
+                'dataforseo', query, {'depth': depth, **search_params},
+                lambda: self._request_images(query, depth, timeout, search_params),
+                bypass_cache
+            )
+    
+    async def fetch_many(
+        self,
+        queries: List[str],
+        depth: int = 100,
+        timeout: float = 30,
+        bypass_cache: bool = False
+    ) -> Dict[str, ResultBatch]:
+        """Async fetch_many: packed requests, and the per-query requests replacing failed tasks, are sent concurrently"""
+        async with _transport.loop_scope():
+            return await self._fetch_many(queries, depth, timeout, bypass_cache)
+    
+    async def _fetch_many(self, queries: List[str], depth: int, timeout: float, bypass_cache: bool) -> Dict[str, ResultBatch]:
+        """fetch_many body, run inside the loop scope of its sessions"""
+        # Cache reads and writes (SQLite) run off the event loop
+        results, missing = await asyncio.to_thread(self._cached_many, queries, depth, bypass_cache)
+        claims, joined = self._claim_many(missing, depth, bypass_cache, asyncio.get_running_loop())
+        pending = list(claims)
+        chunks = [pending[start:start + self.max_tasks] for start in range(0, len(pending), self.max_tasks)]
+        try:
+            outcomes = await asyncio.gather(*(self._fetch_chunk(chunk, depth, timeout) for chunk in chunks))
+            for chunk, chunk_outcomes in zip(chunks, outcomes):
+                for query, outcome in zip(chunk, chunk_outcomes):
+                    # Popped first: once handed to the thread the claim is settled even if we are cancelled
+                    claim = claims.pop(query)
+                    batch = await asyncio.to_thread(self._settle, query, claim, outcome, depth, bypass_cache)
+                    if batch is not None:
+                        results[query] = batch
+        finally:
+            self._abandon(claims, depth, bypass_cache)
+        
+        joined_batches = await asyncio.gather(
+            *(self.fetch_images(query, depth=depth, timeout=timeout, bypass_cache=bypass_cache) for query in joined),
+            return_exceptions=True
+        )
+        for query, batch in zip(joined, joined_batches):
+            if isinstance(batch, Exception):
+                print(f"Async DataForSEO search error for '{query}': {batch}")
+            else:
+                results[query] = batch
+        return results
+    
+    async def _fetch_chunk(self, chunk: List[str], depth: int, timeout: float) -> List[Union[ResultBatch, ProviderError]]:
+        """Results (or error) per query of one packed request, failed tasks retried one query per request"""
+        batches: List[Optional[ResultBatch]] = [None] * len(chunk)
+        if len(chunk) > 1:
+            try:
+                batches = await _async_rate_limited('dataforseo', lambda: self._request_many(chunk, depth, timeout))
+            except ProviderError as e:
+                print(f"Async DataForSEO batch error: {e}")
+        
+        async def alone(query: str) -> Union[ResultBatch, ProviderError]:
+            # Single-task requests are what the Live endpoint always accepts
+            try:
+                return await _async_rate_limited('dataforseo', lambda: self._request_images(query, depth, timeout))
+            except ProviderError as e:
+                return e
+        
+        retried = iter(await asyncio.gather(*(alone(query) for query, batch in zip(chunk, batches) if batch is None)))
+        return [batch if batch is not None else next(retried) for batch in batches]
+    
+    async def fetch_until(
+        self,
+        query: str,
+        count: int,
+        accept: Optional[Callable[[ResultBatch, int], bool]] = None,
+        start_depth: int = DATAFORSEO_START_DEPTH,
+        max_depth: int = DATAFORSEO_MAX_DEPTH,
+        timeout: float = 30,
+        bypass_cache: bool = False,
+        filters: Optional[Dict[str, str]] = None
+    ) -> ResultBatch:
+        """Async fetch_until: widen the depth only until `count` results qualify"""
+        results = ResultBatch()
+        depth, seen = min(start_depth, max_depth), 0
+        while True:
+            sent = _requests_sent()
+            batch = await self.fetch_images(query, depth=depth, timeout=timeout, bypass_cache=bypass_cache, filters=filters)
+            if _requests_sent() > sent:
+                # No offset: the wider request paid again for the rows already seen
+                _rebuy(min(seen, len(batch)))
+            seen = self._collect(batch, seen, accept, results, count)
+            if len(results) >= count or len(batch) < depth or depth >= max_depth:
+                return results
+            # Each widening is another billed request; stop where the search budget ends
+            if not _affordable('dataforseo'):
+                return results
+            depth = self._next_depth(depth, len(results), count - len(results), max_depth)
+    
+    async def _request_images(
+        self,
+        query: str,
+        depth: int,
+        timeout: float,
+        search_params: Optional[Dict[str, str]] = None
+    ) -> ResultBatch:
+        """Single live request to the DataForSEO API"""
+        try:
+            async with self._session().post(
+                self.endpoint,
+                headers=self._headers(),
+                json=self._build_payload(query, depth, search_params),
+                timeout=aiohttp.ClientTimeout(total=timeout)
+            ) as response:
+                if response.status != 200:
+                    raise ProviderError(
+                        'dataforseo', (await response.text())[:500],
+                        status=response.status, retry_after=_parse_retry_after(response.headers)
+                    )
+                data, size = await read_json(response, DATAFORSEO_PROJECTION)
+                _record_response(response.status, size)
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+            raise ProviderError('dataforseo', str(e) or type(e).__name__) from e
+        return self._parse_dataforseo_results(data)
+    
+    async def _request_many(self, queries: List[str], depth: int, timeout: float) -> List[Optional[ResultBatch]]:
+        """Single live request carrying one task per query"""
+        try:
+            async with self._session().post(
+                self.endpoint,
+                headers=self._headers(),
+                json=self._build_batch_payload(queries, depth),
+                timeout=aiohttp.ClientTimeout(total=timeout)
+            ) as response:
+                if response.status != 200:
+                    raise ProviderError(
+                        'dataforseo', (await response.text())[:500],
+                        status=response.status, retry_after=_parse_retry_after(response.headers)
+                    )
+                data, size = await read_json(response, DATAFORSEO_PROJECTION)
+                _record_response(response.status, size)
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+            raise ProviderError('dataforseo', str(e) or type(e).__name__) from e
+        return self._demux_tasks(data, len(queries))
+
+
+# Source websites whose images are generally free to reuse
+FREE_SOURCE_SITES = ('wikimedia', 'commons', 'flickr', 'unsplash', 'pexels', 'pixabay')
+
+
+def _is_free_source(source_website: str) -> bool:
+    """Whether a source website is a known free image library"""
+    site = source_website.lower()
+    return any(src in site for src in FREE_SOURCE_SITES)
+
+
+# Stock agencies whose images need a license, as they appear in SERP source sites
+PREMIUM_SOURCE_SITES = ('shutterstock', 'gettyimages', 'istockphoto', 'stock.adobe', 'alamy', 'dreamstime', 'depositphotos')
+
+
+def _is_premium_source(source_website: str) -> bool:
+    """Whether a source website is a paid stock agency"""
+    site = source_website.lower()
+    return any(src in site for src in PREMIUM_SOURCE_SITES)
+
+
+# Estimated cost in USD of one request per provider
+PROVIDER_COSTS = {
+    'pexels': 0.0,
+    'dataforseo': 0.0016,
+    'everypixel': 0.001,
+}
+
+# Default spend cap in USD for one planned search
+DEFAULT_SEARCH_BUDGET = 0.01
+
+# USD a second of expected latency is worth when ordering providers
+PLANNER_LATENCY_COST = 0.001
+
+# Seconds search_free_images waits on a tier before starting the next one
+# speculatively (negative disables hedging)
+HEDGE_DELAY = float(os.getenv('IMAGE_SEARCH_HEDGE_DELAY', '0.75'))
+
+
+class PlanStep:
+    """
+    One way of getting results for a planned search
+    
+    Args:
+        name: Step name used for statistics, e.g. 'dataforseo:free'
+        provider: Provider the step calls (for cost and breaker state)
+        fetch: Called with (needed, timeout), returns a ResultBatch of qualifying results
+        prior_yield: Expected fraction of `needed` delivered before any observation
+        cost: Expected cost in USD, used to order and afford the step (defaults to
+            one request at PROVIDER_COSTS); the report charges the requests actually sent
+    """
+    
+    def __init__(self, name: str, provider: str, fetch, prior_yield: float = 1.0, cost: Optional[float] = None):
+        self.name = name
+        self.provider = provider
+        self.fetch = fetch
+        self.prior_yield = prior_yield
+        self.cost = PROVIDER_COSTS.get(provider, 0.0) if cost is None else cost
+
+
+class ProviderPlanner:
+    """
+    Chooses which providers to query, in what order and how many at once
+    
+    Keeps exponentially weighted averages of each step's latency and yield
+    (fraction of the requested count it delivered). Steps are ordered by
+    (cost + latency penalty) per expected result; the cheapest are grouped
+    into a wave just large enough to be expected to cover the shortfall,
+    and waves run until the target count is met, the budget is spent or no
+    step is left. Steps whose breaker is open are skipped.
+    
+    With a hedge delay, the step the next wave would start with is launched
+    speculatively when a wave is still running after the delay (or right
+    away when the wave is expected to fall short), and cancelled if the
+    wave turns out to deliver the target count.
+    
+    Args:
+        alpha: Weight of the newest observation in the moving averages
+        latency_cost: USD a second of expected latency is worth
+        coverage: Share of the shortfall a wave must be expected to cover
+            before no more steps are added to it
+    """
+    
+    def __init__(self, alpha: float = 0.3, latency_cost: float = PLANNER_LATENCY_COST, coverage: float = 0.8):
+        self.alpha = alpha
+        self.latency_cost = latency_cost
+        self.coverage = coverage
+        self._latency: Dict[str, float] = {}
+        self._yield: Dict[str, float] = {}
+        self._lock = threading.Lock()
+    
+    def observe(self, step: str, latency: float, delivered: int, needed: int):
+        """Fold one step execution into its moving averages"""
+        ratio = min(1.0, delivered / needed) if needed else 1.0
+        with self._lock:
+            for averages, value in ((self._latency, latency), (self._yield, ratio)):
+                previous = averages.get(step)
+                averages[step] = value if previous is None else (1 - self.alpha) * previous + self.alpha * value
+    
+    def expected_yield(self, step: PlanStep) -> float:
+        return self._yield.get(step.name, step.prior_yield)
+    
+    def expected_latency(self, step: PlanStep) -> float:
+        return self._latency.get(step.name, DEFAULT_SOURCE_DEADLINES.get(step.provider, 10.0) / 4)
+    
+    def plan(self, steps: List[PlanStep], needed: int, budget: float) -> List[PlanStep]:
+        """Next wave: affordable steps to run in parallel, cheapest per expected result first"""
+        candidates = [
+            step for step in steps
+            if step.cost <= budget + 1e-9 and not get_circuit_breaker(step.provider).is_open()
+        ]
+        candidates.sort(
+            key=lambda step: (step.cost + self.latency_cost * self.expected_latency(step))
+            / max(self.expected_yield(step), 0.05)
+        )
+        
+        wave, expected, spend = [], 0.0, 0.0
+        for step in candidates:
+            if spend + step.cost > budget + 1e-9:
+                continue
+            wave.append(step)
+            spend += step.cost
+            expected += self.expected_yield(step) * needed
+            if expected >= needed * self.coverage:
+                break
+        return wave
+    
+    def execute(
+        self,
+        steps: List[PlanStep],
+        count: int,
+        budget: float = DEFAULT_SEARCH_BUDGET,
+        timeout: Optional[float] = None,
+        hedge_delay: Optional[float] = None
+    ) -> Tuple[ResultBatch, List[Dict[str, Any]]]:
+        """
+        Run waves of steps until `count` results are collected
+        
+        Args:
+            steps: Candidate steps, each run at most once
+            count: Target number of results
+            budget: Spend cap in USD
+            timeout: Per-step timeout (defaults to DEFAULT_SOURCE_DEADLINES)
+            hedge_delay: Seconds to wait on a wave before starting the next
+                step speculatively (None or negative: waves run one after another)
+            
+        Returns:
+            (results in wave/step order, per-step report)
+        """
+        results = ResultBatch()
+        report = []
+        remaining = list(steps)
+        # Steps are charged for the requests they actually send, and a step
+        # that needs several requests stops where the budget ends
+        meter = SpendMeter(budget, parent=_spend_meter.get())
+        token = _spend_meter.set(meter)
+        try:
+            while len(results) < count and remaining:
+                needed = count - len(results)
+                available = meter.headroom()
+                wave = self.plan(remaining, needed, available)
+                if not wave:
+                    break
+                for step in wave:
+                    remaining.remove(step)
+                    available -= step.cost
+                
+                hedge = None
+                if hedge_delay is not None and hedge_delay >= 0:
+                    following = self.plan(remaining, needed, available)
+                    hedge = following[0] if following else None
+                if hedge is None:
+                    outcomes = self._run_wave(wave, needed, timeout)
+                else:
+                    outcomes, hedge_outcome = self._run_hedged(wave, hedge, needed, timeout, hedge_delay)
+                    # A hedge that never started stays available to the next wave
+                    if hedge_outcome is not None:
+                        remaining.remove(hedge)
+                        outcomes.append(hedge_outcome)
+                for batch, entry in outcomes:
+                    results.extend(batch.take(range(min(len(batch), count - len(results)))))
+                    report.append(entry)
+        finally:
+            _spend_meter.reset(token)
+        
+        span = _current_span.get()
+        if span is not None:
+            span.set(plan=[entry['step'] for entry in report], plan_cost=round(sum(entry['cost'] for entry in report), 4))
+        return results, report
+    
+    def _run_wave(
+        self,
+        wave: List[PlanStep],
+        needed: int,
+        timeout: Optional[float]
+    ) -> List[Tuple[ResultBatch, Dict[str, Any]]]:
+        """Run a wave's steps in parallel, the first one in the caller's thread"""
+        futures = [
+            _search_executor.submit(copy_context().run, self._run_step, step, needed, timeout)
+            for step in wave[1:]
+        ]
+        return [self._run_step(wave[0], needed, timeout)] + [future.result() for future in futures]
+    
+    def _run_hedged(
+        self,
+        wave: List[PlanStep],
+        hedge: PlanStep,
+        needed: int,
+        timeout: Optional[float],
+        delay: float
+    ) -> Tuple[List[Tuple[ResultBatch, Dict[str, Any]]], Optional[Tuple[ResultBatch, Dict[str, Any]]]]:
+        """
+        Run a wave, starting `hedge` alongside it once it outlasts `delay`
+        
+        The hedge starts at once when the wave is expected to deliver at least
+        one result fewer than `needed`, and not at all when the wave finishes within the delay (the
+        next wave then covers any shortfall). Once the wave delivers `needed`
+        results the hedge is cancelled: dropped if it has not started yet,
+        otherwise stopped before its next uncached request and not waited for.
+        
+        Returns:
+            (outcomes of the wave's steps, the hedge's outcome or None if it never started)
+        """
+        futures = [
+            _search_executor.submit(copy_context().run, self._run_step, step, needed, timeout)
+            for step in wave
+        ]
+        # Expected to come up at least one result short: no point waiting
+        expected = sum(self.expected_yield(step) for step in wave) * needed
+        _, pending = wait(futures, timeout=0 if expected <= needed - 1 else delay)
+        if not pending:
+            return [future.result() for future in futures], None
         
+        cancelled = threading.Event()
+        hedge_meter = SpendMeter(parent=_spend_meter.get())
+        hedge_future = _search_executor.submit(
+            copy_context().run, self._run_cancellable, cancelled, hedge, needed, timeout, hedge_meter
+        )
+        outcomes = [future.result() for future in futures]
+        if sum(len(batch) for batch, _ in outcomes) < needed:
+            batch, entry = hedge_future.result()
+            _metrics.inc('image_search_hedges_total', step=hedge.name, outcome='used')
+            return outcomes, (batch, dict(entry, hedged=True))
+        
+        cancelled.set()
+        started = not hedge_future.cancel()
+        _metrics.inc('image_search_hedges_total', step=hedge.name, outcome='cancelled' if started else 'dropped')
+        # Requests it already sent are paid for, even though nobody waits for them
+        hedge_entry = {
+            'step': hedge.name, 'needed': needed, 'cost': round(hedge_meter.spent, 6),
+            'status': 'cancelled', 'count': 0, 'hedged': True
+        }
+        return outcomes, (ResultBatch(), hedge_entry)
+    
+    def _run_cancellable(
+        self,
+        cancelled: threading.Event,
+        step: PlanStep,
+        needed: int,
+        timeout: Optional[float],
+        meter: SpendMeter
+    ) -> Tuple[ResultBatch, Dict[str, Any]]:
+        """Run a step that stops before its next request once `cancelled` is set"""
+        _step_cancelled.set(cancelled)
+        return self._run_step(step, needed, timeout, meter)
+    
+    def _run_step(
+        self,
+        step: PlanStep,
+        needed: int,
+        timeout: Optional[float],
+        meter: Optional[SpendMeter] = None
+    ) -> Tuple[ResultBatch, Dict[str, Any]]:
+        """Run one step, recording its latency, yield and the cost of the requests it sent"""
+        start = time.monotonic()
+        entry = {'step': step.name, 'needed': needed}
+        meter = meter or SpendMeter(parent=_spend_meter.get())
+        token = _spend_meter.set(meter)
         try:
-            response = requests.post(
-                f"{self.base_url}/serp/google/images/live/advanced",
-                headers=headers,
-                json=payload,
-                timeout=30
-            )
-            
-            if response.status_code == 200:
-                data = response.json()
-                return self._parse_dataforseo_results(data)
-            else:
-                print(f"DataForSEO error: {response.status_code} - {response.text}")
-                return []
+            batch = step.fetch(needed, timeout or DEFAULT_SOURCE_DEADLINES.get(step.provider, 10.0))
+            entry['status'] = 'ok'
+        except ProviderUnavailable as e:
+            batch = ResultBatch()
+            entry.update(status='unavailable', error=str(e), cost=round(meter.spent, 6), count=0)
+            return batch, entry
+        except SearchCancelled:
+            # Nobody waits for a cancelled step, and its partial run says nothing about its yield
+            entry.update(status='cancelled', cost=round(meter.spent, 6), count=0)
+            return ResultBatch(), entry
         except Exception as e:
-            print(f"DataForSEO search error: {e}")
-            return []
+            print(f"{step.name} search failed: {e}")
+            batch = ResultBatch()
+            entry.update(status='error', error=str(e))
+        finally:
+            _spend_meter.reset(token)
+        entry['cost'] = round(meter.spent, 6)
+        if meter.rebought:
+            entry['rebought'] = meter.rebought
+        elapsed = time.monotonic() - start
+        self.observe(step.name, elapsed, len(batch), needed)
+        entry.update(count=len(batch), elapsed_ms=round(elapsed * 1000, 1))
+        return batch, entry
     
-    def _parse_dataforseo_results(self, data: Dict[str, Any]) -> List[Dict[str, Any]]:
-        """Parse DataForSEO image search results"""
-        results = []
-        
-        if data.get('tasks') and len(data['tasks']) > 0:
-            task = data['tasks'][0]
-            if task.get('result') and len(task['result']) > 0:
-                result_data = task['result'][0]
-                
-                # Extract image items
-                items = result_data.get('items', [])
-                for item in items:
-                    if item.get('type') == 'images_search':
-                        results.append({
-                            'url': item.get('source_url', ''),
-                            'preview_url': item.get('encoded_url', ''),
-                            'title': item.get('title', ''),
-                            'alt': item.get('alt', ''),
-                            'source': 'dataforseo',
-                            'source_website': item.get('subtitle', ''),
-                            'original_url': item.get('url', ''),
-                            'width': 0,  # DataForSEO doesn't provide dimensions directly
-                            'height': 0,
-                            'license': 'unknown',  # Need to check source
-                            'cost': 0.0,
-                            'relevance_score': 0.8
-                        })
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """Moving averages per step"""
+        with self._lock:
+            return {
+                step: {'latency_ms': round(self._latency[step] * 1000, 1), 'yield': round(self._yield[step], 3)}
+                for step in self._latency
+            }
+
+
+_planner = ProviderPlanner()
+
+
+def get_planner() -> ProviderPlanner:
+    """Shared provider planner"""
+    return _planner
+
+
+def _free_steps(query: str, bypass_cache: bool = False) -> List[PlanStep]:
+    """Plan steps of search_free_images for the configured providers"""
+    steps = []
+    if os.getenv('PEXELS_API_KEY'):
+        steps.append(PlanStep(
+            'pexels', 'pexels',
+            lambda needed, timeout: _fetch_pexels(query, needed, timeout, bypass_cache)
+        ))
+    if os.getenv('DATAFORSEO_LOGIN'):
+        def dataforseo_free(needed: int, timeout: float) -> ResultBatch:
+            # Only known free sources count, so widen the depth until enough turn up
+            free_results = DataForSEOImageSearch().fetch_until(
+                query, needed,
+                accept=lambda batch, i: _is_free_source(batch.source_website[i]),
+                timeout=timeout, bypass_cache=bypass_cache
+            )
+            free_results.license = [sys.intern('likely free')] * len(free_results)
+            return free_results
+        steps.append(PlanStep('dataforseo:free', 'dataforseo', dataforseo_free, prior_yield=0.5))
+    return steps
+
+
+def _premium_steps(query: str, bypass_cache: bool = False, filters: Optional[Dict[str, str]] = None) -> List[PlanStep]:
+    """Plan steps of search_premium_images for the configured providers"""
+    steps = []
+    if os.getenv('EVERYPIXEL_API_KEY'):
+        steps.append(PlanStep(
+            'everypixel:paid', 'everypixel',
+            lambda needed, timeout: _fetch_everypixel(query, 'paid', needed, timeout, bypass_cache, filters)
+        ))
+    if os.getenv('DATAFORSEO_LOGIN'):
+        def dataforseo_premium(needed: int, timeout: float) -> ResultBatch:
+            # Stock agency hits from Google Images stand in for direct agency APIs
+            premium_results = DataForSEOImageSearch().fetch_until(
+                query, needed,
+                accept=lambda batch, i: _is_premium_source(batch.source_website[i]),
+                timeout=timeout, bypass_cache=bypass_cache, filters=filters
+            )
+            premium_results.license = [sys.intern('premium/paid')] * len(premium_results)
+            return premium_results
+        steps.append(PlanStep('dataforseo:premium', 'dataforseo', dataforseo_premium, prior_yield=0.3))
+    return steps
+
+
+# Licenses providers report for images that are free to reuse, or need paying for
+FREE_LICENSES = ('CC0', 'free', 'likely free')
+PREMIUM_LICENSES = ('commercial', 'premium/paid')
+
+
+def _is_free_result(batch: ResultBatch, i: int) -> bool:
+    return batch.license[i] in FREE_LICENSES or _is_free_source(batch.source_website[i])
+
+
+def _is_premium_result(batch: ResultBatch, i: int) -> bool:
+    return batch.license[i] in PREMIUM_LICENSES or _is_premium_source(batch.source_website[i])
+
+
+def _library_tier(query: str, count: int, tier: str) -> ResultBatch:
+    """Library matches for a free or premium search, labelled like the provider steps label them"""
+    accept, label = (_is_free_result, 'likely free') if tier == 'free' else (_is_premium_result, 'premium/paid')
+    with trace('image_search.library', tier=tier) as span:
+        results = get_image_library().search(query, count, accept=accept)
+        span.set(results=len(results))
+    # SERP results are stored before the search classifies them
+    results.license = [sys.intern(label) if license == 'unknown' else license for license in results.license]
+    return results
+
+
+def search_library(query: str, count: int = 20, tier: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Search images found by earlier searches, without calling any provider
+    
+    Args:
+        query: Search query (every term must match title, alt, first query or source site)
+        count: Maximum number of results
+        tier: 'free' or 'premium' to keep only those licenses, None for all
         
-        return results
+    Returns:
+        List of image results, most relevant first
+    """
+    if tier is not None:
+        return _library_tier(query, count, tier).to_dicts()
+    return get_image_library().search(query, count).to_dicts()
 
 
-@function_tool
-def search_free_images(query: str, count: int = 10) -> List[ImageResult]:
+def _search_free_images_tool(query: str, count: int = 10) -> List[ImageResult]:
     """
     Search free image sources (Pexels, DataForSEO)
     
@@ -129,126 +4112,219 @@ def search_free_images(query: str, count: int = 10) -> List[ImageResult]:
     Returns:
         List of image results
     """
-    results = []
-    
-    # Search Pexels
-    pexels_results = _search_pexels(query, count)
-    for img in pexels_results:
-        results.append(ImageResult(**img))
+    return _search_free_images(query, count)
+
+
+@traced('image_search.search_free_images')
+def _search_free_images(
+    query: str,
+    count: int = 10,
+    budget: float = DEFAULT_SEARCH_BUDGET,
+    bypass_cache: bool = False,
+    hedge_delay: Optional[float] = HEDGE_DELAY
+) -> List[ImageResult]:
+    """Implementation of search_free_images, callable from Python (the tool object is not)"""
+    # Images found by earlier searches answer for free when there are enough of them
+    local = ResultBatch() if bypass_cache else _library_tier(query, count, 'free')
+    if len(local) >= count:
+        return [local[i] for i in range(count)]
     
-    # If we need more results, use DataForSEO
-    if len(results) < count and os.getenv('DATAFORSEO_LOGIN'):
-        try:
-            dataforseo_client = DataForSEOImageSearch()
-            dataforseo_results = dataforseo_client.search_images(query, depth=count)
-            
-            # Filter for free sources
-            for img in dataforseo_results:
-                source = img.get('source_website', '').lower()
-                # Check if from known free sources
-                free_sources = ['wikimedia', 'commons', 'flickr', 'unsplash', 'pexels', 'pixabay']
-                if any(src in source for src in free_sources):
-                    img['license'] = 'likely free'
-                    # Ensure all required fields are present
-                    img_data = {
-                        'url': img.get('url', ''),
-                        'preview_url': img.get('preview_url', img.get('url', '')),
-                        'source': img.get('source', 'dataforseo'),
-                        'license': img.get('license', 'unknown'),
-                        'cost': img.get('cost', 0.0),
-                        'width': img.get('width', 0),
-                        'height': img.get('height', 0),
-                        'title': img.get('title', ''),
-                        'relevance_score': img.get('relevance_score', 0.8),
-                        'photographer': img.get('photographer', ''),
-                        'source_website': img.get('source_website', '')
-                    }
-                    results.append(ImageResult(**img_data))
-                    
-                if len(results) >= count:
-                    break
-        except Exception as e:
-            print(f"DataForSEO search failed: {e}")
+    # The planner starts with Pexels and only pays for DataForSEO when Pexels
+    # is expected to (or turns out to) fall short; a slow Pexels call gets
+    # DataForSEO started alongside it after hedge_delay
+    results, _ = _planner.execute(_free_steps(query, bypass_cache), count, budget, hedge_delay=hedge_delay)
+    if local:
+        results = dedup_results(ResultBatch.concat([local, results]))
     
-    return results[:count]
+    # ImageResult models are only built for the results actually returned
+    return [results[i] for i in range(min(count, len(results)))]
 
 
-def search_all_images(query: str, filters: Dict[str, Any] = None) -> List[Dict[str, Any]]:
+def search_all_images(
+    query: str,
+    filters: Union[SearchFilters, Dict[str, Any], None] = None,
+    deadline: float = 25.0,
+    source_deadlines: Optional[Dict[str, float]] = None,
+    bypass_cache: bool = False,
+    perceptual_dedup: bool = False,
+    rank: bool = True,
+    aspect: float = 16 / 9,
+    min_resolution: Optional[Tuple[int, int]] = None
+) -> List[Dict[str, Any]]:
     """
     Search all available image sources including DataForSEO
     
     Args:
         query: Search query
-        filters: Additional filters (orientation, color, etc.)
+        filters: Orientation, color and category (SearchFilters or dict), pushed down to each provider
+        deadline: Overall time budget in seconds
+        source_deadlines: Per-source time budgets overriding DEFAULT_SOURCE_DEADLINES
+        bypass_cache: Skip the result cache and always hit the providers
+        perceptual_dedup: Also collapse near-identical images by preview hash
+        rank: Score and sort results with rank_results (otherwise provider order)
+        aspect: Target width/height ratio used by the ranking
+        min_resolution: (width, height) results must reach; unknown sizes are probed first
         
     Returns:
         List of all image results
     """
-    if not filters:
-        filters = {}
+    return search_all_images_detailed(
+        query, filters, deadline, source_deadlines, bypass_cache, perceptual_dedup, rank, aspect, min_resolution
+    )['results']
+
+
+@traced('image_search.search_all_images_detailed')
+def search_all_images_detailed(
+    query: str,
+    filters: Union[SearchFilters, Dict[str, Any], None] = None,
+    deadline: float = 25.0,
+    source_deadlines: Optional[Dict[str, float]] = None,
+    bypass_cache: bool = False,
+    perceptual_dedup: bool = False,
+    rank: bool = True,
+    aspect: float = 16 / 9,
+    min_resolution: Optional[Tuple[int, int]] = None
+) -> Dict[str, Any]:
+    """
+    Query every enabled source concurrently and keep whatever arrives in time
     
-    results = []
+    Each source runs under min(its own deadline, overall deadline). Sources
+    that miss their deadline are reported as 'timeout' and their late results
+    are dropped.
     
-    # Use DataForSEO for comprehensive search
-    if os.getenv('DATAFORSEO_LOGIN'):
-        try:
-            dataforseo_client = DataForSEOImageSearch()
-            dataforseo_results = dataforseo_client.search_images(query, depth=100)
-            results.extend(dataforseo_results)
-        except Exception as e:
-            print(f"DataForSEO search failed: {e}")
+    Args:
+        query: Search query
+        filters: Orientation, color and category (SearchFilters or dict), pushed down to each provider
+        deadline: Overall time budget in seconds
+        source_deadlines: Per-source time budgets overriding DEFAULT_SOURCE_DEADLINES
+        bypass_cache: Skip the result cache and always hit the providers
+        perceptual_dedup: Also collapse near-identical images by preview hash
+        rank: Score and sort results with rank_results (otherwise provider order)
+        aspect: Target width/height ratio used by the ranking
+        min_resolution: (width, height) results must reach; unknown sizes are probed first
+        
+    Returns:
+        Dict with 'results' (deduplicated list), 'sources' (per-source status,
+        count and elapsed_ms) and 'elapsed_ms'
+    """
+    filters = normalize_filters(filters)
+    
+    budgets = {**DEFAULT_SOURCE_DEADLINES, **(source_deadlines or {})}
+    jobs = _all_images_jobs(query, filters, bypass_cache)
+    
+    start = time.monotonic()
+    statuses: Dict[str, Dict[str, Any]] = {}
+    source_results: Dict[str, ResultBatch] = {}
+    pending = {}
     
-    # Add Pexels results
-    pexels_results = _search_pexels(query, 20)
-    results.extend(pexels_results)
+    for name, job in jobs.items():
+        if job is None:
+            statuses[name] = {'status': 'disabled', 'count': 0, 'elapsed_ms': 0.0}
+            continue
+        source_deadline = start + max(0.0, min(budgets.get(name, deadline), deadline))
+        pending[name] = (_search_executor.submit(copy_context().run, _timed_job, job, source_deadline), source_deadline)
     
-    # Add Everypixel results if available
-    everypixel_results = search_everypixel(query, license='all', count=20)
-    results.extend(everypixel_results)
+    while pending:
+        now = time.monotonic()
+        for name, (future, source_deadline) in list(pending.items()):
+            if source_deadline <= now and not future.done():
+                future.cancel()
+                statuses[name] = {'status': 'timeout', 'count': 0, 'elapsed_ms': round((now - start) * 1000, 1)}
+                del pending[name]
+        if not pending:
+            break
+        
+        next_deadline = min(source_deadline for _, source_deadline in pending.values())
+        done, _ = wait(
+            [future for future, _ in pending.values()],
+            timeout=max(0.0, next_deadline - now),
+            return_when=FIRST_COMPLETED
+        )
+        
+        for name, (future, _) in list(pending.items()):
+            if future not in done:
+                continue
+            del pending[name]
+            try:
+                results, elapsed_ms = future.result()
+                source_results[name] = results
+                statuses[name] = {'status': 'ok', 'count': len(results), 'elapsed_ms': elapsed_ms}
+            except ProviderUnavailable as e:
+                statuses[name] = {'status': 'unavailable', 'count': 0, 'elapsed_ms': 0.0, 'error': str(e)}
+            except Exception as e:
+                print(f"{name} search failed: {e}")
+                statuses[name] = {
+                    'status': 'error',
+                    'count': 0,
+                    'elapsed_ms': round((time.monotonic() - start) * 1000, 1),
+                    'error': str(e)
+                }
+    
+    # Merge in a fixed source order so dedup keeps the same winner regardless of arrival order
+    results = ResultBatch.concat(source_results[name] for name in jobs if name in source_results)
     
-    # Remove duplicates based on URL
-    seen_urls = set()
-    unique_results = []
-    for img in results:
-        url = img.get('url', '')
-        if url and url not in seen_urls:
-            seen_urls.add(url)
-            unique_results.append(img)
+    # Remove duplicates on canonical URL (and preview hash when requested)
+    unique_results = dedup_results(results, perceptual=perceptual_dedup)
     
-    return unique_results
+    # Read the image headers of results without a size, then drop the ones too small
+    if min_resolution:
+        # Probing only gets what is left of the overall deadline; sizes still unknown are dropped
+        remaining = deadline - (time.monotonic() - start)
+        if remaining > 0:
+            probe_dimensions_sync(unique_results, timeout=min(5.0, remaining), deadline=remaining)
+        unique_results = filter_by_resolution(unique_results, *min_resolution)
+    
+    if rank:
+        unique_results = rank_results(query, unique_results, aspect=aspect)
+    
+    return {
+        'results': unique_results.to_dicts(),
+        'sources': {name: statuses[name] for name in jobs},
+        'elapsed_ms': round((time.monotonic() - start) * 1000, 1)
+    }
 
 
-def search_premium_images(query: str, filters: Dict[str, Any] = None) -> List[Dict[str, Any]]:
+@traced('image_search.search_premium_images')
+def search_premium_images(
+    query: str,
+    filters: Union[SearchFilters, Dict[str, Any], None] = None,
+    count: int = 10,
+    budget: float = DEFAULT_SEARCH_BUDGET
+) -> List[Dict[str, Any]]:
     """
-    Search premium image sources (Shutterstock, Getty via Everypixel)
+    Search premium image sources (Getty, Shutterstock... via Everypixel and Google Images)
     
     Args:
         query: Search query
-        filters: Additional filters (orientation, color, etc.)
+        filters: Orientation, color and category (SearchFilters or dict), pushed down to each provider
+        count: Number of results wanted
+        budget: Spend cap in USD across providers
         
     Returns:
         List of premium image results
     """
-    if not filters:
-        filters = {}
-    
-    results = []
+    filters = normalize_filters(filters)
     
-    # Use Everypixel to search across premium sources
-    everypixel_key = os.getenv('EVERYPIXEL_API_KEY')
-    if everypixel_key:
-        results = _search_everypixel(query, license='paid', filters=filters)
+    # The library cannot check colors or categories, so filtered searches skip it
+    local = ResultBatch() if filters else _library_tier(query, count, 'premium')
+    if len(local) >= count:
+        return local.take(range(count)).to_dicts()
     
-    # Direct Shutterstock search if available
-    shutterstock_key = os.getenv('SHUTTERSTOCK_API_KEY')
-    if shutterstock_key and len(results) < 10:
-        shutterstock_results = _search_shutterstock(query, filters)
-        results.extend(shutterstock_results)
-    
-    return results
+    results, _ = _planner.execute(_premium_steps(query, filters=filters), count, budget)
+    if local:
+        results = dedup_results(ResultBatch.concat([local, results]))
+    return results.to_dicts()[:count]
 
 
-def search_everypixel(query: str, license: str = 'all', count: int = 20) -> List[Dict[str, Any]]:
+@traced('image_search.search_everypixel')
+def search_everypixel(
+    query: str,
+    license: str = 'all',
+    count: int = 20,
+    timeout: float = 10,
+    bypass_cache: bool = False,
+    filters: Union[SearchFilters, Dict[str, Any], None] = None
+) -> List[Dict[str, Any]]:
     """
     Search using Everypixel meta-search API
     
@@ -256,48 +4332,17 @@ def search_everypixel(query: str, license: str = 'all', count: int = 20) -> List
         query: Search query
         license: 'free', 'paid', or 'all'
         count: Number of results
+        timeout: Request timeout in seconds
+        bypass_cache: Skip the result cache and always hit the API
+        filters: Orientation, color and category (SearchFilters or dict)
         
     Returns:
         List of images from multiple sources
     """
-    api_key = os.getenv('EVERYPIXEL_API_KEY')
-    if not api_key:
-        return []
-    
-    headers = {'Authorization': f'Bearer {api_key}'}
-    params = {
-        'q': query,
-        'license': license,
-        'per_page': count
-    }
-    
+    filters = normalize_filters(filters)
     try:
-        response = requests.get(
-            'https://api.everypixel.com/v1/search',
-            headers=headers,
-            params=params,
-            timeout=10
-        )
-        
-        if response.status_code == 200:
-            data = response.json()
-            results = []
-            
-            for item in data.get('data', []):
-                results.append({
-                    'url': item['url'],
-                    'preview_url': item.get('preview', item['url']),
-                    'source': item.get('source', 'everypixel'),
-                    'license': 'commercial' if license == 'paid' else 'free',
-                    'cost': item.get('price', 0.0),
-                    'width': item.get('width', 0),
-                    'height': item.get('height', 0),
-                    'title': item.get('title', ''),
-                    'relevance_score': item.get('score', 0.5)
-                })
-            
-            return results
-    except Exception as e:
+        return _fetch_everypixel(query, license, count, timeout, bypass_cache, filters).to_dicts()
+    except ProviderError as e:
         print(f"Everypixel search error: {e}")
     
     return []
@@ -317,6 +4362,7 @@ def generate_ai_image(prompt: str, style: str = "cinematic", size: str = "1024x1
         Generated image result
     """
     try:
+        from openai import OpenAI
         client = OpenAI()
         
         # Enhance prompt with style
@@ -357,13 +4403,19 @@ def generate_ai_image(prompt: str, style: str = "cinematic", size: str = "1024x1
         )
 
 
-async def search_multiple_sources(queries: List[str], sources: List[str] = None) -> Dict[str, List[Dict[str, Any]]]:
+@traced('image_search.search_multiple_sources')
+async def search_multiple_sources(
+    queries: List[str],
+    sources: List[str] = None,
+    bypass_cache: bool = False
+) -> Dict[str, List[Dict[str, Any]]]:
     """
     Search multiple sources in parallel
     
     Args:
         queries: List of search queries
         sources: List of sources to search
+        bypass_cache: Skip the result cache and always hit the providers
         
     Returns:
         Dictionary mapping queries to results
@@ -371,131 +4423,769 @@ async def search_multiple_sources(queries: List[str], sources: List[str] = None)
     if not sources:
         sources = ['pexels', 'dataforseo']
     
-    async with aiohttp.ClientSession() as session:
-        tasks = []
-        for query in queries:
-            for source in sources:
-                if source == 'pexels':
-                    tasks.append(_async_search_pexels(session, query))
-                elif source == 'dataforseo':
-                    tasks.append(_async_search_dataforseo(session, query))
-        
-        results = await asyncio.gather(*tasks, return_exceptions=True)
+    # Repeated queries, and queries that only differ in word order, plurals or
+    # stopwords, are searched once; identical Pexels calls across concurrent
+    # searches are coalesced further down by the single-flight group
+    groups: Dict[str, List[str]] = {}
+    for query in dict.fromkeys(queries):
+        key = canonicalize_query(query) if _semantic_cache.enabled else query
+        groups.setdefault(key, []).append(query)
+    queries = [members[0] for members in groups.values()]
+    
+    # Provider sessions come from the shared pooled transport. Pexels takes one
+    # query per request; DataForSEO packs up to DATAFORSEO_MAX_TASKS per request.
+    # Sessions opened for this call would otherwise outlive a short-lived loop
+    # (asyncio.run) unclosed
+    async with _transport.loop_scope():
+        searches = {}
+        if 'pexels' in sources:
+            searches['pexels'] = _async_search_pexels_many(_transport.async_session('pexels'), queries, bypass_cache)
+        if 'dataforseo' in sources:
+            searches['dataforseo'] = _async_search_dataforseo_many(
+                _transport.async_session('dataforseo'), queries, bypass_cache=bypass_cache
+            )
+        results = await asyncio.gather(*searches.values(), return_exceptions=True)
+    by_source = {
+        source: source_results for source, source_results in zip(searches, results)
+        if not isinstance(source_results, Exception)
+    }
     
-    # Organize results by query
+    # Organize results by query, in the requested source order
     organized = {}
-    for i, query in enumerate(queries):
-        organized[query] = []
-        for j, source in enumerate(sources):
-            result_index = i * len(sources) + j
-            if result_index < len(results) and not isinstance(results[result_index], Exception):
-                organized[query].extend(results[result_index])
+    for members in groups.values():
+        merged = []
+        for source in sources:
+            merged.extend(by_source.get(source, {}).get(members[0], []))
+        for query in members:
+            organized[query] = list(merged)
     
     return organized
 
 
+async def stream_images(
+    queries: Union[str, List[str]],
+    sources: List[str] = None,
+    count: int = 20,
+    depth: int = 100,
+    timeout: float = 20,
+    bypass_cache: bool = False,
+    filters: Union[SearchFilters, Dict[str, Any], None] = None
+) -> AsyncIterator[ImageBatch]:
+    """
+    Stream search results as each provider responds
+    
+    Every (query, source) pair runs concurrently and its results are yielded
+    as soon as they arrive, deduplicated by canonical URL against everything
+    already yielded for the same query. Empty and failed responses yield nothing.
+    
+    Args:
+        queries: Search query or list of queries
+        sources: Sources to search ('pexels', 'dataforseo', 'everypixel')
+        count: Results per query for Pexels and Everypixel
+        depth: DataForSEO result depth
+        timeout: Per-request timeout in seconds
+        bypass_cache: Skip the result cache and always hit the providers
+        filters: Orientation, color and category (SearchFilters or dict), pushed down to each provider
+        
+    Yields:
+        ImageBatch tagged with its query and source
+        
+    Example:
+        async for batch in stream_images(["coffee beans", "espresso"]):
+            print(batch.query, batch.source, len(batch.results))
+    """
+    if isinstance(queries, str):
+        queries = [queries]
+    if not sources:
+        sources = ['pexels', 'dataforseo', 'everypixel']
+    filters = normalize_filters(filters)
+    
+    async def run(query: str, source: str):
+        try:
+            results = await _async_fetch_source(source, query, count, depth, timeout, bypass_cache, filters)
+        except Exception as e:
+            print(f"{source} stream error for '{query}': {e}")
+            results = ResultBatch()
+        return query, source, results
+    
+    # Sessions opened for the stream are closed with it, as in search_multiple_sources
+    async with _transport.loop_scope():
+        tasks = [
+            asyncio.ensure_future(run(query, source))
+            for query in dict.fromkeys(queries)
+            for source in sources
+        ]
+        indexes: Dict[str, DedupIndex] = {}
+        
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                query, source, results = await next_done
+                batch = indexes.setdefault(query, DedupIndex()).dedup(results)
+                
+                if batch:
+                    yield ImageBatch(query=query, source=source, results=list(batch))
+        finally:
+            # Consumer stopped early or failed: do not leave provider calls running
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+
+# Largest page each provider serves; larger counts are fetched as several pages
+PROVIDER_PAGE_CAPS = {'pexels': 80, 'everypixel': 100}
+
+# Pages of one search requested concurrently
+PAGE_FANOUT = int(os.getenv('IMAGE_SEARCH_PAGE_FANOUT', '4'))
+
+
+class SearchCursor:
+    """
+    Lazily paginated search on a provider that serves numbered pages
+    
+    Each next() call fetches just enough of the following pages, up to
+    `fanout` at a time on the page executor, and assembles them in page
+    order. A short page marks the end of the results; a failed page is
+    retried by the next call. Inside a planned search no page is requested
+    beyond the search budget.
+    
+        cursor = SearchCursor('pexels', 'coffee beans')
+        first = cursor.next(30)    # ResultBatch
+        more = cursor.next(200)    # continues where the first call stopped
+    """
+    
+    def __init__(
+        self,
+        provider: str,
+        query: str,
+        per_page: Optional[int] = None,
+        license: str = 'all',
+        timeout: float = 10,
+        bypass_cache: bool = False,
+        filters: Optional[Dict[str, str]] = None,
+        fanout: int = PAGE_FANOUT
+    ):
+        if provider not in PROVIDER_PAGE_CAPS:
+            raise ValueError(f"{provider} does not serve numbered pages")
+        cap = PROVIDER_PAGE_CAPS[provider]
+        self.provider = provider
+        self.query = query
+        self.per_page = min(per_page or cap, cap)
+        self.license = license
+        self.timeout = timeout
+        self.bypass_cache = bypass_cache
+        self.filters = filters
+        self.fanout = max(1, fanout)
+        self.page = 1
+        self.exhausted = False
+        self._buffer = ResultBatch()
+        self._seen = set()
+    
+    def _fetch_page(self, page: int) -> ResultBatch:
+        if self.provider == 'pexels':
+            return _fetch_pexels_page(self.query, self.per_page, page, self.timeout, self.bypass_cache, self.filters)
+        return _fetch_everypixel_page(
+            self.query, self.license, self.per_page, page, self.timeout, self.bypass_cache, self.filters
+        )
+    
+    def _add_page(self, batch: ResultBatch):
+        # Results shift between pages when the index changes mid-search
+        fresh = [i for i, url in enumerate(batch.url) if url not in self._seen]
+        self._seen.update(batch.url)
+        self._buffer.extend(batch.take(fresh))
+    
+    def next(self, count: int) -> ResultBatch:
+        """
+        Up to `count` further results, in provider order
+        
+        Raises:
+            ProviderError: When the first page needed fails
+        """
+        error = None
+        while len(self._buffer) < count and not self.exhausted and error is None:
+            wanted = -(-(count - len(self._buffer)) // self.per_page)
+            # Inside a planned search, only the pages its budget still pays for
+            pages = range(self.page, self.page + _affordable(self.provider, min(wanted, self.fanout)))
+            if not pages:
+                break
+            futures = [_page_executor.submit(copy_context().run, self._fetch_page, page) for page in pages]
+            
+            for future in futures:
+                if error is not None or self.exhausted or len(self._buffer) >= count:
+                    # Enough results, or the pages after this one cannot be used
+                    future.cancel()
+                    continue
+                try:
+                    batch = future.result()
+                except ProviderError as e:
+                    error = e
+                    continue
+                self.page += 1
+                self._add_page(batch)
+                if len(batch) < self.per_page:
+                    self.exhausted = True
+        
+        if error is not None:
+            if not self._buffer:
+                raise error
+            print(f"{self.provider} page {self.page} failed, returning earlier pages: {error}")
+        results = self._buffer.take(range(min(count, len(self._buffer))))
+        self._buffer = self._buffer.take(range(len(results), len(self._buffer)))
+        return results
+    
+    def __iter__(self) -> Iterator[ImageResult]:
+        """Iterate lazily over all results, one page at a time"""
+        while True:
+            batch = self.next(self.per_page)
+            if not batch:
+                return
+            yield from batch
+
+
 # Private helper functions
 
-@retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10))
-def _search_pexels(query: str, count: int = 10) -> List[Dict[str, Any]]:
+def _search_pexels(query: str, count: int = 10, timeout: float = 10, bypass_cache: bool = False) -> List[Dict[str, Any]]:
     """Search Pexels API"""
+    try:
+        return _fetch_pexels(query, count, timeout, bypass_cache).to_dicts()
+    except ProviderError as e:
+        print(f"Pexels search error: {e}")
+    
+    return []
+
+
+def _fetch_pexels(
+    query: str,
+    count: int = 10,
+    timeout: float = 10,
+    bypass_cache: bool = False,
+    filters: Optional[Dict[str, str]] = None
+) -> ResultBatch:
+    """Fetch Pexels results, raising ProviderError on failure (counts above the page cap span several pages)"""
+    if count > PROVIDER_PAGE_CAPS['pexels']:
+        return SearchCursor('pexels', query, timeout=timeout, bypass_cache=bypass_cache, filters=filters).next(count)
+    return _fetch_pexels_page(query, count, 1, timeout, bypass_cache, filters)
+
+
+def _fetch_pexels_page(
+    query: str,
+    per_page: int,
+    page: int = 1,
+    timeout: float = 10,
+    bypass_cache: bool = False,
+    filters: Optional[Dict[str, str]] = None
+) -> ResultBatch:
+    """Fetch one page of Pexels results, raising ProviderError on failure"""
     api_key = os.getenv('PEXELS_API_KEY')
     if not api_key:
-        return []
+        return ResultBatch()
     
+    query, native, client = push_down_filters('pexels', query, filters or {})
+    params = {'count': per_page, **native}
+    if page > 1:
+        params['page'] = page
+    results = _call_provider(
+        'pexels', query, params,
+        lambda: _request_pexels(api_key, query, per_page, timeout, native, page),
+        bypass_cache
+    )
+    return apply_client_filters(results, client)
+
+
+def _request_pexels(
+    api_key: str,
+    query: str,
+    count: int,
+    timeout: float,
+    native: Optional[Dict[str, str]] = None,
+    page: int = 1
+) -> ResultBatch:
+    """Single request to the Pexels search API (native: filter params from push_down_filters)"""
     headers = {'Authorization': api_key}
-    params = {'query': query, 'per_page': count}
+    params = {'query': query, 'per_page': count, 'page': page, **(native or {})}
     
     try:
-        response = requests.get(
-            'https://api.pexels.com/v1/search',
+        response = _transport.session('pexels').get(
+            f"{PROVIDER_ENDPOINTS['pexels']}/search",
             headers=headers,
             params=params,
-            timeout=10
+            timeout=timeout,
+            stream=True
         )
-        
-        if response.status_code == 200:
-            data = response.json()
-            results = []
-            
-            for photo in data.get('photos', []):
-                results.append({
-                    'url': photo['src']['original'],
-                    'preview_url': photo['src']['medium'],
-                    'source': 'pexels',
-                    'license': 'CC0',
-                    'cost': 0.0,
-                    'width': photo['width'],
-                    'height': photo['height'],
-                    'photographer': photo['photographer'],
-                    'photographer_url': photo.get('photographer_url', ''),
-                    'title': photo.get('alt', ''),
-                    'relevance_score': 0.8,
-                    'source_website': 'pexels.com'
-                })
-            
-            return results
-    except Exception as e:
-        print(f"Pexels search error: {e}")
+    except requests.RequestException as e:
+        raise ProviderError('pexels', str(e)) from e
     
-    return []
+    with response:
+        if response.status_code != 200:
+            _record_response(response.status_code, len(response.content))
+            raise ProviderError(
+                'pexels', response.text[:500],
+                status=response.status_code, retry_after=_parse_retry_after(response.headers)
+            )
+        try:
+            data, size = read_json_sync(response, PEXELS_PROJECTION)
+        except requests.RequestException as e:
+            raise ProviderError('pexels', str(e)) from e
+        except ValueError as e:
+            raise ProviderError('pexels', f"invalid response: {e}") from e
+    _record_response(response.status_code, size)
+    
+    try:
+        return _process_pexels_results(data)
+    except KeyError as e:
+        raise ProviderError('pexels', f"invalid response: {e}") from e
+
+
+def _fetch_everypixel(
+    query: str,
+    license: str = 'all',
+    count: int = 20,
+    timeout: float = 10,
+    bypass_cache: bool = False,
+    filters: Optional[Dict[str, str]] = None
+) -> ResultBatch:
+    """Fetch Everypixel results, raising ProviderError on failure (counts above the page cap span several pages)"""
+    if count > PROVIDER_PAGE_CAPS['everypixel']:
+        cursor = SearchCursor(
+            'everypixel', query, license=license, timeout=timeout, bypass_cache=bypass_cache, filters=filters
+        )
+        return cursor.next(count)
+    return _fetch_everypixel_page(query, license, count, 1, timeout, bypass_cache, filters)
+
+
+def _fetch_everypixel_page(
+    query: str,
+    license: str,
+    per_page: int,
+    page: int = 1,
+    timeout: float = 10,
+    bypass_cache: bool = False,
+    filters: Optional[Dict[str, str]] = None
+) -> ResultBatch:
+    """Fetch one page of Everypixel results, raising ProviderError on failure"""
+    api_key = os.getenv('EVERYPIXEL_API_KEY')
+    if not api_key:
+        return ResultBatch()
+    
+    query, native, client = push_down_filters('everypixel', query, filters or {})
+    params = {'license': license, 'count': per_page, **native}
+    if page > 1:
+        params['page'] = page
+    results = _call_provider(
+        'everypixel', query, params,
+        lambda: _request_everypixel(api_key, query, license, per_page, timeout, native, page),
+        bypass_cache
+    )
+    return apply_client_filters(results, client)
+
+
+def _request_everypixel(
+    api_key: str,
+    query: str,
+    license: str,
+    count: int,
+    timeout: float,
+    native: Optional[Dict[str, str]] = None,
+    page: int = 1
+) -> ResultBatch:
+    """Single request to the Everypixel search API (native: filter params from push_down_filters)"""
+    headers = {'Authorization': f'Bearer {api_key}'}
+    params = {
+        'q': query,
+        'license': license,
+        'per_page': count,
+        'page': page,
+        **(native or {})
+    }
+    
+    try:
+        response = _transport.session('everypixel').get(
+            f"{PROVIDER_ENDPOINTS['everypixel']}/search",
+            headers=headers,
+            params=params,
+            timeout=timeout,
+            stream=True
+        )
+    except requests.RequestException as e:
+        raise ProviderError('everypixel', str(e)) from e
+    
+    with response:
+        if response.status_code != 200:
+            _record_response(response.status_code, len(response.content))
+            raise ProviderError(
+                'everypixel', response.text[:500],
+                status=response.status_code, retry_after=_parse_retry_after(response.headers)
+            )
+        try:
+            data, size = read_json_sync(response, EVERYPIXEL_PROJECTION)
+        except requests.RequestException as e:
+            raise ProviderError('everypixel', str(e)) from e
+        except ValueError as e:
+            raise ProviderError('everypixel', f"invalid response: {e}") from e
+    _record_response(response.status_code, size)
+    
+    try:
+        return _process_everypixel_results(data, license)
+    except KeyError as e:
+        raise ProviderError('everypixel', f"invalid response: {e}") from e
+
+
+def _all_images_jobs(query: str, filters: Dict[str, str], bypass_cache: bool = False) -> Dict[str, Any]:
+    """Per-source fetchers for search_all_images, in merge order (None when disabled)"""
+    jobs = {}
+    
+    # Use DataForSEO for comprehensive search
+    if os.getenv('DATAFORSEO_LOGIN'):
+        jobs['dataforseo'] = lambda timeout: DataForSEOImageSearch().fetch_images(
+            query, depth=100, timeout=timeout, bypass_cache=bypass_cache, filters=filters
+        )
+    else:
+        jobs['dataforseo'] = None
+    
+    jobs['pexels'] = (
+        (lambda timeout: _fetch_pexels(query, 20, timeout, bypass_cache, filters))
+        if os.getenv('PEXELS_API_KEY') else None
+    )
+    jobs['everypixel'] = (
+        (lambda timeout: _fetch_everypixel(
+            query, license='all', count=20, timeout=timeout, bypass_cache=bypass_cache, filters=filters
+        ))
+        if os.getenv('EVERYPIXEL_API_KEY') else None
+    )
+    return jobs
+
+
+def _timed_job(job, deadline: float) -> Tuple[ResultBatch, float]:
+    """
+    Run a source fetcher until a time.monotonic() deadline and report how long it took in milliseconds
+    
+    The time spent queued for a worker counts against the deadline, and the
+    fetcher sends no request once it has passed (future.cancel() cannot stop
+    a job that already started).
+    """
+    start = time.monotonic()
+    if start >= deadline:
+        return ResultBatch(), 0.0
+    _request_deadline.set(deadline)
+    results = job(deadline - start)
+    return results, round((time.monotonic() - start) * 1000, 1)
 
 
 def _search_everypixel(query: str, license: str = 'all', filters: Dict[str, Any] = None) -> List[Dict[str, Any]]:
     """Search Everypixel API with filters"""
-    return search_everypixel(query, license, count=20)
+    return search_everypixel(query, license, count=20, filters=filters)
 
 
 
 # Async versions for parallel search
-async def _async_search_pexels(session: aiohttp.ClientSession, query: str) -> List[Dict[str, Any]]:
+async def _async_search_pexels(session: Optional[aiohttp.ClientSession], query: str, bypass_cache: bool = False) -> List[Dict[str, Any]]:
     """Async Pexels search"""
+    try:
+        batch = await _async_fetch_pexels(session, query, bypass_cache=bypass_cache)
+        return batch.to_dicts()
+    except ProviderError as e:
+        print(f"Async Pexels error: {e}")
+    
+    return []
+
+
+async def _async_fetch_pages(provider: str, count: int, fetch_page, fanout: int = PAGE_FANOUT) -> ResultBatch:
+    """
+    Up to `count` results of a paginated provider, the async counterpart of SearchCursor.next
+    
+    Counts within the page cap take a single request. Larger ones fetch
+    full pages, up to `fanout` at a time and only as many as the running
+    plan step can pay for, until enough results arrived or a short page
+    marks the end.
+    
+    Args:
+        provider: Provider name (a key of PROVIDER_PAGE_CAPS)
+        count: Number of results wanted
+        fetch_page: Coroutine function taking (per_page, page) and returning a ResultBatch
+        fanout: Pages requested concurrently
+        
+    Raises:
+        ProviderError: When the first page needed fails
+    """
+    cap = PROVIDER_PAGE_CAPS[provider]
+    if count <= cap:
+        return await fetch_page(count, 1)
+    
+    results, seen, page = ResultBatch(), set(), 1
+    while len(results) < count:
+        wanted = -(-(count - len(results)) // cap)
+        pages = range(page, page + _affordable(provider, min(wanted, max(1, fanout))))
+        if not pages:
+            break
+        batches = await asyncio.gather(*(fetch_page(cap, number) for number in pages), return_exceptions=True)
+        for batch in batches:
+            if isinstance(batch, BaseException):
+                if not isinstance(batch, ProviderError) or not results:
+                    raise batch
+                print(f"{provider} page {page} failed, returning earlier pages: {batch}")
+                return results.take(range(min(count, len(results))))
+            page += 1
+            # Results shift between pages when the index changes mid-search
+            fresh = [i for i, url in enumerate(batch.url) if url not in seen]
+            seen.update(batch.url)
+            results.extend(batch.take(fresh))
+            if len(batch) < cap or len(results) >= count:
+                return results.take(range(min(count, len(results))))
+    return results.take(range(min(count, len(results))))
+
+
+async def _async_fetch_pexels(
+    session: Optional[aiohttp.ClientSession],
+    query: str,
+    count: int = 10,
+    timeout: float = 10,
+    bypass_cache: bool = False,
+    filters: Optional[Dict[str, str]] = None
+) -> ResultBatch:
+    """Async Pexels fetch, raising ProviderError on failure (counts above the page cap span several pages)"""
     api_key = os.getenv('PEXELS_API_KEY')
     if not api_key:
-        return []
+        return ResultBatch()
     
+    query, native, client = push_down_filters('pexels', query, filters or {})
+    
+    async def fetch_page(per_page: int, page: int) -> ResultBatch:
+        params = {'count': per_page, **native}
+        if page > 1:
+            params['page'] = page
+        results = await _acall_provider(
+            'pexels', query, params,
+            lambda: _async_request_pexels(session, api_key, query, per_page, timeout, native, page),
+            bypass_cache
+        )
+        return apply_client_filters(results, client)
+    
+    # A pooled session opened here is closed with the loop's last scope
+    async with _transport.loop_scope():
+        return await _async_fetch_pages('pexels', count, fetch_page)
+
+
+async def _async_request_pexels(
+    session: Optional[aiohttp.ClientSession],
+    api_key: str,
+    query: str,
+    count: int,
+    timeout: float,
+    native: Optional[Dict[str, str]] = None,
+    page: int = 1
+) -> ResultBatch:
+    """Single async request to the Pexels search API (native: filter params from push_down_filters)"""
+    session = session or _transport.async_session('pexels')
     headers = {'Authorization': api_key}
-    params = {'query': query, 'per_page': 10}
+    params = {'query': query, 'per_page': count, 'page': page, **(native or {})}
     
     try:
         async with session.get(
-            'https://api.pexels.com/v1/search',
+            f"{PROVIDER_ENDPOINTS['pexels']}/search",
             headers=headers,
-            params=params
+            params=params,
+            timeout=aiohttp.ClientTimeout(total=timeout)
         ) as response:
-            if response.status == 200:
-                data = await response.json()
-                return _process_pexels_results(data)
-    except Exception as e:
-        print(f"Async Pexels error: {e}")
+            if response.status != 200:
+                raise ProviderError(
+                    'pexels', (await response.text())[:500],
+                    status=response.status, retry_after=_parse_retry_after(response.headers)
+                )
+            data, size = await read_json(response, PEXELS_PROJECTION)
+            _record_response(response.status, size)
+    except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+        raise ProviderError('pexels', str(e) or type(e).__name__) from e
     
-    return []
+    try:
+        return _process_pexels_results(data)
+    except KeyError as e:
+        raise ProviderError('pexels', f"invalid response: {e}") from e
 
 
-async def _async_search_dataforseo(session: aiohttp.ClientSession, query: str) -> List[Dict[str, Any]]:
+async def _async_search_dataforseo(
+    session: Optional[aiohttp.ClientSession],
+    query: str,
+    depth: int = 100,
+    timeout: float = 30,
+    bypass_cache: bool = False
+) -> List[Dict[str, Any]]:
     """Async DataForSEO search"""
     try:
-        client = DataForSEOImageSearch()
-        # For now, use sync version - would need to implement async properly
-        return client.search_images(query)
+        client = AsyncDataForSEOImageSearch(session)
+        return await client.search_images(query, depth=depth, timeout=timeout, bypass_cache=bypass_cache)
     except Exception as e:
         print(f"Async DataForSEO error: {e}")
         return []
 
 
-def _process_pexels_results(data: Dict[str, Any]) -> List[Dict[str, Any]]:
+async def _async_search_pexels_many(
+    session: Optional[aiohttp.ClientSession],
+    queries: List[str],
+    bypass_cache: bool = False
+) -> Dict[str, List[Dict[str, Any]]]:
+    """Async Pexels search of several queries, one request each"""
+    results = await asyncio.gather(*(_async_search_pexels(session, query, bypass_cache) for query in queries))
+    return dict(zip(queries, results))
+
+
+async def _async_search_dataforseo_many(
+    session: Optional[aiohttp.ClientSession],
+    queries: List[str],
+    depth: int = 100,
+    timeout: float = 30,
+    bypass_cache: bool = False
+) -> Dict[str, List[Dict[str, Any]]]:
+    """Async DataForSEO search of several queries (see fetch_many)"""
+    try:
+        client = AsyncDataForSEOImageSearch(session)
+        batches = await client.fetch_many(queries, depth=depth, timeout=timeout, bypass_cache=bypass_cache)
+        return {query: batch.to_dicts() for query, batch in batches.items()}
+    except Exception as e:
+        print(f"Async DataForSEO error: {e}")
+        return {}
+
+
+async def _async_fetch_everypixel(
+    session: Optional[aiohttp.ClientSession],
+    query: str,
+    license: str = 'all',
+    count: int = 20,
+    timeout: float = 10,
+    bypass_cache: bool = False,
+    filters: Optional[Dict[str, str]] = None
+) -> ResultBatch:
+    """Async Everypixel fetch, raising ProviderError on failure (counts above the page cap span several pages)"""
+    api_key = os.getenv('EVERYPIXEL_API_KEY')
+    if not api_key:
+        return ResultBatch()
+    
+    query, native, client = push_down_filters('everypixel', query, filters or {})
+    
+    async def fetch_page(per_page: int, page: int) -> ResultBatch:
+        params = {'license': license, 'count': per_page, **native}
+        if page > 1:
+            params['page'] = page
+        results = await _acall_provider(
+            'everypixel', query, params,
+            lambda: _async_request_everypixel(session, api_key, query, license, per_page, timeout, native, page),
+            bypass_cache
+        )
+        return apply_client_filters(results, client)
+    
+    # A pooled session opened here is closed with the loop's last scope
+    async with _transport.loop_scope():
+        return await _async_fetch_pages('everypixel', count, fetch_page)
+
+
+async def _async_request_everypixel(
+    session: Optional[aiohttp.ClientSession],
+    api_key: str,
+    query: str,
+    license: str,
+    count: int,
+    timeout: float,
+    native: Optional[Dict[str, str]] = None,
+    page: int = 1
+) -> ResultBatch:
+    """Single async request to the Everypixel search API (native: filter params from push_down_filters)"""
+    session = session or _transport.async_session('everypixel')
+    headers = {'Authorization': f'Bearer {api_key}'}
+    params = {'q': query, 'license': license, 'per_page': count, 'page': page, **(native or {})}
+    
+    try:
+        async with session.get(
+            f"{PROVIDER_ENDPOINTS['everypixel']}/search",
+            headers=headers,
+            params=params,
+            timeout=aiohttp.ClientTimeout(total=timeout)
+        ) as response:
+            if response.status != 200:
+                raise ProviderError(
+                    'everypixel', (await response.text())[:500],
+                    status=response.status, retry_after=_parse_retry_after(response.headers)
+                )
+            data, size = await read_json(response, EVERYPIXEL_PROJECTION)
+            _record_response(response.status, size)
+    except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+        raise ProviderError('everypixel', str(e) or type(e).__name__) from e
+    
+    try:
+        return _process_everypixel_results(data, license)
+    except KeyError as e:
+        raise ProviderError('everypixel', f"invalid response: {e}") from e
+
+
+async def _async_fetch_source(
+    source: str,
+    query: str,
+    count: int = 20,
+    depth: int = 100,
+    timeout: float = 20,
+    bypass_cache: bool = False,
+    filters: Optional[Dict[str, str]] = None
+) -> ResultBatch:
+    """Async fetch from a named source, raising ProviderError on failure (filters: output of normalize_filters)"""
+    if source == 'pexels':
+        return await _async_fetch_pexels(
+            None, query, count=count, timeout=timeout, bypass_cache=bypass_cache, filters=filters
+        )
+    if source == 'everypixel':
+        return await _async_fetch_everypixel(
+            None, query, count=count, timeout=timeout, bypass_cache=bypass_cache, filters=filters
+        )
+    if source == 'dataforseo':
+        if not os.getenv('DATAFORSEO_LOGIN'):
+            return ResultBatch()
+        client = AsyncDataForSEOImageSearch()
+        return await client.fetch_images(query, depth=depth, timeout=timeout, bypass_cache=bypass_cache, filters=filters)
+    raise ValueError(f"Unknown image source: {source}")
+
+
+def _process_pexels_results(data: Dict[str, Any]) -> ResultBatch:
     """Process Pexels API results"""
-    results = []
-    for photo in data.get('photos', []):
-        results.append({
-            'url': photo['src']['original'],
-            'preview_url': photo['src']['medium'],
-            'source': 'pexels',
-            'license': 'CC0',
-            'cost': 0.0,
-            'width': photo['width'],
-            'height': photo['height'],
-            'photographer': photo['photographer'],
-            'relevance_score': 0.8
-        })
+    results = ResultBatch()
+    for photo in data.get('photos') or []:
+        results.append(
+            url=photo['src']['original'],
+            preview_url=photo['src']['medium'],
+            source='pexels',
+            license='CC0',
+            cost=0.0,
+            width=photo['width'],
+            height=photo['height'],
+            photographer=photo['photographer'],
+            photographer_url=photo.get('photographer_url', ''),
+            title=photo.get('alt', ''),
+            relevance_score=0.8,
+            source_website='pexels.com'
+        )
+    return results
+
+
+def _process_everypixel_results(data: Dict[str, Any], license: str = 'all') -> ResultBatch:
+    """Process Everypixel API results"""
+    results = ResultBatch()
+    item_license = 'commercial' if license == 'paid' else 'free'
+    for item in data.get('data') or []:
+        results.append(
+            url=item['url'],
+            preview_url=item.get('preview', item['url']),
+            source=item.get('source', 'everypixel'),
+            license=item_license,
+            cost=item.get('price', 0.0),
+            width=item.get('width', 0),
+            height=item.get('height', 0),
+            title=item.get('title', ''),
+            relevance_score=item.get('score', 0.5)
+        )
     return results
+
+
+def __getattr__(name: str):
+    # The agents SDK takes seconds to import, so the search_free_images tool
+    # is only built the first time it is looked up
+    if name == 'search_free_images':
+        from agents import function_tool
+        tool = function_tool(_search_free_images_tool, name_override='search_free_images')
+        globals()['search_free_images'] = tool
+        return tool
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
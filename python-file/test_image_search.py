@@ -0,0 +1,357 @@
+"""
+Regression tests for image_search (run with: python -m pytest python-file)
+"""
+
+import json
+import subprocess
+import sys
+import time
+
+import image_search
+from benchmark_image_search import IMPORT_BUDGETS_MS, LAZY_DEPENDENCIES
+from image_search import ProviderError, ResultBatch
+
+
+def test_throttled_half_open_probe_frees_the_breaker():
+    """A 429 on the half-open probe must not leave the breaker rejecting forever"""
+    provider = 'test-throttled-probe'
+    image_search.configure_rate_limit(provider, rate=10000.0, burst=10000, max_concurrency=8)
+    breaker = image_search.configure_circuit_breaker(provider, min_requests=1, cooldown=0.1)
+    breaker.record(False, 0.01)
+    assert breaker.state == 'open'
+    time.sleep(0.15)
+    
+    def throttled():
+        raise ProviderError(provider, "rate limited", status=429, retry_after=0.0)
+    
+    try:
+        image_search._rate_limited(provider, throttled)
+    except ProviderError as e:
+        assert e.status == 429
+    
+    # The probe slot is free again, so the next request is let through and closes the breaker
+    assert image_search._rate_limited(provider, lambda: ResultBatch()) is not None
+    assert breaker.state == 'closed'
+
+
+def test_retry_after_pauses_without_draining_the_bucket():
+    """A short Retry-After on a slow provider must not make the next request wait for a fresh token"""
+    limiter = image_search.ProviderRateLimiter('test-retry-after', rate=200 / 3600, burst=5)
+    limiter.acquire()
+    limiter.release(throttled=True, retry_after=0.1)
+    
+    start = time.monotonic()
+    limiter.acquire()
+    assert time.monotonic() - start < 1.0
+    limiter.release()
+
+
+def test_acquire_fails_fast_past_the_request_deadline():
+    """A wait that would pass the deadline is refused at once instead of queueing until max_wait"""
+    limiter = image_search.ProviderRateLimiter('test-deadline', rate=0.1, burst=1)
+    limiter.acquire()
+    limiter.release()
+    
+    start = time.monotonic()
+    try:
+        limiter.acquire(deadline=time.monotonic() + 0.5)
+    except ProviderError as e:
+        assert 'deadline' in str(e)
+    else:
+        raise AssertionError("acquire waited past the deadline")
+    assert time.monotonic() - start < 0.5
+
+
+def test_canonical_form_keeps_word_order_and_uninflected_words():
+    assert image_search.canonicalize_query('Photos of coffee beans') == 'coffee bean'
+    assert image_search.canonicalize_query('dog chasing cat') != image_search.canonicalize_query('cat chasing dog')
+    assert image_search.canonicalize_query('news') == 'news'
+    assert image_search.canonicalize_query('movies') == 'movie'
+
+
+def test_semantic_hit_is_counted_once():
+    """A query served through its canonical form counts as one hit and no miss"""
+    cache = image_search.configure_cache(path=':memory:')
+    image_search.configure_semantic_cache()
+    batch = ResultBatch.from_dicts([{'url': 'https://example.com/a.jpg', 'source': 'test'}])
+    image_search._cache_put('test', 'coffee beans', {}, batch)
+    
+    assert image_search._cache_get('test', 'photo of coffee bean', {}) is not None
+    assert image_search._cache_get('test', 'woman reading', {}) is None
+    assert cache.stats()['hits'] == {'test': 1}
+    assert cache.stats()['misses'] == {'test': 1}
+
+
+def _import_profile(module: str, path: str) -> dict:
+    """Cumulative -X importtime microseconds per module for `import module` in a fresh interpreter"""
+    completed = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=path, capture_output=True, text=True, check=True
+    )
+    profile = {}
+    for line in completed.stderr.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        fields = [field.strip() for field in line[len('import time:'):].split('|')]
+        if fields[1].isdigit():
+            profile[fields[2]] = int(fields[1])
+    return profile
+
+
+def test_import_stays_under_budget():
+    """import image_search stays within its benchmark budget and leaves heavy dependencies unloaded"""
+    budget_ms, path = IMPORT_BUDGETS_MS['image_search']
+    _import_profile('image_search', path)  # warms the bytecode cache
+    runs = [_import_profile('image_search', path) for _ in range(3)]
+    
+    best_ms = min(profile['image_search'] for profile in runs) / 1000
+    assert best_ms <= budget_ms, f"import image_search took {best_ms:.1f} ms (budget {budget_ms} ms)"
+    eager = [name for name in LAZY_DEPENDENCIES if name in runs[0]]
+    assert not eager, f"import image_search loaded {', '.join(eager)} eagerly"
+
+
+def test_canonical_url_ignores_scheme_host_case_and_trailing_slash():
+    canonical = image_search.canonical_url('https://cdn.example.com/images/cat.jpg')
+    assert image_search.canonical_url('http://WWW.CDN.Example.com/images/cat.jpg') == canonical
+    assert image_search.canonical_url('https://cdn.example.com/images/cat.jpg/') == canonical
+    assert image_search.canonical_url('https://example.com') == image_search.canonical_url('https://example.com/')
+    # Paths stay case-sensitive
+    assert image_search.canonical_url('https://cdn.example.com/images/Cat.jpg') != canonical
+
+
+def test_canonical_url_strips_tracking_but_keeps_other_params():
+    canonical = image_search.canonical_url('https://example.com/img?id=7&v=2')
+    assert image_search.canonical_url('https://example.com/img?utm_source=x&v=2&fbclid=abc&id=7') == canonical
+    assert image_search.canonical_url('https://example.com/img?utm_whatever=1&id=7&v=2&gclid=z') == canonical
+    assert image_search.canonical_url('https://example.com/img?id=8&v=2') != canonical
+
+
+def test_canonical_url_folds_cdn_size_variants():
+    original = image_search.canonical_url('https://images.pexels.com/photos/123/pexels-photo-123.jpeg')
+    assert image_search.canonical_url('https://images.pexels.com/photos/123/pexels-photo-123.jpeg?w=640&h=480') == original
+    assert image_search.canonical_url('https://www.pexels.com/photo/red-cup-123/') == original
+    
+    unsplash = image_search.canonical_url('https://images.unsplash.com/photo-1?ixlib=rb-4&w=1080&q=80&fm=jpg')
+    assert unsplash == image_search.canonical_url('https://images.unsplash.com/photo-1')
+    
+    thumb = 'https://upload.wikimedia.org/wikipedia/commons/thumb/a/ab/Cat.jpg/320px-Cat.jpg'
+    assert image_search.canonical_url(thumb) == image_search.canonical_url(
+        'https://upload.wikimedia.org/wikipedia/commons/a/ab/Cat.jpg'
+    )
+    
+    assert image_search.canonical_url('https://live.staticflickr.com/65535/123_abcdef_b.jpg') == \
+        image_search.canonical_url('https://farm1.staticflickr.com/65535/123_abcdef.jpg')
+    
+    # Outside image CDNs, size-like parameters may select a different image
+    assert image_search.canonical_url('https://example.com/img?w=640') != image_search.canonical_url('https://example.com/img')
+
+
+def _riff(chunk: bytes, payload: bytes) -> bytes:
+    body = b'WEBP' + chunk + len(payload).to_bytes(4, 'little') + payload
+    return b'RIFF' + len(body).to_bytes(4, 'little') + body
+
+
+# Leading bytes of one file per format the probe understands, all 640x480
+IMAGE_HEADERS = {
+    'png': b'\x89PNG\r\n\x1a\n' + (13).to_bytes(4, 'big') + b'IHDR'
+           + (640).to_bytes(4, 'big') + (480).to_bytes(4, 'big') + b'\x08\x02\x00\x00\x00',
+    'gif': b'GIF89a' + (640).to_bytes(2, 'little') + (480).to_bytes(2, 'little') + b'\xf7\x00\x00',
+    # SOF0 behind a JFIF APP0 and an Exif APP1 segment
+    'jpeg': b'\xff\xd8'
+            + b'\xff\xe0' + (16).to_bytes(2, 'big') + b'JFIF\x00\x01\x01\x00\x00\x01\x00\x01\x00\x00'
+            + b'\xff\xe1' + (40).to_bytes(2, 'big') + b'Exif\x00\x00' + b'\x00' * 32
+            + b'\xff\xc0' + (17).to_bytes(2, 'big') + b'\x08' + (480).to_bytes(2, 'big') + (640).to_bytes(2, 'big')
+            + b'\x03' + b'\x00' * 9,
+    'webp-vp8': _riff(b'VP8 ', b'\x00\x00\x00' + b'\x9d\x01\x2a'
+                      + (640).to_bytes(2, 'little') + (480).to_bytes(2, 'little') + b'\x00' * 4),
+    'webp-vp8l': _riff(b'VP8L', b'\x2f' + ((640 - 1) | (480 - 1) << 14).to_bytes(4, 'little') + b'\x00' * 3),
+    'webp-vp8x': _riff(b'VP8X', b'\x10\x00\x00\x00' + (640 - 1).to_bytes(3, 'little') + (480 - 1).to_bytes(3, 'little')),
+}
+
+
+def test_parse_image_header_reads_every_format():
+    expected = {
+        'png': 'image/png', 'gif': 'image/gif', 'jpeg': 'image/jpeg',
+        'webp-vp8': 'image/webp', 'webp-vp8l': 'image/webp', 'webp-vp8x': 'image/webp',
+    }
+    for name, header in IMAGE_HEADERS.items():
+        assert image_search.parse_image_header(header) == (expected[name], 640, 480), name
+
+
+def test_parse_image_header_returns_none_until_the_size_arrives():
+    # Offset just past the last size byte of each fixture
+    size_ends = {'png': 24, 'gif': 10, 'jpeg': 2 + 18 + 42 + 9, 'webp-vp8': 30, 'webp-vp8l': 25, 'webp-vp8x': 30}
+    for name, header in IMAGE_HEADERS.items():
+        for cut in range(size_ends[name]):
+            assert image_search.parse_image_header(header[:cut]) is None, f"{name}[:{cut}]"
+        assert image_search.parse_image_header(header[:size_ends[name]]) is not None, name
+    assert image_search.parse_image_header(b'<html>not an image</html>') is None
+
+
+def _dataforseo_task(tag, keyword: str, status_code: int = 20000) -> dict:
+    data = {'keyword': keyword} if tag is None else {'keyword': keyword, 'tag': tag}
+    return {'status_code': status_code, 'status_message': 'Ok.', 'data': data, 'result': [{'items': [
+        {'type': 'images_search', 'source_url': f'https://img.example.com/{keyword}/{i}.jpg', 'title': keyword}
+        for i in range(2)
+    ]}]}
+
+
+def _dataforseo_client(monkeypatch, max_tasks: int) -> image_search.DataForSEOImageSearch:
+    monkeypatch.setenv('DATAFORSEO_LOGIN', 'login')
+    monkeypatch.setenv('DATAFORSEO_PASSWORD', 'password')
+    image_search.configure_rate_limit('dataforseo', rate=10000.0, burst=10000, max_concurrency=8)
+    image_search.configure_circuit_breaker('dataforseo')
+    image_search.configure_library(path=':memory:', enabled=False)
+    client = image_search.DataForSEOImageSearch()
+    client.max_tasks = max_tasks
+    return client
+
+
+def test_demux_tasks_maps_tasks_back_to_their_queries(monkeypatch):
+    client = _dataforseo_client(monkeypatch, 3)
+    data = {'tasks': [
+        _dataforseo_task('2', 'gamma'),
+        _dataforseo_task('0', 'alpha'),
+        _dataforseo_task('1', 'beta', status_code=40501),
+    ]}
+    batches = client._demux_tasks(data, 3)
+    assert batches[0].title == ['alpha', 'alpha']
+    assert batches[1] is None
+    assert batches[2].title == ['gamma', 'gamma']
+    
+    # Without tags, tasks are taken in response order
+    untagged = client._demux_tasks({'tasks': [_dataforseo_task(None, 'alpha'), _dataforseo_task(None, 'beta')]}, 2)
+    assert [batch.title[0] for batch in untagged] == ['alpha', 'beta']
+
+
+def test_fetch_many_retries_only_the_failed_task_and_collapses_duplicates(monkeypatch):
+    client = _dataforseo_client(monkeypatch, 3)
+    packed, alone = [], []
+    
+    def request_many(queries, depth, timeout):
+        packed.append(list(queries))
+        tasks = [_dataforseo_task(str(i), query, 40501 if query == 'beta' else 20000) for i, query in enumerate(queries)]
+        return client._demux_tasks({'tasks': tasks}, len(queries))
+    
+    def request_images(query, depth, timeout, search_params=None):
+        alone.append(query)
+        return client._parse_task(_dataforseo_task(None, query))
+    
+    monkeypatch.setattr(client, '_request_many', request_many)
+    monkeypatch.setattr(client, '_request_images', request_images)
+    
+    results = client.fetch_many(['alpha', 'beta', 'alpha', 'gamma', 'beta'], depth=2, bypass_cache=True)
+    assert packed == [['alpha', 'beta', 'gamma']]
+    assert alone == ['beta']
+    assert {query: batch.title[0] for query, batch in results.items()} == {
+        'alpha': 'alpha', 'beta': 'beta', 'gamma': 'gamma'
+    }
+
+
+def _project(value, projection):
+    """Reference projection of an already decoded document"""
+    if projection is True:
+        return value
+    if isinstance(projection, dict) and isinstance(value, dict):
+        return {key: _project(value[key], keep) for key, keep in projection.items() if key in value}
+    if isinstance(projection, list) and isinstance(value, list):
+        return [_project(item, projection[0]) for item in value]
+    return value
+
+
+# One response per provider, with fields the parsers never read (nested objects,
+# arrays, nulls, unicode, floats) around the projected ones
+PROVIDER_PAYLOADS = {
+    'pexels': (image_search.PEXELS_PROJECTION, {
+        'page': 1, 'per_page': 2, 'total_results': 8000, 'next_page': 'https://api.pexels.com/v1/search?page=2',
+        'photos': [{
+            'id': i, 'width': 4000 + i, 'height': 3000, 'url': f'https://www.pexels.com/photo/{i}/',
+            'photographer': 'Zoë Ångström', 'photographer_url': 'https://www.pexels.com/@zoe', 'avg_color': '#A1B2C3',
+            'src': {'original': f'https://images.pexels.com/photos/{i}/a.jpeg', 'large2x': 'x', 'medium': 'm', 'tiny': 't'},
+            'liked': False, 'alt': 'Café au lait \u2615 "quoted"',
+        } for i in range(2)],
+    }),
+    'everypixel': (image_search.EVERYPIXEL_PROJECTION, {
+        'status': True, 'meta': {'took_ms': 12.5, 'facets': [{'name': 'color', 'values': [1, 2, [3, {'x': None}]]}]},
+        'data': [{
+            'url': f'https://cdn.example.com/{i}.jpg', 'preview': None, 'source': 'shutterstock', 'price': 2.99,
+            'width': 3000, 'height': 2000, 'title': 'Plage à Nice', 'score': 0.875, 'keywords': ['a', 'b'],
+            'author': {'name': 'X', 'links': [{'rel': 'self'}]},
+        } for i in range(3)],
+    }),
+    'dataforseo': (image_search.DATAFORSEO_PROJECTION, {
+        'version': '0.1', 'status_code': 20000, 'cost': 0.0016, 'tasks_count': 2,
+        'tasks': [{
+            'id': f'task-{i}', 'status_code': 20000, 'status_message': 'Ok.', 'time': '0.5 sec.', 'cost': 0.0016,
+            'data': {'api': 'serp', 'keyword': f'query {i}', 'tag': str(i), 'depth': 2, 'language_code': 'en'},
+            'result': [{
+                'keyword': f'query {i}', 'check_url': 'https://google.com', 'item_types': ['images_search'],
+                'items': [{
+                    'type': 'images_search', 'rank_group': j, 'source_url': f'https://img.example.org/{i}/{j}.jpg',
+                    'encoded_url': 'data:,', 'title': 'T', 'alt': None, 'subtitle': 'example.org',
+                    'url': 'https://example.org', 'thumbnail': {'width': 100, 'height': 80},
+                } for j in range(2)],
+            }],
+        } for i in range(2)],
+    }),
+}
+
+
+def test_streamed_projection_matches_full_decode():
+    """JsonProjector, fed in small chunks, equals json.loads followed by the same projection"""
+    for provider, (projection, payload) in PROVIDER_PAYLOADS.items():
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        expected = _project(json.loads(body), projection)
+        for chunk_size in (1, 7, len(body)):
+            projector = image_search.JsonProjector(projection)
+            for offset in range(0, len(body), chunk_size):
+                projector.feed(body[offset:offset + chunk_size])
+            assert projector.close() == expected, f"{provider} in {chunk_size}-byte chunks"
+            assert projector.size == len(body)
+
+
+def test_search_workers_stop_sending_after_the_deadline(monkeypatch):
+    """A source past its deadline is reported as a timeout and its worker sends no further request"""
+    provider = 'test-deadline-worker'
+    image_search.configure_rate_limit(provider, rate=10000.0, burst=10000, max_concurrency=8)
+    sent = []
+    
+    def slow_request():
+        sent.append(time.monotonic())
+        time.sleep(0.1)
+        return ResultBatch()
+    
+    def job(timeout):
+        for _ in range(20):
+            image_search._rate_limited(provider, slow_request)
+        return ResultBatch()
+    
+    monkeypatch.setattr(image_search, '_all_images_jobs', lambda *args: {'slow': job})
+    start = time.monotonic()
+    report = image_search.search_all_images_detailed('anything', deadline=0.25)
+    assert report['sources']['slow']['status'] == 'timeout'
+    
+    time.sleep(0.3)
+    assert len(sent) <= 3
+    assert all(moment < start + 0.25 for moment in sent)
+
+
+def test_rank_results_leaves_the_input_untouched():
+    """Ranking a shared batch (or list) must not rewrite its scores or order"""
+    rows = [
+        {'url': 'https://example.com/1.jpg', 'title': 'mountain lake', 'source': 'pexels', 'width': 640, 'height': 480},
+        {'url': 'https://example.com/2.jpg', 'title': 'coffee beans closeup', 'source': 'pexels', 'width': 1920, 'height': 1080},
+    ]
+    batch = ResultBatch.from_dicts(rows)
+    scores = list(batch.relevance_score)
+    
+    ranked = image_search.rank_results('coffee beans', batch)
+    assert ranked.url[0] == 'https://example.com/2.jpg'
+    assert ranked.relevance_score[0] > ranked.relevance_score[1]
+    assert list(batch.relevance_score) == scores
+    assert batch.url[0] == 'https://example.com/1.jpg'
+    
+    dicts = batch.to_dicts()
+    ranked_dicts = image_search.rank_results('coffee beans', dicts)
+    assert ranked_dicts[0]['url'] == 'https://example.com/2.jpg'
+    assert [row['relevance_score'] for row in dicts] == scores